@@ -1,14 +1,17 @@
 import os
-from flask import Flask, jsonify, redirect, url_for, send_from_directory, render_template
+from flask import Flask, jsonify, redirect, url_for, render_template
 from config import Config
-from backend.ml_model.model_loader import ModelLoader
 from flask_jwt_extended import JWTManager 
 
 # Import DatabaseService for context teardown
 from backend.services.database_service import DatabaseService
+from backend.services.upload_ingest import IngestRequest
+from backend.services.thumbnails import ensure_derivative
+from backend.services.image_store import ImageStore, key_for
+from backend.services.file_serving import SENDFILE_MODES, send_stored_file
 
-# Import PredictService class (for instantiation)
-from backend.ml_model.predict_service import PredictService
+# NOTE: backend.ml_model (NumPy, OpenCV, TensorFlow) is imported inside create_app,
+# only for roles that serve scans, so API-only workers start fast and stay small.
 
 # Import all Blueprint objects (API routes)
 from backend.api.auth_routes import auth_bp
@@ -23,6 +26,9 @@ import backend.api.scan_routes as scan_routes
 import backend.api.admin_routes as admin_routes_module
 from backend.models.admin_model import AdminModel
 
+# APP_ROLE values: which parts of the app this process serves
+APP_ROLES = ('all', 'api', 'inference')
+
 
 # --- Application Factory Function ---
 def create_app(config_class=Config):
@@ -30,6 +36,8 @@ def create_app(config_class=Config):
     app = Flask(__name__, 
                 static_folder='src/static',
                 template_folder='src/templates')
+    # Uploaded files are hashed and written to disk while the request body streams in
+    app.request_class = IngestRequest
     
     app.config.from_object(config_class)
 
@@ -42,138 +50,271 @@ def create_app(config_class=Config):
     
     # Ensure the upload folder exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    sendfile_mode = (app.config.get('UPLOAD_SENDFILE_MODE') or 'none').lower()
+    if sendfile_mode not in SENDFILE_MODES:
+        raise ValueError(f"Unknown UPLOAD_SENDFILE_MODE '{sendfile_mode}'. Expected one of: {', '.join(SENDFILE_MODES)}")
+
+    # 'all' = everything in one process, 'api' = no ML stack (scans answer 503),
+    # 'inference' = scan API only
+    app_role = app.config.get('APP_ROLE', 'all')
+    if app_role not in APP_ROLES:
+        raise ValueError(f"Unknown APP_ROLE '{app_role}'. Expected one of: {', '.join(APP_ROLES)}")
+    serves_api = app_role in ('all', 'api')
+    serves_scans = app_role in ('all', 'inference')
     
     # --- 1. Register Blueprints (API Routes) ---
-    app.register_blueprint(auth_bp, url_prefix='/api/auth')
-    app.register_blueprint(user_bp, url_prefix='/api/user')
+    if serves_api:
+        app.register_blueprint(auth_bp, url_prefix='/api/auth')
+        app.register_blueprint(user_bp, url_prefix='/api/user')
+        app.register_blueprint(admin_bp, url_prefix='/api/admin')
+        app.register_blueprint(trash_bp, url_prefix='/api/trash')
+        app.register_blueprint(gallery_bp, url_prefix='/api/gallery') 
+    # Always registered: scan job status and the scan gallery need no model
     app.register_blueprint(scan_bp, url_prefix='/api/scan')
-    app.register_blueprint(admin_bp, url_prefix='/api/admin')
-    app.register_blueprint(trash_bp, url_prefix='/api/trash')
-    app.register_blueprint(gallery_bp, url_prefix='/api/gallery') 
 
-    # --- 2. Load Machine Learning Model ---
-    app.logger.info("Starting ML model loading...")
-    model_loaded = False
-    
-    try:
-        ModelLoader.load_model(app.config['MODEL_PATH'])
-        app.logger.info("ML model successfully loaded.")
-        model_loaded = True
-    except RuntimeError as e:
-        app.logger.error(f"CRITICAL: ML Model failed to load: {e}. Scan functionality will be disabled.")
-        # We allow the app to continue, but model_loaded is False
+    # --- 2. Machine Learning Model and the services built on it ---
+    def init_prediction_services():
+        """Creates the PredictService and async scan pool once the model is available."""
+        from backend.ml_model.predict_service import PredictService
+        from backend.ml_model.scan_worker import ScanJobWorker
 
-    # --- 3. Initialize Services requiring context/config ---
-    with app.app_context():
-        # FIX: Only initialize PredictService IF the model loaded
-        if model_loaded:
+        with app.app_context():
             scan_routes.predict_service = PredictService()
-        else:
-            scan_routes.predict_service = None 
-            
-        admin_routes_module.admin_model = AdminModel(
-            disease_classes=app.config.get('DISEASE_CLASSES')
+
+            # Background pool draining asynchronous ('pending') scans
+            if app.config.get('SCAN_ASYNC_WORKERS', 0) > 0:
+                scan_routes.scan_worker = ScanJobWorker(
+                    app, scan_routes.predict_service,
+                    num_threads=app.config['SCAN_ASYNC_WORKERS'],
+                    batch_size=app.config.get('SCAN_ASYNC_BATCH_SIZE', 8),
+                    poll_interval=app.config.get('SCAN_ASYNC_POLL_INTERVAL', 1.0),
+                    stale_after_seconds=app.config.get('SCAN_ASYNC_CLAIM_TIMEOUT', 300),
+                    max_attempts=app.config.get('SCAN_ASYNC_MAX_ATTEMPTS', 3)
+                )
+                scan_routes.scan_worker.start()
+
+            # Grad-CAM explanations (Keras backend only), computed on first request
+            if app.config.get('HEATMAP_ENABLED', True) and app.config.get('INFERENCE_MODE') != 'remote':
+                try:
+                    from backend.ml_model.gradcam import HeatmapService
+                    from backend.ml_model.model_loader import ModelLoader
+
+                    scan_routes.heatmap_service = HeatmapService(
+                        ModelLoader.get_backend(),
+                        image_size=app.config['IMAGE_SIZE'],
+                        max_batch_size=app.config.get('HEATMAP_MAX_BATCH_SIZE', 8),
+                        max_wait_ms=app.config.get('HEATMAP_MAX_WAIT_MS', 50),
+                        max_size=app.config.get('HEATMAP_MAX_SIZE', 512),
+                        alpha=app.config.get('HEATMAP_ALPHA', 0.4),
+                        layer_name=app.config.get('HEATMAP_LAYER')
+                    )
+                except RuntimeError as e:
+                    app.logger.warning(f"Heatmaps disabled: {e}")
+            app.logger.info("Prediction service ready.")
+
+    def on_model_error(e):
+        app.logger.error(f"CRITICAL: ML Model failed to load: {e}. Scan functionality will be disabled.")
+
+    # FIX: Scan services stay None until the model is loaded (scan routes answer 503 meanwhile)
+    scan_routes.predict_service = None 
+    scan_routes.scan_worker = None
+    scan_routes.heatmap_service = None
+
+    if not serves_scans:
+        app.logger.info(f"APP_ROLE={app_role}: ML model not loaded; scans are served by inference workers.")
+    elif app.config.get('INFERENCE_MODE') == 'remote':
+        # The shared model server owns the model; this worker only needs a client
+        app.logger.info(f"Using remote model server at {app.config['MODEL_SERVER_SOCKET']}.")
+        try:
+            init_prediction_services()
+        except (OSError, RuntimeError) as e:
+            app.logger.error(f"CRITICAL: Prediction service unavailable: {e}. Scan functionality will be disabled.")
+    else:
+        from backend.ml_model.model_loader import ModelLoader
+        from backend.ml_model.cpu_tuning import resolve_thread_plan
+
+        # Size the runtime's thread pools for this worker's share of the node's CPUs
+        thread_plan = resolve_thread_plan(app.config)
+        app.logger.info(
+            f"Inference threads: intra-op {thread_plan['intra_op_threads']}, inter-op {thread_plan['inter_op_threads']} "
+            f"({thread_plan['cpus']} CPUs / {thread_plan['workers']} workers, {thread_plan['source']})."
         )
+        stage1_model_path = app.config.get('CASCADE_STAGE1_MODEL_PATH')
+        if stage1_model_path and app.config.get('INFERENCE_PATH') == 'legacy':
+            # The legacy model.predict() path has no cascade; don't load and warm a model it never uses
+            app.logger.warning("CASCADE_STAGE1_MODEL_PATH is ignored with INFERENCE_PATH=legacy; the stage-1 model is not loaded.")
+            stage1_model_path = None
+        load_args = dict(
+            thread_plan=thread_plan,
+            image_size=app.config['IMAGE_SIZE'],
+            warmup_runs=app.config.get('MODEL_WARMUP_RUNS', 0),
+            backend=app.config.get('MODEL_BACKEND'),
+            stage1_model_path=stage1_model_path,
+            stage1_backend=app.config.get('CASCADE_STAGE1_BACKEND'),
+            on_ready=init_prediction_services
+        )
+        if app.config.get('MODEL_LOAD_ASYNC', True):
+            # Login, pages and other APIs are served while the model loads and warms up
+            app.logger.info("Starting ML model loading in the background...")
+            ModelLoader.load_model_async(app.config['MODEL_PATH'], on_error=on_model_error, **load_args)
+        else:
+            app.logger.info("Starting ML model loading...")
+            try:
+                ModelLoader.load_model(app.config['MODEL_PATH'], **load_args)
+                app.logger.info("ML model successfully loaded.")
+            except (OSError, RuntimeError) as e:
+                on_model_error(e)
 
-    # --- 4. Serve Static HTML Pages (Frontend Routes) ---
-    
-    @app.route('/')
-    def index():
-        return render_template('index.html')
-
-    @app.route('/login')
-    def login_page():
-        return render_template('auth/login.html')
-
-    @app.route('/signup')
-    def signup_page():
-        return render_template('auth/signup.html')
-
-    # FIX: Add routes for Forgot Password workflow
-    @app.route('/forgot-password')
-    def forgot_password_page():
-        return render_template('auth/forgot_password.html')
-
-    @app.route('/reset-password-confirm')
-    def reset_password_page():
-        return render_template('auth/reset_password.html')
-        
-    @app.route('/dashboard')
-    def dashboard_page():
-        return render_template('user/dashboard.html')
+    # --- 3. Initialize Services requiring context/config ---
+    if serves_api:
+        with app.app_context():
+            admin_routes_module.admin_model = AdminModel(
+                disease_classes=app.config.get('DISEASE_CLASSES')
+            )
 
-    @app.route('/scan')
-    def scan_page():
-        return render_template('user/scan.html')
+    # --- 4. Health Checks ---
 
-    @app.route('/gallery')
-    def gallery_page():
-        return render_template('user/gallery.html')
+    @app.route('/healthz')
+    def healthz():
+        """Liveness: the process is up and serving, whatever the model state."""
+        return jsonify({"status": "ok", "role": app_role, "model": scan_routes.get_model_status()}), 200
 
-    @app.route('/settings')
-    def settings_page():
-        return render_template('user/settings.html')
-        
-    @app.route('/feedback')
-    def feedback_page():
-        return render_template('user/feedback.html')
-        
-    @app.route('/tree/<int:tree_id>')
-    def tree_detail_page(tree_id):
-        return render_template('user/tree_detail.html')
-        
-    # --- Admin Routes ---
-    
-    @app.route('/admin/dashboard')
-    def admin_dashboard_page():
-        # FIX: Ensure the correct ADMIN dashboard template is rendered
-        return render_template('user/admin/dashboard.html')
-    
-    @app.route('/admin/feedbacks')
-    def admin_feedbacks_page():
-        return render_template('user/admin/feedbacks.html')
-    
-    @app.route('/admin/diseases')
-    def admin_diseases_page():
-        return render_template('user/admin/disease.html')
+    @app.route('/readyz')
+    def readyz():
+        """
+        Readiness: 200 only once the model is loaded and warmed up, so scan traffic
+        can be routed here. API-only workers (no model) are always ready.
+        """
+        model_status = scan_routes.get_model_status()
+        if model_status['state'] in (scan_routes.MODEL_READY, scan_routes.MODEL_DISABLED):
+            return jsonify({"status": "ready", "role": app_role, "model": model_status}), 200
+        headers = {'Retry-After': '5'} if model_status['state'] == scan_routes.MODEL_LOADING else {}
+        return jsonify({"status": "not_ready", "model": model_status}), 503, headers
 
-    @app.route('/admin/users')
-    def admin_users_page():
-        return render_template('user/admin/users.html') 
+    # --- 5. Serve Static HTML Pages (Frontend Routes) ---
+    # Pages belong to the API role; inference workers only serve scans, /uploads and health checks
+    if serves_api:
+        @app.route('/')
+        def index():
+            return render_template('index.html')
 
-    @app.route('/admin/images')
-    def admin_images_page():
-        # FIX: Route for the Admin All Scans page
-        return render_template('user/admin/images.html') 
+        @app.route('/login')
+        def login_page():
+            return render_template('auth/login.html')
 
-    # --- User Utility Routes ---
+        @app.route('/signup')
+        def signup_page():
+            return render_template('auth/signup.html')
 
-    @app.route('/user/statistic')
-    def user_statistic_page():
-        return render_template('user/statistic.html')
+        # FIX: Add routes for Forgot Password workflow
+        @app.route('/forgot-password')
+        def forgot_password_page():
+            return render_template('auth/forgot_password.html')
+
+        @app.route('/reset-password-confirm')
+        def reset_password_page():
+            return render_template('auth/reset_password.html')
+
+        @app.route('/dashboard')
+        def dashboard_page():
+            return render_template('user/dashboard.html')
+
+        @app.route('/scan')
+        def scan_page():
+            return render_template('user/scan.html')
+
+        @app.route('/gallery')
+        def gallery_page():
+            return render_template('user/gallery.html')
+
+        @app.route('/settings')
+        def settings_page():
+            return render_template('user/settings.html')
+
+        @app.route('/feedback')
+        def feedback_page():
+            return render_template('user/feedback.html')
+
+        @app.route('/tree/<int:tree_id>')
+        def tree_detail_page(tree_id):
+            return render_template('user/tree_detail.html')
+
+        # --- Admin Routes ---
+
+        @app.route('/admin/dashboard')
+        def admin_dashboard_page():
+            # FIX: Ensure the correct ADMIN dashboard template is rendered
+            return render_template('user/admin/dashboard.html')
+
+        @app.route('/admin/feedbacks')
+        def admin_feedbacks_page():
+            return render_template('user/admin/feedbacks.html')
+
+        @app.route('/admin/diseases')
+        def admin_diseases_page():
+            return render_template('user/admin/disease.html')
+
+        @app.route('/admin/users')
+        def admin_users_page():
+            return render_template('user/admin/users.html') 
+
+        @app.route('/admin/images')
+        def admin_images_page():
+            # FIX: Route for the Admin All Scans page
+            return render_template('user/admin/images.html') 
+
+        # --- User Utility Routes ---
+
+        @app.route('/user/statistic')
+        def user_statistic_page():
+            return render_template('user/statistic.html')
+
+        @app.route('/user/trash')
+        def user_trash_page():
+            return render_template('user/tash.html')
+
+        @app.route('/regional-report') # <-- NEW ROUTE
+        def regional_report_page():
+            return render_template('user/regional_report.html')
 
-    @app.route('/user/trash')
-    def user_trash_page():
-        return render_template('user/tash.html')
-        
-    @app.route('/regional-report') # <-- NEW ROUTE
-    def regional_report_page():
-        return render_template('user/regional_report.html')
-        
     # --- Route for Serving Uploaded Images ---
     
     @app.route('/uploads/<path:filename>')
     def serve_uploaded_file(filename):
-        """Serves images uploaded by users from the UPLOAD_FOLDER."""
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        """Serves uploaded images from the image store (content-addressed 'ab/cd/<hash>.<ext>' keys or legacy flat names)."""
+        path = ImageStore.from_app(app).path(filename)
+        if path is None or not os.path.isfile(path):
+            return jsonify({"error": "Not Found", "message": "The requested image does not exist."}), 404
+        return send_stored_file(path, key_for(filename))
+
+    @app.route('/uploads/thumbs/<int:size>/<path:filename>')
+    def serve_thumbnail(size, filename):
+        """Serves a downscaled derivative of an upload, generating it on first request."""
+        sizes = app.config['THUMBNAIL_SIZES']
+        original_path = ImageStore.from_app(app).path(filename)
+        if size not in sizes or original_path is None:
+            return jsonify({"error": "Not Found", "message": "Unknown thumbnail."}), 404
+        try:
+            path = ensure_derivative(
+                original_path, size, sizes=sizes,
+                fmt=app.config['THUMBNAIL_FORMAT'], quality=app.config['THUMBNAIL_QUALITY']
+            )
+        except FileNotFoundError:
+            return jsonify({"error": "Not Found", "message": "The requested image does not exist."}), 404
+        except OSError as e:
+            # Not cacheable under this URL: a temporary redirect lets a later request retry the thumbnail
+            app.logger.warning(f"Thumbnail generation failed for {filename}: {e}")
+            return redirect(url_for('serve_uploaded_file', filename=filename), code=302)
+        return send_stored_file(path, os.path.relpath(path, app.config['UPLOAD_FOLDER']).replace(os.sep, '/'))
 
-    # --- 5. Final Configuration and Teardown ---
+    # --- 6. Final Configuration and Teardown ---
 
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({"error": "Not Found", "message": "The requested URL was not found on the server."}), 404
         
-    # CRITICAL: Register the non-pooled teardown function
+    # Return the request's pooled connection when the app context ends
     app.teardown_appcontext(DatabaseService.close_db_connection)
 
     # Final return statement must be here
@@ -2,10 +2,14 @@ from flask import Blueprint, request, jsonify, current_app, url_for
 from backend.api.user_routes import token_required # Re-use generic token check
 from backend.models.admin_model import AdminModel
 from functools import wraps
+from mysql.connector import Error
 from backend.models.feedback_model import FeedbackModel
 from backend.models.disease_model import DiseaseModel
 from backend.models.user_model import UserModel # Needed to check user role
 from backend.models.image_model import ImageModel 
+import backend.api.scan_routes as scan_routes
+from backend.api.utils import requested_image_size, set_image_urls, page_request, stream_json_page
+from backend.services.db_pool import get_pool_stats
 
 # Create Blueprint
 admin_bp = Blueprint('admin_bp', __name__)
@@ -65,6 +69,29 @@ def get_metrics_route(current_user_id):
         current_app.logger.error(f"Admin metrics error: {e}")
         return jsonify({"message": "Failed to retrieve administration metrics"}), 500
 
+@admin_bp.route('/inference-stats', methods=['GET'])
+@admin_required
+def get_inference_stats_route(current_user_id):
+    """Retrieves inference batching statistics (batch-size histogram, latency percentiles)."""
+    if scan_routes.predict_service is None:
+        return jsonify({"message": "Inference service is not running"}), 503
+
+    try:
+        return jsonify(scan_routes.predict_service.get_stats()), 200
+    except Exception as e:
+        current_app.logger.error(f"Inference stats error: {e}")
+        return jsonify({"message": "Failed to retrieve inference statistics"}), 500
+
+@admin_bp.route('/db-pool-stats', methods=['GET'])
+@admin_required
+def get_db_pool_stats_route(current_user_id):
+    """Retrieves this worker's database pool metrics (checkout wait time, in-use and overflow connections)."""
+    try:
+        return jsonify(get_pool_stats() or {"message": "No database connection opened yet"}), 200
+    except Exception as e:
+        current_app.logger.error(f"DB pool stats error: {e}")
+        return jsonify({"message": "Failed to retrieve database pool statistics"}), 500
+
 # ==============================================================================
 # --- User Management Routes (/api/admin/users) ---
 # ==============================================================================
@@ -72,14 +99,20 @@ def get_metrics_route(current_user_id):
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def get_all_users_route(current_user_id):
-    """Retrieves a list of all users on the platform."""
+    """Retrieves the platform's users, newest first, paged with ?limit=&cursor= (?limit=all for every user)."""
     # FIX: Ensure admin_model is available before calling its methods
     if admin_model is None:
          return jsonify({"message": "User management service unavailable"}), 503
 
     try:
-        users = admin_model.get_all_users()
-        return jsonify(users), 200
+        limit, after = page_request(allow_all=True)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        # Streamed as a JSON array (or NDJSON with ?format=ndjson)
+        users = admin_model.iter_all_users(limit=limit and limit + 1, after=after)
+        return stream_json_page(users, limit, 'created_at', 'user_id')
     except Exception as e:
         current_app.logger.error(f"Admin users error: {e}")
         return jsonify({"message": "Failed to retrieve user list"}), 500
@@ -90,18 +123,19 @@ def get_all_users_route(current_user_id):
 @admin_bp.route('/scans', methods=['GET'])
 @admin_required
 def get_all_scans_route(current_user_id):
-    """FIX: Retrieves a list of all analyzed images across all users for admin view."""
+    """
+    FIX: Retrieves the analyzed images across all users for admin view, newest
+    first, paged with ?limit=&cursor= (?limit=all streams every scan).
+    """
     try:
-        scans = image_model.get_all_system_scans()
-        
-        # FIX: Handle case where DB returns None on failure
-        if scans is None:
-            current_app.logger.error("Database query for all system scans returned None. Returning empty list.")
-            scans = []
-            
-        # Format the image URLs and dates for the frontend
-        formatted_scans = []
-        for scan in scans:
+        limit, after = page_request(allow_all=True)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        size = requested_image_size(128)
+
+        def format_scan(scan):
             # FIX 1: Map new aliases back to expected frontend names
             scan['user_id'] = scan.pop('scan_user_id', None)
             scan['username'] = scan.pop('scan_username', 'N/A')
@@ -115,14 +149,20 @@ def get_all_scans_route(current_user_id):
             if not file_path_db or file_path_db == '#':
                  scan['file_path'] = url_for('serve_uploaded_file', filename='placeholder.png', _external=True) 
             else:
-                 filename = file_path_db.split('/')[-1]
-                 scan['file_path'] = url_for('serve_uploaded_file', filename=filename, _external=True)
+                 # 128 px thumbnails for the table (?size=512|original); original_path links the photo
+                 set_image_urls(scan, size)
                  
             scan['upload_date'] = scan['upload_date'].isoformat() if scan.get('upload_date') else None
-            
-            formatted_scans.append(scan)
-
-        return jsonify(formatted_scans), 200
+            return scan
+
+        # Rows are formatted and written to the client as they arrive from MySQL:
+        # memory stays flat however many scans there are (?format=ndjson for NDJSON)
+        scans = image_model.iter_all_system_scans(limit=limit and limit + 1, after=after)
+        return stream_json_page(scans, limit, 'upload_date', 'image_id', transform=format_scan)
+    except Error as e:
+        # FIX: A failed query shows an empty table instead of breaking the admin page
+        current_app.logger.error(f"Database query for all system scans failed: {e}. Returning empty list.")
+        return jsonify([]), 200
     except Exception as e:
         current_app.logger.error(f"Admin all scans error: Critical exception during data fetching/formatting: {e}")
         return jsonify({"message": f"Server Error (500): Failed to process scan data. Exception: {str(e)}"}), 500
@@ -135,17 +175,22 @@ def get_all_scans_route(current_user_id):
 @admin_bp.route('/feedbacks', methods=['GET'])
 @admin_required
 def get_all_feedbacks_route(current_user_id):
-    """Retrieves all feedback records with associated user information."""
+    """Retrieves feedback records with associated user information, newest first, paged with ?limit=&cursor=."""
     try:
-        feedbacks = feedback_model.get_all_feedbacks()
-        
-        # Convert datetime objects to string format for JSON serialization
-        for feedback in feedbacks:
+        limit, after = page_request(allow_all=True)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        def format_feedback(feedback):
+            # Convert datetime objects to string format for JSON serialization
             if feedback.get('submitted_at'):
                 # Convert to string and remove timezone for simplicity in JS
                 feedback['submitted_at'] = feedback['submitted_at'].isoformat().split('.')[0]
-                
-        return jsonify(feedbacks), 200
+            return feedback
+
+        feedbacks = feedback_model.iter_all_feedbacks(limit=limit and limit + 1, after=after)
+        return stream_json_page(feedbacks, limit, 'submitted_at', 'feedback_id', transform=format_feedback)
     except Exception as e:
         current_app.logger.error(f"Admin feedbacks error: {e}")
         return jsonify({"message": "Failed to retrieve feedback list"}), 500
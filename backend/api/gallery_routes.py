@@ -1,10 +1,22 @@
-from flask import Blueprint, request, jsonify, current_app, url_for
+from flask import Blueprint, request, jsonify, current_app, url_for, redirect
 from backend.api.user_routes import token_required # Re-use the JWT decorator
+from backend.api.utils import requested_image_size, set_image_urls, image_url, page_request, paginate, paged_json
+from backend.api.scan_routes import locate_heatmap, send_heatmap
 from backend.models.image_model import ImageModel
+from backend.models.embedding_model import EmbeddingModel
+from backend.models.user_model import UserModel
+import os
+import threading
 
 # Create Blueprint
 gallery_bp = Blueprint('gallery_bp', __name__)
 image_model = ImageModel()
+embedding_model = EmbeddingModel()
+user_model = UserModel()
+
+# "Similar scans" index: built lazily on first use (any APP_ROLE), then refreshed incrementally and rebuilt periodically
+similarity_service = None
+_similarity_lock = threading.Lock()
 
 # ==============================================================================
 # --- Gallery/Image Routes (/api/gallery) ---
@@ -16,20 +28,29 @@ def get_gallery_route(current_user_id):
     """
     Retrieves the list of analyzed images for the user's gallery overview.
     Matches the functionality of the original project's gallery page.
+    file_path links to the 512 px thumbnail (?size=128|512|original), original_path to the photo.
+    Paged newest first with ?limit=&cursor=; the next page's cursor is in X-Next-Cursor.
     """
     try:
-        images = image_model.get_user_gallery(current_user_id)
+        limit, after = page_request()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        images = image_model.get_user_gallery(current_user_id, limit=limit + 1, after=after)
+        if images is None:
+            return jsonify({"message": "Failed to retrieve gallery data"}), 500
+        images, next_cursor = paginate(images, limit, 'upload_date', 'image_id')
+        size = requested_image_size(512)
         
         # Format the image URLs for the frontend
         for image in images:
-            # Assuming file_path in DB is 'uploads/unique_id.jpg', extract the filename
-            filename = image['file_path'].split('/')[-1]
-            # Use Flask's url_for to generate the full public URL for the image
-            image['file_path'] = url_for('serve_uploaded_file', filename=filename, _external=True)
+            # file_path in DB is 'uploads/unique_id.jpg'; link the thumbnail and the original
+            set_image_urls(image, size)
             # Convert date object to string if needed (MySQL returns datetime object)
             image['upload_date'] = image['upload_date'].isoformat() if image.get('upload_date') else None
 
-        return jsonify(images), 200
+        return paged_json(images, next_cursor)
     except Exception as e:
         current_app.logger.error(f"Error fetching gallery: {e}")
         return jsonify({"message": "Failed to retrieve gallery data"}), 500
@@ -49,12 +70,143 @@ def get_image_detail_route(image_id, current_user_id):
             return jsonify({"message": "Image not found or unauthorized"}), 404
 
         # Prepare file_path URL for the frontend
-        filename = detail['file_path'].split('/')[-1]
-        detail['file_path'] = url_for('serve_uploaded_file', filename=filename, _external=True)
+        detail['file_path'] = image_url(detail['file_path'])
         detail['upload_date'] = detail['upload_date'].isoformat() if detail.get('upload_date') else None
 
         return jsonify(detail), 200
         
     except Exception as e:
         current_app.logger.error(f"Error fetching image detail {image_id}: {e}")
-        return jsonify({"message": "Failed to retrieve image details"}), 500
\ No newline at end of file
+        return jsonify({"message": "Failed to retrieve image details"}), 500
+
+
+@gallery_bp.route('/<int:image_id>/heatmap', methods=['GET'])
+@token_required
+def get_image_heatmap_route(image_id, current_user_id):
+    """
+    Returns the cached Grad-CAM overlay PNG for an image. Heatmaps are rendered
+    where the model lives, so an uncached one is redirected (307, same request)
+    to /api/scan/<id>/heatmap, which inference workers serve.
+    """
+    _, heatmap_path, error = locate_heatmap(image_id, current_user_id)
+    if error:
+        return error
+    if os.path.exists(heatmap_path):
+        return send_heatmap(heatmap_path)
+    return redirect(url_for('scan_bp.get_image_heatmap', image_id=image_id), code=307)
+
+
+def get_similarity_service():
+    """
+    Returns the process-wide similarity service, creating it (and loading every
+    stored embedding) on first use. Embeddings are read for the serving model's
+    version, or the newest stored version on workers without a model.
+    """
+    global similarity_service
+    if similarity_service is not None:
+        return similarity_service
+
+    with _similarity_lock:
+        if similarity_service is None:
+            import backend.api.scan_routes as scan_routes
+            predict_service = scan_routes.predict_service
+            model_version = getattr(predict_service, 'model_version', None) or embedding_model.get_latest_model_version()
+            if model_version is None:
+                return None
+
+            from backend.ml_model.similarity_index import SimilarityIndex, SimilarityService
+            config = current_app.config
+            index = SimilarityIndex(
+                mode=config.get('SIMILARITY_INDEX_MODE', 'flat'),
+                nlist=config.get('SIMILARITY_IVF_LISTS', 256),
+                nprobe=config.get('SIMILARITY_IVF_PROBES', 16),
+                pq_subvectors=config.get('SIMILARITY_PQ_SUBVECTORS', 16),
+                train_size=config.get('SIMILARITY_TRAIN_SIZE', 20000)
+            )
+            service = SimilarityService(
+                embedding_model, model_version, index,
+                refresh_interval=config.get('SIMILARITY_REFRESH_SECONDS', 2.0),
+                rebuild_interval=config.get('SIMILARITY_REBUILD_SECONDS', 3600)
+            )
+            service.refresh(force=True)
+            similarity_service = service
+    return similarity_service
+
+
+@gallery_bp.route('/<int:image_id>/similar', methods=['GET'])
+@token_required
+def get_similar_scans_route(image_id, current_user_id):
+    """
+    Returns the k past scans that look most like this one (cosine similarity of
+    leaf embeddings). Optional filters:
+      class=<disease name> | class=same  - only scans with that predicted class
+      radius_km=<km> [&lat=..&lon=..]    - only scans within radius of the point
+                                           (default: this scan's location)
+      scope=all                          - admins only: search every user's scans
+    """
+    user = user_model.find_user_by_id(current_user_id)
+    is_admin = bool(user and user.get('role') == 'admin')
+    scope = request.args.get('scope', 'mine')
+    if scope == 'all' and not is_admin:
+        return jsonify({"message": "Authorization failed: Admin access required for scope=all"}), 403
+
+    # Admins may query any scan; users only their own
+    if is_admin:
+        detail = embedding_model.get_scan_summaries([image_id]).get(image_id)
+    else:
+        detail = image_model.get_image_details(image_id, current_user_id)
+    if not detail:
+        return jsonify({"message": "Image not found or unauthorized"}), 404
+
+    try:
+        k = max(1, min(int(request.args.get('k', 10)), current_app.config.get('SIMILARITY_MAX_K', 50)))
+        radius_km = float(request.args['radius_km']) if request.args.get('radius_km') else None
+        lat = float(request.args['lat']) if request.args.get('lat') else None
+        lon = float(request.args['lon']) if request.args.get('lon') else None
+    except ValueError:
+        return jsonify({"message": "k, radius_km, lat and lon must be numbers"}), 400
+
+    class_name = request.args.get('class') or None
+    if class_name == 'same':
+        class_name = detail.get('predicted_class')
+
+    center = None
+    if radius_km is not None:
+        if lat is None or lon is None:
+            lat, lon = detail.get('scan_latitude'), detail.get('scan_longitude')
+        if lat is None or lon is None:
+            return jsonify({"message": "radius_km needs lat/lon (this scan has no location)"}), 400
+        center = (float(lat), float(lon))
+
+    service = get_similarity_service()
+    if service is None:
+        return jsonify({"message": "No scan embeddings are available yet"}), 503
+
+    # Over-fetch slightly: archived scans are dropped when the results are hydrated
+    matches = service.similar_to(
+        image_id, k=k + 10, class_name=class_name, center=center, radius_km=radius_km,
+        user_id=None if scope == 'all' else current_user_id
+    )
+    if matches is None:
+        return jsonify({"message": "This scan has no embedding (it predates similarity search)"}), 404
+
+    summaries = embedding_model.get_scan_summaries([match_id for match_id, _ in matches])
+    results = []
+    for match_id, similarity in matches:
+        summary = summaries.get(match_id)
+        if not summary:
+            continue
+        results.append({
+            "image_id": match_id,
+            "similarity": round(similarity, 4),
+            "predicted_class": summary['predicted_class'],
+            "confidence_score": float(summary['confidence_score']) if summary['confidence_score'] is not None else None,
+            "tree_name": summary['tree_name'],
+            "farm_name": summary['farm_name'],
+            "file_path": image_url(summary['file_path']),
+            "upload_date": summary['upload_date'].isoformat() if summary.get('upload_date') else None
+        })
+        if len(results) == k:
+            break
+
+    return jsonify({"image_id": image_id, "count": len(results), "results": results}), 200
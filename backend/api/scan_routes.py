@@ -1,33 +1,120 @@
 # adarshns007/my-project/my-project-b969c78bfb99d884a2432d5eaa1211441070eb9e/backend/api/scan_routes.py
-from flask import Blueprint, request, jsonify, current_app, url_for
+from flask import Blueprint, request, jsonify, current_app, url_for, send_file
 from werkzeug.utils import secure_filename
 from backend.api.user_routes import token_required 
+from backend.api.utils import requested_image_size, set_image_urls, page_request, paginate, paged_json
 from backend.models.image_model import ImageModel
 from backend.models.disease_model import DiseaseModel 
-from backend.ml_model.predict_service import PredictService 
+from backend.services.upload_ingest import ingest_file
+from backend.services.image_store import ImageStore, file_path_for
+from backend.api.utils import image_url
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
-import uuid
 
 # Create Blueprint
 scan_bp = Blueprint('scan_bp', __name__)
 image_model = ImageModel()
 disease_model = DiseaseModel() 
 predict_service = None 
+scan_worker = None # Background pool for async scans, injected by app.py
+heatmap_service = None # Grad-CAM renderer, injected by app.py when the Keras model is loaded
+
+# NOTE: backend.ml_model is imported lazily (inside the handlers) so API-only 
+# workers (APP_ROLE=api) never load NumPy/OpenCV/TensorFlow.
+
+# Model states reported by get_model_status (the first three mirror ModelLoader)
+MODEL_LOADING = 'loading'
+MODEL_READY = 'ready'
+MODEL_FAILED = 'failed'
+MODEL_DISABLED = 'disabled' # APP_ROLE=api: this process never loads the model
+
+# Must match backend.ml_model.gradcam.HEATMAP_SUFFIX (not imported: API-only workers skip the ML stack)
+HEATMAP_SUFFIX = '.heatmap.png'
 
 def allowed_file(filename):
     """Checks if the file extension is allowed."""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
+def get_model_status():
+    """
+    Model state as seen by this worker: the loader state machine (loading /
+    ready / failed, plus warm-up progress), reported 'ready' only once the
+    prediction service built on the model is in place.
+    """
+    if current_app.config.get('APP_ROLE', 'all') == 'api':
+        return {"state": MODEL_DISABLED}
+
+    if current_app.config.get('INFERENCE_MODE') == 'remote':
+        state = MODEL_READY if predict_service is not None else MODEL_FAILED
+        return {"state": state, "inference_mode": "remote"}
+
+    from backend.ml_model.model_loader import ModelLoader
+
+    status = ModelLoader.get_status()
+    if status['state'] == MODEL_READY and predict_service is None:
+        status['state'] = MODEL_FAILED
+    status['inference_mode'] = 'local'
+    return status
+
+def model_unavailable_response(action):
+    """503 for scan requests arriving before the model is ready (with Retry-After while it loads)."""
+    state = get_model_status()['state']
+    if state == MODEL_DISABLED:
+        return jsonify({"message": "Image analysis is not served by this worker."}), 503
+
+    if state == MODEL_LOADING:
+        current_app.logger.info(f"{action} deferred: ML model is still loading.")
+        return jsonify({"message": "The analysis model is still warming up. Please try again in a few seconds."}), 503, {'Retry-After': '5'}
+
+    current_app.logger.error(f"{action} failed: ML model service is unavailable.")
+    return jsonify({"message": "Image analysis is temporarily disabled. ML model file is missing or failed to load."}), 503
+
+def upload_too_large_response():
+    """413 for uploads over MAX_UPLOAD_BYTES (per image) or MAX_CONTENT_LENGTH (per request)."""
+    image_mb = (current_app.config.get('MAX_UPLOAD_BYTES') or 0) // (1024 * 1024)
+    request_mb = (current_app.config.get('MAX_CONTENT_LENGTH') or 0) // (1024 * 1024)
+    return jsonify({
+        "message": f"Upload too large. Each image may be at most {image_mb} MB and each request at most {request_mb} MB."
+    }), 413
+
+@scan_bp.errorhandler(RequestEntityTooLarge)
+def handle_upload_too_large(error):
+    # Raised while the multipart body streams in, before the oversized file is fully buffered
+    return upload_too_large_response()
+
+def build_result_payload(predicted_class_name, confidence_score, raw_output, disease_details=None):
+    """Builds the 'result' block returned to the scan page, including treatment details."""
+    if disease_details is None:
+        disease_details = disease_model.get_disease_by_name(predicted_class_name)
+    return {
+        "class": predicted_class_name,
+        "confidence": confidence_score,
+        "raw_data": raw_output,
+        "treatment_details": {
+            "organic": disease_details['organic_treatment'] if disease_details else "N/A",
+            "chemical": disease_details['chemical_treatment'] if disease_details else "N/A"
+        }
+    }
+
 @scan_bp.route('/upload-and-analyze', methods=['POST'])
 @token_required
 def upload_and_analyze(current_user_id):
     """
     Handles image upload, runs the ML model, and saves the result to the database.
+    The image is validated and analyzed in memory first; rejected uploads are 
+    never written to disk or the database.
+    With async=true the image is stored as a 'pending' scan job instead, and 
+    the request returns 202 immediately; poll /api/scan/jobs/<job_id> for the result.
     """
     if predict_service is None:
-        current_app.logger.error("Image analysis failed: ML model service is unavailable.")
-        return jsonify({"message": "Image analysis is temporarily disabled. ML model file is missing or failed to load."}), 503
+        return model_unavailable_response("Image analysis")
+    from backend.ml_model.batch_scheduler import InferenceQueueFull # Already loaded with the model
+
+    # Reject oversized single-image uploads from the headers, before reading the body
+    max_upload_bytes = current_app.config.get('MAX_UPLOAD_BYTES')
+    if max_upload_bytes and request.content_length and request.content_length > max_upload_bytes + 64 * 1024:
+        return upload_too_large_response()
 
     if 'image' not in request.files:
         return jsonify({"message": "No image file provided"}), 400
@@ -37,94 +124,325 @@ def upload_and_analyze(current_user_id):
     # FIX: Retrieve real-time scan coordinates from form data
     scan_latitude = request.form.get('scan_latitude')
     scan_longitude = request.form.get('scan_longitude')
+    async_mode = (request.form.get('async') or request.args.get('async') or '').lower() in ('1', 'true')
 
     if image_file.filename == '':
         return jsonify({"message": "No selected file"}), 400
 
     if image_file and allowed_file(image_file.filename):
+        # Uploads are stored by content hash; identical images share one file. A blob left
+        # unreferenced by a failed request is not deleted here (another request may be about
+        # to reference it): `python -m backend.services.image_store gc` collects it later.
+        store = ImageStore.from_app()
+
+        def persist_upload():
+            key, _ = store.put(ingest, file_extension)
+            return file_path_for(key)
+
         try:
-            # 1. Secure Filename and Path Setup
+            # 1. Secure Filename
             original_filename = secure_filename(image_file.filename)
             file_extension = original_filename.rsplit('.', 1)[1].lower()
             
-            unique_filename = f"{uuid.uuid4()}.{file_extension}"
-            save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-            
-            image_file.seek(0) 
-            image_file.save(save_path)
+            # The body was streamed once into a temp file + one in-memory buffer, hashed on the way.
+            # The temp file only enters the image store once the image has passed validation.
+            ingest = ingest_file(image_file, current_app.config['UPLOAD_FOLDER'], max_upload_bytes)
+            image_data = ingest.getvalue()
+
+            if async_mode:
+                # Reject unreadable/blurry/dark/non-leaf photos before queueing them
+                predict_service.check_quality(image_data, content_hash=ingest.content_hash)
+                relative_file_path = persist_upload()
+
+                # Queue the scan: the 'pending' row is the durable job record
+                image_id = image_model.create_image(
+                    user_id=current_user_id, 
+                    file_path=relative_file_path, 
+                    tree_id=tree_id if tree_id else None, 
+                    status='pending',
+                    scan_latitude=scan_latitude if scan_latitude else None,
+                    scan_longitude=scan_longitude if scan_longitude else None,
+                    content_hash=ingest.content_hash
+                )
+                if not image_id:
+                    return jsonify({"message": "Failed to queue image for analysis"}), 500
+
+                if scan_worker is not None:
+                    scan_worker.notify()
+
+                return jsonify({
+                    "message": "Image queued for analysis",
+                    "job_id": image_id,
+                    "image_id": image_id,
+                    "status": "pending",
+                    "status_url": url_for('scan_bp.get_scan_job', job_id=image_id, _external=True),
+                    "file_path": image_url(relative_file_path)
+                }), 202
             
-            # 2. Run ML Prediction
-            image_file.seek(0) 
-            analysis_result = predict_service.analyze_image(image_file) 
+            # 2. Validate (quality gate) and run ML Prediction straight from the upload bytes
+            analysis_result = predict_service.analyze_bytes(image_data, content_hash=ingest.content_hash)
             
-            # 3. Fetch Disease Details
             predicted_class_name = analysis_result['predicted_class']
-            disease_details = disease_model.get_disease_by_name(predicted_class_name) 
-            
-            # 4. Save Image Record to MySQL
-            relative_file_path = f"uploads/{unique_filename}" 
+
+            # 3. Only images that passed validation are written to the image store
+            relative_file_path = persist_upload()
             
+            # 4. Image, prediction and embedding rows in one transaction (one commit)
             # FIX: Pass scan coordinates to the model
-            image_id = image_model.create_image(
-                user_id=current_user_id, 
-                file_path=relative_file_path, 
-                tree_id=tree_id if tree_id else None, 
-                status='analyzed',
-                scan_latitude=scan_latitude if scan_latitude else None,
-                scan_longitude=scan_longitude if scan_longitude else None
-            )
+            image_ids = image_model.create_analyzed_images_bulk(current_user_id, [{
+                "file_path": relative_file_path,
+                "content_hash": ingest.content_hash,
+                "tree_id": tree_id if tree_id else None,
+                "scan_latitude": scan_latitude if scan_latitude else None,
+                "scan_longitude": scan_longitude if scan_longitude else None,
+                "predicted_class": predicted_class_name,
+                "confidence_score": analysis_result['confidence_score'],
+                "raw_output": analysis_result['raw_output'],
+                # Leaf embedding for the "similar scans" index (when enabled)
+                "embedding": analysis_result.get('embedding')
+            }], model_version=predict_service.model_version)
             
-            if not image_id:
-                os.remove(save_path)
+            if not image_ids:
                 return jsonify({"message": "Failed to save image metadata"}), 500
-
-            # 5. Save Prediction Result to MySQL
-            image_model.save_prediction(
-                image_id=image_id,
-                predicted_class=predicted_class_name,
-                confidence_score=analysis_result['confidence_score'],
-                raw_output=analysis_result['raw_output']
-            )
+            image_id = image_ids[0]
 
             # 6. Compile and Return Response
-            image_url = url_for('serve_uploaded_file', filename=unique_filename, _external=True)
-
             return jsonify({
                 "message": "Image analyzed and saved successfully",
                 "image_id": image_id,
-                "file_path": image_url,
-                "result": {
-                    "class": predicted_class_name,
-                    "confidence": analysis_result['confidence_score'],
-                    "raw_data": analysis_result['raw_output'],
-                    "treatment_details": {
-                        "organic": disease_details['organic_treatment'] if disease_details else "N/A",
-                        "chemical": disease_details['chemical_treatment'] if disease_details else "N/A"
-                    }
-                }
+                "file_path": image_url(relative_file_path),
+                # 3. Fetch Disease Details
+                "result": build_result_payload(
+                    predicted_class_name,
+                    analysis_result['confidence_score'],
+                    analysis_result['raw_output']
+                )
             }), 200
 
+        except RequestEntityTooLarge:
+            return upload_too_large_response()
         except ValueError as ve:
-            if os.path.exists(save_path):
-                os.remove(save_path) 
             return jsonify({"message": str(ve)}), 400
+        except InferenceQueueFull as qf:
+            current_app.logger.warning(f"Image analysis rejected: {qf}")
+            return jsonify({"message": "The analysis service is busy. Please try again in a moment."}), 503, {'Retry-After': '1'}
         except Exception as e:
             current_app.logger.error(f"Image analysis failed: {e}")
-            if os.path.exists(save_path):
-                os.remove(save_path)
             return jsonify({"message": "An unexpected server error occurred during analysis"}), 500
 
+@scan_bp.route('/batch-analyze', methods=['POST'])
+@token_required
+def batch_analyze(current_user_id):
+    """
+    Bulk scan: analyzes many uploaded images in one request. Images are decoded
+    in parallel, run through the model in batches, and all image/prediction rows 
+    are written in a single transaction. Per-file failures (e.g. blurry photos)
+    are reported individually without failing the whole batch.
+    """
+    if predict_service is None:
+        return model_unavailable_response("Batch analysis")
+    from backend.ml_model.batch_scheduler import InferenceQueueFull # Already loaded with the model
+
+    image_files = request.files.getlist('images')
+    if not image_files:
+        return jsonify({"message": "No image files provided"}), 400
+
+    max_files = current_app.config.get('BATCH_SCAN_MAX_FILES', 200)
+    if len(image_files) > max_files:
+        return jsonify({"message": f"Too many files. A batch may contain at most {max_files} images."}), 400
+
+    # Optional per-file tree IDs (aligned with 'images'), or one tree_id for the whole batch
+    tree_ids = request.form.getlist('tree_ids')
+    default_tree_id = request.form.get('tree_id') or None
+    scan_latitude = request.form.get('scan_latitude') or None
+    scan_longitude = request.form.get('scan_longitude') or None
+
+    results = [{"filename": image_file.filename} for image_file in image_files]
+    accepted = []  # (result index, extension, IngestStream)
+
+    for index, image_file in enumerate(image_files):
+        if image_file.filename == '' or not allowed_file(image_file.filename):
+            results[index].update({"status": "rejected", "message": "Invalid or unsupported file type"})
+            continue
+        file_extension = secure_filename(image_file.filename).rsplit('.', 1)[1].lower()
+        # Already streamed to a temp file, hashed and buffered while the request body was parsed
+        ingest = ingest_file(image_file, current_app.config['UPLOAD_FOLDER'], current_app.config.get('MAX_UPLOAD_BYTES'))
+        accepted.append((index, file_extension, ingest))
+
+    try:
+        # 1. Decode + predict everything in batches
+        analyses = predict_service.analyze_batch(
+            [ingest.getvalue() for _, _, ingest in accepted],
+            content_hashes=[ingest.content_hash for _, _, ingest in accepted]
+        )
+    except InferenceQueueFull as qf:
+        current_app.logger.warning(f"Batch analysis rejected: {qf}")
+        return jsonify({"message": "The analysis service is busy. Please try again in a moment."}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        current_app.logger.error(f"Batch analysis failed: {e}")
+        return jsonify({"message": "An unexpected server error occurred during analysis"}), 500
+
+    # 2. Persist the files that passed (by content hash: duplicates share one stored file)
+    store = ImageStore.from_app()
+    records = []
+    for (index, file_extension, ingest), analysis in zip(accepted, analyses):
+        if isinstance(analysis, Exception):
+            results[index].update({"status": "rejected", "message": str(analysis)})
+            continue
+
+        key, _ = store.put(ingest, file_extension)
+
+        tree_id = tree_ids[index] if index < len(tree_ids) and tree_ids[index] else default_tree_id
+        records.append({
+            "index": index,
+            "file_path": file_path_for(key),
+            "content_hash": ingest.content_hash,
+            "tree_id": tree_id,
+            "scan_latitude": scan_latitude,
+            "scan_longitude": scan_longitude,
+            "predicted_class": analysis['predicted_class'],
+            "confidence_score": analysis['confidence_score'],
+            "raw_output": analysis['raw_output'],
+            "embedding": analysis.get('embedding')
+        })
+
+    # 3. One transaction for all image, prediction and embedding rows
+    image_ids = image_model.create_analyzed_images_bulk(current_user_id, records, model_version=predict_service.model_version)
+    if image_ids is None:
+        # Blobs written above are left to `image_store gc`
+        return jsonify({"message": "Failed to save image metadata"}), 500
+
+    for image_id, record in zip(image_ids, records):
+        record['image_id'] = image_id
+
+    # 4. One lookup for the treatment details of every predicted class
+    diseases = disease_model.get_diseases_by_names([record['predicted_class'] for record in records])
+
+    for record in records:
+        disease_details = diseases.get(record['predicted_class'])
+        results[record['index']].update({
+            "status": "analyzed",
+            "image_id": record['image_id'],
+            "file_path": image_url(record['file_path']),
+            "result": build_result_payload(
+                record['predicted_class'], record['confidence_score'], record['raw_output'],
+                disease_details=disease_details or {}
+            )
+        })
+
+    return jsonify({
+        "message": f"Analyzed {len(records)} of {len(image_files)} images",
+        "analyzed": len(records),
+        "rejected": len(image_files) - len(records),
+        "results": results
+    }), 200
+
+@scan_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@token_required
+def get_scan_job(job_id, current_user_id):
+    """
+    Reports the state of an asynchronous scan: queued, processing, failed or
+    analyzed (with the same result block as the synchronous upload).
+    """
+    job = image_model.get_scan_job(job_id, current_user_id)
+    if not job:
+        return jsonify({"message": "Scan job not found or unauthorized"}), 404
+
+    response = {
+        "job_id": job['image_id'],
+        "image_id": job['image_id'],
+        "file_path": image_url(job['file_path'])
+    }
+
+    if job['status'] == 'pending':
+        response["status"] = "processing" if job.get('job_token') else "queued"
+        return jsonify(response), 200, {'Retry-After': '1'}
+
+    if job['status'] == 'failed':
+        response["status"] = "failed"
+        response["message"] = job.get('job_error') or "Image analysis failed."
+        return jsonify(response), 200
+
+    response["status"] = "analyzed"
+    response["result"] = build_result_payload(
+        job['predicted_class'], float(job['confidence_score']), job['raw_output'] or {}
+    )
+    return jsonify(response), 200
+
 @scan_bp.route('/gallery', methods=['GET'])
 @token_required
 def get_gallery(current_user_id):
-    """Retrieves the list of analyzed images for the user's gallery."""
-    images = image_model.get_user_gallery(current_user_id)
+    """
+    Retrieves one page of the user's analyzed images, newest first (512 px thumbnails;
+    ?size=original for photos). ?limit=&cursor= page through it; see X-Next-Cursor.
+    """
+    try:
+        limit, after = page_request()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    images = image_model.get_user_gallery(current_user_id, limit=limit + 1, after=after)
     
     if images is None:
         images = []
         current_app.logger.error(f"Database query failed for user {current_user_id} when fetching gallery.")
 
+    images, next_cursor = paginate(images, limit, 'upload_date', 'image_id')
+    size = requested_image_size(512)
     for image in images:
-        image['file_path'] = url_for('serve_uploaded_file', filename=image['file_path'].split('/')[-1], _external=True)
+        set_image_urls(image, size)
     
-    return jsonify(images), 200
\ No newline at end of file
+    return paged_json(images, next_cursor)
+
+def locate_heatmap(image_id, user_id):
+    """
+    Resolves the upload behind an analyzed image and where its heatmap is cached.
+    Returns (image_path, heatmap_path, None), or (None, None, error response).
+    """
+    detail = image_model.get_image_details(image_id, user_id)
+    if not detail:
+        return None, None, (jsonify({"message": "Image not found or unauthorized"}), 404)
+    if detail.get('status') in ('pending', 'failed'):
+        return None, None, (jsonify({"message": "This image has not been analyzed yet"}), 409)
+
+    image_path = ImageStore.from_app().path(detail['file_path'])
+    if image_path is None:
+        return None, None, (jsonify({"message": "Original image file is missing"}), 404)
+    return image_path, os.path.splitext(image_path)[0] + HEATMAP_SUFFIX, None
+
+def send_heatmap(heatmap_path):
+    """Sends a cached heatmap PNG (private: it shows the user's own photo)."""
+    response = send_file(heatmap_path, mimetype='image/png')
+    response.cache_control.private = True
+    response.cache_control.max_age = 86400
+    return response
+
+@scan_bp.route('/<int:image_id>/heatmap', methods=['GET'])
+@token_required
+def get_image_heatmap(image_id, current_user_id):
+    """
+    Returns a Grad-CAM overlay PNG showing where on the leaf the model found
+    the disease. Rendered on first request (inference workers only, where the
+    model lives) and cached next to the upload.
+    """
+    image_path, heatmap_path, error = locate_heatmap(image_id, current_user_id)
+    if error:
+        return error
+
+    if not os.path.exists(heatmap_path):
+        if heatmap_service is None:
+            return jsonify({"message": "Heatmaps are not available on this server right now."}), 503
+        if not os.path.exists(image_path):
+            return jsonify({"message": "Original image file is missing"}), 404
+
+        from backend.ml_model.batch_scheduler import InferenceQueueFull # Loaded with the heatmap service
+        try:
+            heatmap_path = heatmap_service.get_heatmap(image_path)
+        except InferenceQueueFull as qf:
+            current_app.logger.warning(f"Heatmap for image {image_id} rejected: {qf}")
+            return jsonify({"message": "The analysis service is busy. Please try again in a moment."}), 503, {'Retry-After': '2'}
+        except Exception as e:
+            current_app.logger.error(f"Heatmap generation failed for image {image_id}: {e}")
+            return jsonify({"message": "Failed to generate heatmap"}), 500
+
+    return send_heatmap(heatmap_path)
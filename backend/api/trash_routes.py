@@ -1,5 +1,6 @@
-from flask import Blueprint, request, jsonify, current_app, url_for
+from flask import Blueprint, request, jsonify, current_app
 from backend.api.user_routes import token_required 
+from backend.api.utils import requested_image_size, set_image_urls, page_request, paginate, paged_json
 from backend.models.trash_model import TrashModel
 
 trash_bp = Blueprint('trash_bp', __name__)
@@ -12,17 +13,29 @@ trash_model = TrashModel()
 @trash_bp.route('/', methods=['GET'])
 @token_required
 def get_trash_route(current_user_id):
-    """Retrieves all archived images for the current user (the trash bin content)."""
+    """
+    Retrieves the current user's archived images (the trash bin content), most
+    recently archived first. Paged with ?limit=&cursor= (see X-Next-Cursor).
+    """
     try:
-        archived_images = trash_model.get_user_archived_images(current_user_id)
+        limit, after = page_request()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        archived_images = trash_model.get_user_archived_images(current_user_id, limit=limit + 1, after=after)
+        if archived_images is None:
+            return jsonify({"message": "Failed to retrieve trash content"}), 500
+        archived_images, next_cursor = paginate(archived_images, limit, 'archived_at', 'archive_id')
+        size = requested_image_size(512)
         
         for image in archived_images:
-            # Format file path and dates for the frontend
-            filename = image['file_path'].split('/')[-1]
-            image['file_path'] = url_for('serve_uploaded_file', filename=filename, _external=True)
+            # Format file path (thumbnail + original) and dates for the frontend
+            set_image_urls(image, size)
             image['archived_at'] = image['archived_at'].isoformat()
+            image['upload_date'] = image['upload_date'].isoformat() if image.get('upload_date') else None
             
-        return jsonify(archived_images), 200
+        return paged_json(archived_images, next_cursor)
     except Exception as e:
         current_app.logger.error(f"Error fetching trash: {e}")
         return jsonify({"message": "Failed to retrieve trash content"}), 500
@@ -50,4 +63,57 @@ def restore_image_route(image_id, current_user_id):
         return jsonify({"message": "Failed to restore image (not found in trash or unauthorized)"}), 400
     except Exception as e:
         current_app.logger.error(f"Error restoring image {image_id}: {e}")
-        return jsonify({"message": "Server error during restoration"}), 500
\ No newline at end of file
+        return jsonify({"message": "Server error during restoration"}), 500
+
+def _requested_image_ids():
+    """The JSON body's `image_ids` list as integers; raises ValueError if malformed."""
+    data = request.get_json(silent=True) or {}
+    image_ids = data.get('image_ids')
+    if not isinstance(image_ids, list) or not image_ids:
+        raise ValueError("Provide a non-empty 'image_ids' list.")
+    max_batch = current_app.config.get('TRASH_MAX_BATCH_SIZE', 500)
+    if len(image_ids) > max_batch:
+        raise ValueError(f"At most {max_batch} images can be changed at once.")
+    return [int(image_id) for image_id in image_ids]
+
+@trash_bp.route('/archive', methods=['POST'])
+@token_required
+def archive_images_route(current_user_id):
+    """Archives several images at once (one transaction). Body: {"image_ids": [...]}."""
+    try:
+        image_ids = _requested_image_ids()
+    except (TypeError, ValueError) as e:
+        return jsonify({"message": str(e) if isinstance(e, ValueError) else "Invalid image IDs."}), 400
+    try:
+        archived_ids = trash_model.archive_images(image_ids, current_user_id)
+        if archived_ids is None:
+            return jsonify({"message": "Failed to archive images"}), 500
+        return jsonify({
+            "message": f"{len(archived_ids)} images archived",
+            "archived": archived_ids,
+            "skipped": sorted(set(image_ids) - set(archived_ids))
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error archiving images {image_ids}: {e}")
+        return jsonify({"message": "Server error during archiving"}), 500
+
+@trash_bp.route('/restore', methods=['POST'])
+@token_required
+def restore_images_route(current_user_id):
+    """Restores several images from the trash bin at once (one transaction). Body: {"image_ids": [...]}."""
+    try:
+        image_ids = _requested_image_ids()
+    except (TypeError, ValueError) as e:
+        return jsonify({"message": str(e) if isinstance(e, ValueError) else "Invalid image IDs."}), 400
+    try:
+        restored_ids = trash_model.restore_images(image_ids, current_user_id)
+        if restored_ids is None:
+            return jsonify({"message": "Failed to restore images"}), 500
+        return jsonify({
+            "message": f"{len(restored_ids)} images restored",
+            "restored": restored_ids,
+            "skipped": sorted(set(image_ids) - set(restored_ids))
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error restoring images {image_ids}: {e}")
+        return jsonify({"message": "Server error during restoration"}), 500
@@ -1,5 +1,5 @@
 # adarshns007/my-project/my-project-b969c78bfb99d884a2432d5eaa1211441070eb9e/backend/api/user_routes.py
-from flask import Blueprint, request, jsonify, current_app, url_for
+from flask import Blueprint, request, jsonify, current_app
 from backend.models.farm_model import FarmModel
 from backend.models.tree_model import TreeModel
 from backend.models.image_model import ImageModel 
@@ -7,6 +7,7 @@ from backend.models.feedback_model import FeedbackModel
 from backend.models.statistics_model import StatisticsModel
 from backend.models.user_model import UserModel 
 from backend.models.disease_model import DiseaseModel # <-- ADDED IMPORT
+from backend.api.utils import requested_image_size, set_image_urls, image_url, page_request, paginate, paged_json
 from functools import wraps
 from flask_jwt_extended import jwt_required, get_jwt_identity 
 from backend.api.geo_utils import haversine_distance # Import Haversine utility
@@ -205,8 +206,7 @@ def get_image_detail_route(image_id, current_user_id):
     detail = image_model.get_image_details(image_id, current_user_id)
     if not detail:
         return jsonify({"message": "Image not found or unauthorized"}), 404
-    filename = detail['file_path'].split('/')[-1]
-    detail['file_path'] = url_for('serve_uploaded_file', filename=filename, _external=True)
+    detail['file_path'] = image_url(detail['file_path'])
     if detail.get('upload_date'):
         detail['upload_date'] = detail['upload_date'].isoformat()
     return jsonify(detail), 200
@@ -220,16 +220,23 @@ def get_tree_images_route(tree_id, current_user_id):
     farm = farm_model.get_farm_by_id(tree['farm_id'], current_user_id)
     if not farm:
         return jsonify({"message": "Unauthorized access to tree data"}), 403 
-    images = image_model.get_images_by_tree(tree_id)
+    # Newest first, paged with ?limit=&cursor= (next page's cursor in X-Next-Cursor)
+    try:
+        limit, after = page_request()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    images = image_model.get_images_by_tree(tree_id, limit=limit + 1, after=after)
     if images is None:
         images = []
         current_app.logger.error(f"Database query failed for user {current_user_id} when fetching tree images. Returning empty list.")
+    images, next_cursor = paginate(images, limit, 'upload_date', 'image_id')
+    # 512 px thumbnails by default (?size=128|512|original); original_path always links the photo
+    size = requested_image_size(512)
     for image in images:
-        filename = image['file_path'].split('/')[-1]
-        image['file_path'] = url_for('serve_uploaded_file', filename=filename, _external=True)
+        set_image_urls(image, size)
         if image.get('upload_date'):
             image['upload_date'] = image['upload_date'].isoformat()
-    return jsonify(images), 200
+    return paged_json(images, next_cursor)
 
 # ==============================================================================
 # --- User Profile and Settings Routes (/api/user) (omitted for brevity) ---
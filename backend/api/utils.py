@@ -1,5 +1,8 @@
-from flask import jsonify
+from flask import jsonify, request, url_for, current_app, Response, stream_with_context
+import base64
+import json
 from datetime import datetime, date
+from backend.services.image_store import key_for
 
 def format_date_to_iso(data):
     """
@@ -46,4 +49,170 @@ def json_response(data=None, message="Success", status_code=200):
         "data": formatted_data
     }
     
-    return jsonify(response_payload), status_code
\ No newline at end of file
+    return jsonify(response_payload), status_code
+
+
+def requested_image_size(default_size):
+    """
+    Image size for a listing: ?size=<px> (one of THUMBNAIL_SIZES) or
+    ?size=original, falling back to `default_size` (None = original).
+    """
+    size = request.args.get('size')
+    if size == 'original':
+        return None
+    if size and size.isdigit() and int(size) in current_app.config.get('THUMBNAIL_SIZES', ()):
+        return int(size)
+    return default_size
+
+
+def image_url(file_path, size=None):
+    """
+    Public URL of an uploaded image (images.file_path, e.g. 'uploads/ab/cd/<hash>.jpg'):
+    the original, or its `size` px derivative (generated on first request).
+    """
+    filename = key_for(file_path)
+    if size is None:
+        return url_for('serve_uploaded_file', filename=filename, _external=True)
+    return url_for('serve_thumbnail', size=size, filename=filename, _external=True)
+
+
+def set_image_urls(record, size):
+    """Points record['file_path'] at the requested derivative and adds the original as 'original_path'."""
+    file_path = record['file_path']
+    record['original_path'] = image_url(file_path)
+    record['file_path'] = image_url(file_path, size)
+    return record
+
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    """True if the client asked for newline-delimited JSON (?format=ndjson or an NDJSON Accept header)."""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def stream_json_rows(rows, transform=None, ndjson=None, rows_per_write=100):
+    """
+    Streams rows (e.g. DatabaseService.iter_query) to the client as a JSON
+    array, or as NDJSON, one object per line, without building the whole list
+    in memory. The first row is fetched before the response starts, so a
+    failing query still raises in the view and becomes a normal error response.
+    """
+    if ndjson is None:
+        ndjson = wants_ndjson()
+    rows = iter(rows)
+    first = next(rows, None)
+    dumps = current_app.json.dumps
+
+    def generate():
+        if first is None:
+            if not ndjson:
+                yield '[]'
+            return
+        buffer = [] if ndjson else ['[']
+        separator = ''
+        row = first
+        try:
+            while row is not None:
+                encoded = dumps(transform(row) if transform else row)
+                buffer.append(encoded + '\n' if ndjson else separator + encoded)
+                separator = ','
+                if len(buffer) >= rows_per_write:
+                    yield ''.join(buffer)
+                    buffer = []
+                row = next(rows, None)
+        except Exception as e:
+            # Headers are already sent: end the body early (the client sees invalid/truncated JSON)
+            current_app.logger.error(f"Streaming rows failed: {e}")
+            yield ''.join(buffer)
+            return
+        if not ndjson:
+            buffer.append(']')
+        yield ''.join(buffer)
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE if ndjson else 'application/json')
+
+
+# --- Keyset pagination ---
+# Listings are ordered newest first by (timestamp, id) and paged with ?limit=<n>&cursor=<opaque>.
+# The cursor of the next page is returned in the X-Next-Cursor header (absent on the last page).
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(sort_value, row_id):
+    """Opaque cursor for the position just after the row (sort_value, row_id)."""
+    if isinstance(sort_value, (datetime, date)):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, int(row_id)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(datetime, id) from a cursor made by encode_cursor; raises ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError, base64.binascii.Error):
+        raise ValueError("Invalid pagination cursor.")
+
+
+def page_request(allow_all=False):
+    """
+    (limit, after) from ?limit and ?cursor. `limit` defaults to PAGE_SIZE_DEFAULT
+    and is capped at PAGE_SIZE_MAX; with `allow_all`, ?limit=all returns None
+    (no paging). `after` is the decoded cursor or None for the first page.
+    Raises ValueError on bad input.
+    """
+    config = current_app.config
+    raw_limit = request.args.get('limit')
+    if raw_limit == 'all' and allow_all:
+        limit = None
+    elif raw_limit is None:
+        limit = config.get('PAGE_SIZE_DEFAULT', 50)
+    elif raw_limit.isdigit() and 1 <= int(raw_limit) <= config.get('PAGE_SIZE_MAX', 200):
+        limit = int(raw_limit)
+    else:
+        raise ValueError(f"limit must be between 1 and {config.get('PAGE_SIZE_MAX', 200)}.")
+
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+
+def paginate(rows, limit, sort_key, id_key):
+    """
+    Splits rows fetched with `limit + 1` into (page, next_cursor). Call before
+    the rows are formatted: the cursor is built from the raw sort values.
+    """
+    rows = list(rows or [])
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1][sort_key], page[-1][id_key])
+
+
+def paged_json(items, next_cursor):
+    """JSON array response carrying the next page's cursor in X-Next-Cursor."""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response, 200
+
+
+def stream_json_page(rows, limit, sort_key, id_key, transform=None):
+    """
+    stream_json_rows for a keyset-paged listing. `rows` were queried with
+    `limit + 1` (or without a limit when `limit` is None, which streams
+    everything, e.g. ?limit=all for exports); X-Next-Cursor is set as in paged_json.
+    """
+    if limit is None:
+        return stream_json_rows(rows, transform=transform)
+    page, next_cursor = paginate(rows, limit, sort_key, id_key)
+    response = stream_json_rows(page, transform=transform)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
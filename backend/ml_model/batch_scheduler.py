@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class InferenceQueueFull(RuntimeError):
+    """Raised when the batching queue is at capacity and cannot accept more work."""
+
+
+class BatchScheduler:
+    """
+    Dynamic micro-batching scheduler for model inference.
+
+    Concurrent callers submit single preprocessed tensors. A dedicated worker
+    thread collects them into batches of up to `max_batch_size` items (or
+    whatever has arrived within `max_wait_ms` of the first item), runs one
+    forward pass through `predict_fn`, and hands each caller its own slice
+    of the result.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=10.0, max_queue_depth=256,
+                 name='inference-batcher'):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue_depth)))
+        self._stop = threading.Event()
+
+        # Statistics (guarded by _stats_lock)
+        self._stats_lock = threading.Lock()
+        self._batch_size_histogram = {}
+        self._total_batches = 0
+        self._total_items = 0
+        self._rejected_items = 0
+        self._latencies_ms = deque(maxlen=2048)
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    # --- Public API ---
+
+    def submit(self, model_input):
+        """
+        Queues a single input (shape (H, W, C) or (1, H, W, C)) for inference.
+        Returns a concurrent.futures.Future resolving to that input's output row.
+        """
+        if self._stop.is_set():
+            raise RuntimeError("Inference scheduler has been shut down.")
+
+        tensor = np.asarray(model_input)
+        if tensor.ndim == 4:
+            if tensor.shape[0] != 1:
+                raise ValueError("BatchScheduler.submit expects a single image, not a batch.")
+            tensor = tensor[0]
+
+        future = Future()
+        try:
+            self._queue.put_nowait((tensor, future, time.perf_counter()))
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected_items += 1
+            raise InferenceQueueFull("Inference queue is full. Please retry shortly.")
+        return future
+
+    def predict(self, model_input, timeout=None):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(model_input).result(timeout=timeout)
+
+    def shutdown(self, timeout=5.0):
+        """Stops the worker thread after the queue has drained."""
+        self._stop.set()
+        self._worker.join(timeout=timeout)
+
+    def get_stats(self):
+        """Returns the batch-size histogram and latency percentiles for tuning."""
+        with self._stats_lock:
+            latencies = sorted(self._latencies_ms)
+            histogram = dict(sorted(self._batch_size_histogram.items()))
+            stats = {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "total_batches": self._total_batches,
+                "total_items": self._total_items,
+                "rejected_items": self._rejected_items,
+                "mean_batch_size": (self._total_items / self._total_batches) if self._total_batches else 0.0,
+                "batch_size_histogram": histogram,
+            }
+
+        stats["latency_ms"] = {
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+        }
+        return stats
+
+    # --- Worker ---
+
+    def _collect_batch(self):
+        """Blocks for the first item, then gathers more until the batch is full or the wait cap expires."""
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            # Callers may cancel queued inputs (e.g. the rest of a rejected batch); skip those
+            batch = [item for item in self._collect_batch() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            tensors = [item[0] for item in batch]
+            futures = [item[1] for item in batch]
+
+            try:
+                outputs = self.predict_fn(np.stack(tensors, axis=0))
+                if isinstance(outputs, (tuple, list)):
+                    results = [tuple(np.asarray(out)[i] for out in outputs) for i in range(len(batch))]
+                else:
+                    outputs = np.asarray(outputs)
+                    results = [outputs[i] for i in range(len(batch))]
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            finished_at = time.perf_counter()
+            with self._stats_lock:
+                size = len(batch)
+                self._batch_size_histogram[size] = self._batch_size_histogram.get(size, 0) + 1
+                self._total_batches += 1
+                self._total_items += size
+                for _, _, enqueued_at in batch:
+                    self._latencies_ms.append((finished_at - enqueued_at) * 1000.0)
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (0.0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return float(sorted_values[rank])
@@ -0,0 +1,105 @@
+"""
+Two-stage model cascade with confidence-based early exit.
+
+Every image goes through a small, fast first-stage classifier (e.g. a distilled
+MobileNet-size network). Only images whose first-stage top-1 confidence is
+below CASCADE_CONFIDENCE_THRESHOLD are re-run through the full model, so the
+clear-cut majority of scans (obvious 'Healthy', obvious 'Sooty Mould') never
+pay for the full CNN. Both models must be trained on DISEASE_CLASSES in the
+same order.
+"""
+import threading
+import time
+
+import numpy as np
+
+from .image_decode import normalize_batch
+
+STAGE_FAST = 1
+STAGE_FULL = 2
+# Value recorded under raw_output['cascade_stage'] for each stage
+STAGE_NAMES = {STAGE_FAST: 'stage1', STAGE_FULL: 'stage2'}
+
+
+def _predict_uint8(backend, batch):
+    """Forward pass on uint8 pixels, normalizing in Python for backends without a uint8 graph."""
+    if hasattr(backend, 'predict_uint8'):
+        return backend.predict_uint8(batch)
+    return backend.predict(normalize_batch(batch))
+
+
+class ModelCascade:
+    """
+    Routes a uint8 batch through the fast model, then escalates the
+    low-confidence rows to the full model in one sub-batch.
+    """
+
+    def __init__(self, fast_backend, full_backend, threshold=0.9):
+        self.fast_backend = fast_backend
+        self.full_backend = full_backend
+        self.threshold = float(threshold)
+        self._lock = threading.Lock()
+        self._images = {STAGE_FAST: 0, STAGE_FULL: 0}
+        self._seconds = {STAGE_FAST: 0.0, STAGE_FULL: 0.0}
+        self._batches = {STAGE_FAST: 0, STAGE_FULL: 0}
+
+    def predict(self, batch):
+        """
+        (N, H, W, 3) uint8 -> (probabilities (N, classes), embeddings, stages (N,)).
+
+        Rows answered by the fast model keep its probabilities; escalated rows
+        get the full model's. `embeddings` has zero width: the cascade is not
+        used with embeddings enabled (see PredictService).
+        """
+        start = time.perf_counter()
+        probabilities = np.array(_predict_uint8(self.fast_backend, batch), dtype=np.float32)
+        fast_seconds = time.perf_counter() - start
+
+        stages = np.full(len(batch), STAGE_FAST, dtype=np.int8)
+        escalate = np.flatnonzero(probabilities.max(axis=1) < self.threshold)
+        embeddings = np.zeros((len(batch), 0), dtype=np.float32)
+
+        full_seconds = 0.0
+        if escalate.size:
+            start = time.perf_counter()
+            full_probabilities = _predict_uint8(self.full_backend, batch[escalate])
+            full_seconds = time.perf_counter() - start
+
+            if full_probabilities.shape[1] != probabilities.shape[1]:
+                raise RuntimeError(
+                    f"Cascade models disagree on the number of classes "
+                    f"({probabilities.shape[1]} vs {full_probabilities.shape[1]})."
+                )
+            probabilities[escalate] = full_probabilities
+            stages[escalate] = STAGE_FULL
+
+        with self._lock:
+            self._images[STAGE_FAST] += len(batch) - escalate.size
+            self._images[STAGE_FULL] += escalate.size
+            self._batches[STAGE_FAST] += 1
+            self._seconds[STAGE_FAST] += fast_seconds
+            if escalate.size:
+                self._batches[STAGE_FULL] += 1
+                self._seconds[STAGE_FULL] += full_seconds
+
+        return probabilities, embeddings, stages
+
+    def get_stats(self):
+        """Per-stage routing counts and mean forward-pass time."""
+        with self._lock:
+            total = self._images[STAGE_FAST] + self._images[STAGE_FULL]
+            return {
+                "threshold": self.threshold,
+                "images": total,
+                "escalation_rate": round(self._images[STAGE_FULL] / total, 4) if total else 0.0,
+                "stages": {
+                    STAGE_NAMES[stage]: {
+                        "backend": backend.name,
+                        "answered": self._images[stage],
+                        "batches": self._batches[stage],
+                        "mean_batch_ms": round(self._seconds[stage] * 1000.0 / self._batches[stage], 3)
+                        if self._batches[stage] else 0.0,
+                    }
+                    for stage, backend in ((STAGE_FAST, self.fast_backend), (STAGE_FULL, self.full_backend))
+                },
+            }
@@ -0,0 +1,126 @@
+"""
+Converts the Keras mango leaf classifier into optimized CPU inference artifacts.
+
+Usage:
+    python -m backend.ml_model.convert_model \
+        --model ml_model_files/mango_leaf_classifier_final.h5 \
+        --formats tflite-fp16 tflite-int8 onnx \
+        --calibration-dir data/calibration_leaves
+
+Artifacts are written next to the source model using the naming convention
+expected by MODEL_BACKEND (e.g. mango_leaf_classifier_final.int8.tflite).
+"""
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+
+from config import Config
+from .inference_backends import (
+    ARTIFACT_SUFFIXES, ONNX, TFLITE_FP16, resolve_artifact_path
+)
+from .image_decode import decode_to_model_array, normalize_batch
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def list_image_files(directory):
+    """Recursively lists image files under a directory (sorted for reproducibility)."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def preprocess_file(path, image_size):
+    """
+    (1, H, W, 3) float32 model input for an image file, decoded and normalized
+    exactly like a production scan (PredictService: draft-mode decode to
+    model size, then normalize_batch).
+    """
+    with open(path, 'rb') as f:
+        pixels = decode_to_model_array(f.read(), image_size)
+    return normalize_batch(pixels[np.newaxis])
+
+
+def representative_dataset(calibration_dir, image_size, num_samples):
+    """
+    Yields preprocessed leaf images for int8 calibration. Images must go
+    through exactly the same preprocessing as production scans.
+    """
+    paths = list_image_files(calibration_dir)
+    if not paths:
+        raise ValueError(f"No calibration images found in {calibration_dir}")
+
+    random.Random(0).shuffle(paths)
+
+    def generator():
+        for path in paths[:num_samples]:
+            yield [preprocess_file(path, image_size)]
+
+    return generator
+
+
+def convert_tflite(model, output_path, quantization, calibration_dir=None, image_size=(224, 224), num_samples=200):
+    """Converts a Keras model to TFLite with float16 or full-integer int8 quantization."""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == TFLITE_FP16:
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        if not calibration_dir:
+            raise ValueError("int8 conversion requires --calibration-dir with representative leaf images")
+        converter.representative_dataset = representative_dataset(calibration_dir, image_size, num_samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+
+
+def convert_onnx(model, output_path, image_size=(224, 224), opset=13):
+    """Converts a Keras model to ONNX (requires the tf2onnx package)."""
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None, image_size[0], image_size[1], 3), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the Keras classifier into TFLite/ONNX artifacts.")
+    parser.add_argument('--model', default=Config.MODEL_PATH, help="Path to the source .h5 model")
+    parser.add_argument('--formats', nargs='+', default=list(ARTIFACT_SUFFIXES),
+                        choices=list(ARTIFACT_SUFFIXES), help="Artifacts to produce")
+    parser.add_argument('--calibration-dir', help="Directory of leaf images for int8 calibration")
+    parser.add_argument('--calibration-samples', type=int, default=200,
+                        help="Number of calibration images to use for int8")
+    parser.add_argument('--opset', type=int, default=13, help="ONNX opset version")
+    args = parser.parse_args(argv)
+
+    from tensorflow.keras.models import load_model
+    model = load_model(args.model, compile=False)
+
+    for fmt in args.formats:
+        output_path = resolve_artifact_path(args.model, fmt)
+        print(f"Converting {args.model} -> {output_path} ({fmt})")
+        if fmt == ONNX:
+            convert_onnx(model, output_path, Config.IMAGE_SIZE, args.opset)
+        else:
+            convert_tflite(model, output_path, fmt, args.calibration_dir, Config.IMAGE_SIZE,
+                           args.calibration_samples)
+        print(f"  wrote {os.path.getsize(output_path) / 1e6:.1f} MB")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
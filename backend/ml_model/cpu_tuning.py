@@ -0,0 +1,305 @@
+"""
+CPU thread topology for the inference runtime.
+
+By default TensorFlow sizes its intra-op pool to every core on the machine, so
+N gunicorn workers on a 16-core node start N x 16 compute threads and fight over
+the cores. resolve_thread_plan() instead splits the CPUs actually available to
+the container (affinity mask and cgroup CPU quota) across the web workers:
+
+    1. TF_INTRA_OP_THREADS / TF_INTER_OP_THREADS, if set explicitly
+    2. the autotuned profile at CPU_TUNING_PROFILE, if it was measured for the
+       same CPU count and worker count
+    3. heuristic: intra = available CPUs // workers, inter = 1
+
+The autotune command benchmarks candidate configurations against the real
+model, with one process per worker running concurrently, and writes the
+configuration with the best throughput whose p95 latency stays within budget:
+
+    python -m backend.ml_model.cpu_tuning show
+    python -m backend.ml_model.cpu_tuning autotune --workers 4 --p95-budget-ms 250
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger('leafguard.cpu_tuning')
+
+
+def _read_first_line(path):
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit():
+    """
+    CPU limit imposed by the cgroup quota (e.g. docker --cpus / k8s limits),
+    rounded up to whole CPUs, or None when unlimited. Supports cgroup v2
+    (cpu.max) and v1 (cpu.cfs_quota_us / cpu.cfs_period_us).
+    """
+    line = _read_first_line('/sys/fs/cgroup/cpu.max')
+    if line:
+        quota, _, period = line.partition(' ')
+        if quota != 'max' and period:
+            return max(1, math.ceil(int(quota) / int(period)))
+        return None
+
+    for base in ('/sys/fs/cgroup/cpu', '/sys/fs/cgroup/cpu,cpuacct'):
+        quota = _read_first_line(os.path.join(base, 'cpu.cfs_quota_us'))
+        period = _read_first_line(os.path.join(base, 'cpu.cfs_period_us'))
+        if quota and period and int(quota) > 0:
+            return max(1, math.ceil(int(quota) / int(period)))
+    return None
+
+
+def available_cpus():
+    """CPUs this process may actually use: the affinity mask, capped by the cgroup quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    return min(cpus, limit) if limit else cpus
+
+
+def heuristic_plan(cpus, workers):
+    """Even split of the available CPUs across workers; a single inter-op thread per worker."""
+    return {
+        "intra_op_threads": max(1, cpus // max(1, workers)),
+        "inter_op_threads": 1,
+    }
+
+
+def load_profile(path):
+    """Reads an autotuned profile written by `autotune`, or None if missing or unreadable."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable CPU tuning profile {path}: {e}")
+        return None
+
+
+def resolve_thread_plan(config, workers=None):
+    """
+    Thread plan for one worker process: {"intra_op_threads", "inter_op_threads",
+    "cpus", "workers", "source"}. `config` is a Flask config or the Config class
+    attributes as a dict; `workers` overrides WEB_CONCURRENCY (e.g. 1 for the
+    shared model server).
+    """
+    cpus = available_cpus()
+    workers = max(1, int(workers or config.get('WEB_CONCURRENCY') or 1))
+    plan = {"cpus": cpus, "workers": workers}
+
+    intra = config.get('TF_INTRA_OP_THREADS')
+    inter = config.get('TF_INTER_OP_THREADS')
+    if intra or inter:
+        defaults = heuristic_plan(cpus, workers)
+        plan.update({
+            "intra_op_threads": int(intra) if intra else defaults['intra_op_threads'],
+            "inter_op_threads": int(inter) if inter else defaults['inter_op_threads'],
+            "source": "config",
+        })
+        return plan
+
+    profile = load_profile(config.get('CPU_TUNING_PROFILE'))
+    if profile:
+        if profile.get('cpus') == cpus and profile.get('workers') == workers:
+            plan.update({
+                "intra_op_threads": int(profile['intra_op_threads']),
+                "inter_op_threads": int(profile['inter_op_threads']),
+                "source": "profile",
+            })
+            return plan
+        logger.warning(
+            f"CPU tuning profile was measured for {profile.get('cpus')} CPUs / {profile.get('workers')} workers, "
+            f"not {cpus} / {workers}; falling back to the heuristic. Re-run autotune on this node."
+        )
+
+    plan.update(heuristic_plan(cpus, workers))
+    plan["source"] = "heuristic"
+    return plan
+
+
+# --- Autotuning ---
+
+def candidate_plans(cpus, workers):
+    """
+    Candidate (intra, inter) pairs for one worker: powers of two up to the
+    worker's fair share (and the share itself), plus 2x oversubscription, each
+    with 1 or 2 inter-op threads.
+    """
+    share = max(1, cpus // workers)
+    intra_values = {1, share, min(cpus, share * 2)}
+    value = 2
+    while value < share:
+        intra_values.add(value)
+        value *= 2
+    return [
+        {"intra_op_threads": intra, "inter_op_threads": inter}
+        for intra in sorted(intra_values)
+        for inter in (1, 2)
+    ]
+
+
+def _bench_worker(model_path, backend, intra, inter, duration, batch_size):
+    """
+    Child-process body: loads the model with the given thread pools, then runs
+    closed-loop single-scan predictions for `duration` seconds. Prints per-call
+    latencies (ms) as JSON on stdout.
+    """
+    from .model_loader import ModelLoader
+
+    width, height = Config.IMAGE_SIZE
+    ModelLoader.load_model(
+        model_path, image_size=Config.IMAGE_SIZE, warmup_runs=Config.MODEL_WARMUP_RUNS, backend=backend,
+        thread_plan={"intra_op_threads": intra, "inter_op_threads": inter}
+    )
+    model = ModelLoader.get_backend()
+    predict = model.predict_uint8 if hasattr(model, 'predict_uint8') else model.predict
+    pixels = np.random.default_rng(0).integers(0, 256, size=(batch_size, height, width, 3), dtype=np.uint8)
+    if not hasattr(model, 'predict_uint8'):
+        pixels = pixels.astype(np.float32) / 255.0
+
+    latencies_ms = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        predict(pixels)
+        latencies_ms.append((time.perf_counter() - start) * 1000.0)
+    print(json.dumps({"latencies_ms": latencies_ms, "batch_size": batch_size}))
+
+
+def measure_plan(plan, workers, model_path, backend, duration, batch_size):
+    """
+    Runs `workers` benchmark processes concurrently with one candidate plan, so
+    contention between workers is part of the measurement. Returns aggregate
+    images/sec and latency percentiles.
+    """
+    from .batch_scheduler import _percentile
+
+    command = [
+        sys.executable, '-m', 'backend.ml_model.cpu_tuning', '_bench',
+        '--model', model_path, '--intra', str(plan['intra_op_threads']), '--inter', str(plan['inter_op_threads']),
+        '--duration', str(duration), '--batch-size', str(batch_size),
+    ]
+    if backend:
+        command += ['--backend', backend]
+
+    processes = [subprocess.Popen(command, stdout=subprocess.PIPE) for _ in range(workers)]
+    latencies_ms = []
+    images = 0
+    for process in processes:
+        output, _ = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"Benchmark worker failed for {plan} (exit code {process.returncode})")
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        latencies_ms.extend(result['latencies_ms'])
+        images += len(result['latencies_ms']) * result['batch_size']
+
+    latencies_ms.sort()
+    return dict(plan, **{
+        "images_per_sec": round(images / duration, 2),
+        "p50_ms": round(_percentile(latencies_ms, 50), 3),
+        "p95_ms": round(_percentile(latencies_ms, 95), 3),
+        "p99_ms": round(_percentile(latencies_ms, 99), 3),
+    })
+
+
+def pick_best(results, p95_budget_ms):
+    """Highest throughput among candidates within the p95 budget; lowest p95 if none qualifies."""
+    within_budget = [r for r in results if p95_budget_ms is None or r['p95_ms'] <= p95_budget_ms]
+    if within_budget:
+        return max(within_budget, key=lambda r: r['images_per_sec'])
+    return min(results, key=lambda r: r['p95_ms'])
+
+
+def autotune(model_path, backend, workers, p95_budget_ms, duration, batch_size):
+    """Benchmarks every candidate plan and returns the profile to write."""
+    cpus = available_cpus()
+    results = []
+    for plan in candidate_plans(cpus, workers):
+        result = measure_plan(plan, workers, model_path, backend, duration, batch_size)
+        print(f"intra {result['intra_op_threads']:>2}  inter {result['inter_op_threads']}: "
+              f"{result['images_per_sec']:8.2f} img/s  p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms")
+        results.append(result)
+
+    best = pick_best(results, p95_budget_ms)
+    return {
+        "intra_op_threads": best['intra_op_threads'],
+        "inter_op_threads": best['inter_op_threads'],
+        "cpus": cpus,
+        "workers": workers,
+        "model_path": model_path,
+        "backend": backend,
+        "p95_budget_ms": p95_budget_ms,
+        "measured_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "best": best,
+        "candidates": results,
+    }
+
+
+def config_values(config_class=Config):
+    """Config class attributes as a dict, for callers without a Flask app config."""
+    return {key: getattr(config_class, key) for key in dir(config_class) if key.isupper()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or autotune the inference thread topology.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    show = subparsers.add_parser('show', help="Print the thread plan this node would use")
+    show.add_argument('--workers', type=int, help="Worker processes (default: WEB_CONCURRENCY)")
+
+    tune = subparsers.add_parser('autotune', help="Benchmark candidate plans and write the best profile")
+    tune.add_argument('--model', default=Config.MODEL_PATH)
+    tune.add_argument('--backend', default=Config.MODEL_BACKEND)
+    tune.add_argument('--workers', type=int, default=Config.WEB_CONCURRENCY)
+    tune.add_argument('--p95-budget-ms', type=float, default=Config.CPU_TUNING_P95_BUDGET_MS,
+                      help="Only plans with p95 latency at or below this qualify")
+    tune.add_argument('--duration', type=float, default=10.0, help="Seconds measured per candidate")
+    tune.add_argument('--batch-size', type=int, default=1)
+    tune.add_argument('--output', default=Config.CPU_TUNING_PROFILE, help="Profile path (CPU_TUNING_PROFILE)")
+
+    bench = subparsers.add_parser('_bench')  # child mode for autotune
+    bench.add_argument('--model', required=True)
+    bench.add_argument('--backend')
+    bench.add_argument('--intra', type=int, required=True)
+    bench.add_argument('--inter', type=int, required=True)
+    bench.add_argument('--duration', type=float, required=True)
+    bench.add_argument('--batch-size', type=int, default=1)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    if args.command == '_bench':
+        _bench_worker(args.model, args.backend, args.intra, args.inter, args.duration, args.batch_size)
+        return 0
+
+    if args.command == 'show':
+        print(json.dumps(resolve_thread_plan(config_values(), workers=args.workers), indent=2))
+        return 0
+
+    profile = autotune(args.model, args.backend, max(1, args.workers), args.p95_budget_ms, args.duration, args.batch_size)
+    with open(args.output, 'w') as f:
+        json.dump(profile, f, indent=2)
+    print(f"Best: intra {profile['intra_op_threads']}, inter {profile['inter_op_threads']} "
+          f"({profile['best']['images_per_sec']} img/s, p95 {profile['best']['p95_ms']} ms). Written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Grad-CAM explanations ("where on the leaf is the disease?"), computed lazily.
+
+Heatmaps are never computed on the scan hot path. HeatmapService renders one
+on first request, caches the PNG next to the upload (<name>.heatmap.png), and
+serves the cached file afterwards. Concurrent requests for the same image share
+a single computation, and computations for different images are batched through
+the model together by a BatchScheduler.
+"""
+import os
+import threading
+import uuid
+from concurrent.futures import Future
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .batch_scheduler import BatchScheduler
+from .image_decode import decode_to_model_array
+from .inference_backends import KERAS
+
+HEATMAP_SUFFIX = '.heatmap.png'
+
+
+def heatmap_path_for(image_path):
+    """Cache location of the heatmap PNG for an uploaded image (next to the upload)."""
+    return os.path.splitext(image_path)[0] + HEATMAP_SUFFIX
+
+
+def _is_feature_map(layer):
+    shape = getattr(layer, 'output_shape', None) or getattr(getattr(layer, 'output', None), 'shape', None)
+    return shape is not None and len(shape) == 4
+
+
+class GradCam:
+    """
+    Batched Grad-CAM over the classifier's last convolutional feature map.
+    Takes raw uint8 pixels (normalization is part of the traced graph) and
+    returns per-image heatmaps in [0, 1] for each image's top-1 class.
+    """
+
+    def __init__(self, model, image_size=(224, 224), layer_name=None):
+        import tensorflow as tf
+
+        self._tf = tf
+        self.layer_name, forward = self._build_forward(model, layer_name)
+        width, height = image_size
+
+        @tf.function(input_signature=[tf.TensorSpec(shape=[None, height, width, 3], dtype=tf.uint8)])
+        def explain(pixels):
+            images = tf.cast(pixels, tf.float32) * (1.0 / 255.0)
+            with tf.GradientTape() as tape:
+                feature_maps, probabilities = forward(images)
+                class_indices = tf.argmax(probabilities, axis=-1, output_type=tf.int32)
+                # Summing the per-image top-1 scores keeps each image's gradient independent
+                scores = tf.gather(probabilities, class_indices, axis=1, batch_dims=1)
+                total = tf.reduce_sum(scores)
+            gradients = tape.gradient(total, feature_maps)
+
+            channel_weights = tf.reduce_mean(gradients, axis=(1, 2), keepdims=True)
+            cams = tf.nn.relu(tf.reduce_sum(feature_maps * channel_weights, axis=-1))
+            peaks = tf.reduce_max(cams, axis=(1, 2), keepdims=True)
+            cams = tf.math.divide_no_nan(cams, peaks)
+            return cams, class_indices
+
+        self._explain = explain.get_concrete_function()
+
+    def _build_forward(self, model, layer_name):
+        """
+        Returns (layer name, fn(images) -> (feature maps, probabilities)).
+        Handles plain CNNs and transfer-learning models whose convolutional
+        backbone is a nested Keras Model followed by a classification head.
+        """
+        tf = self._tf
+        layers = list(model.layers)
+        for index in range(len(layers) - 1, -1, -1):
+            layer = layers[index]
+
+            if isinstance(layer, tf.keras.Model):
+                inner = [l for l in layer.layers if _is_feature_map(l) and (layer_name in (None, l.name))]
+                if not inner:
+                    continue
+                backbone = tf.keras.Model(layer.inputs, [inner[-1].output, layer.output])
+                stem = [l for l in layers[:index] if not isinstance(l, tf.keras.layers.InputLayer)]
+                head = layers[index + 1:]
+
+                def forward(images, backbone=backbone, stem=stem, head=head):
+                    for stem_layer in stem:
+                        images = stem_layer(images, training=False)
+                    feature_maps, features = backbone(images, training=False)
+                    for head_layer in head:
+                        features = head_layer(features, training=False)
+                    return feature_maps, features
+
+                return inner[-1].name, forward
+
+            if _is_feature_map(layer) and layer_name in (None, layer.name):
+                grad_model = tf.keras.Model(model.inputs, [layer.output, model.output])
+                return layer.name, lambda images: grad_model(images, training=False)
+
+        raise RuntimeError("The model has no convolutional layer to explain.")
+
+    def explain(self, batch):
+        """(N, H, W, 3) uint8 -> (heatmaps (N, h, w) float32, top-1 class indices (N,))."""
+        cams, class_indices = self._explain(self._tf.convert_to_tensor(batch, dtype=self._tf.uint8))
+        return cams.numpy(), class_indices.numpy()
+
+
+def render_overlay(image_data, heatmap, max_size=512, alpha=0.4):
+    """
+    Blends a JET-coloured heatmap over the original photo (downscaled so its
+    longest side is at most `max_size`) and returns PNG bytes.
+    """
+    img = Image.open(BytesIO(image_data))
+    if img.format == 'JPEG':
+        img.draft('RGB', (max_size, max_size))
+    img = img.convert('RGB')
+    img.thumbnail((max_size, max_size))
+    photo = np.asarray(img, dtype=np.uint8)
+
+    height, width = photo.shape[:2]
+    heat = cv2.resize(heatmap.astype(np.float32), (width, height), interpolation=cv2.INTER_LINEAR)
+    colored = cv2.applyColorMap(np.uint8(np.clip(heat, 0.0, 1.0) * 255), cv2.COLORMAP_JET)
+    colored = cv2.cvtColor(colored, cv2.COLOR_BGR2RGB)
+    overlay = cv2.addWeighted(photo, 1.0 - alpha, colored, alpha, 0.0)
+
+    ok, png = cv2.imencode('.png', cv2.cvtColor(overlay, cv2.COLOR_RGB2BGR))
+    if not ok:
+        raise RuntimeError("Failed to encode heatmap PNG.")
+    return png.tobytes()
+
+
+class HeatmapService:
+    """
+    Lazily renders and caches Grad-CAM overlays for uploaded images.
+    Keras backend only: the lighter TFLite/ONNX runtimes expose no gradients.
+    """
+
+    def __init__(self, backend, image_size=(224, 224), max_batch_size=8, max_wait_ms=50,
+                 max_queue_depth=64, max_size=512, alpha=0.4, layer_name=None):
+        if backend.name != KERAS:
+            raise RuntimeError(f"Heatmaps need the Keras backend; the '{backend.name}' backend has no gradients.")
+
+        self.image_size = image_size
+        self.max_size = max_size
+        self.alpha = alpha
+        self.gradcam = GradCam(backend.model, image_size=image_size, layer_name=layer_name)
+        self.scheduler = BatchScheduler(
+            predict_fn=self.gradcam.explain,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue_depth=max_queue_depth,
+            name='heatmap-batcher'
+        )
+        # In-flight computations keyed by heatmap path (single-flight per image)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get_heatmap(self, image_path):
+        """
+        Returns the path of the cached heatmap PNG for `image_path`, computing it
+        first if needed. Callers racing on the same image wait for one computation.
+        """
+        output_path = heatmap_path_for(image_path)
+        if os.path.exists(output_path):
+            return output_path
+
+        with self._lock:
+            future = self._in_flight.get(output_path)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[output_path] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            # A previous owner may have finished between the check above and taking the lock
+            if not os.path.exists(output_path):
+                self._render(image_path, output_path)
+            future.set_result(output_path)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight.pop(output_path, None)
+        return future.result()
+
+    def _render(self, image_path, output_path):
+        with open(image_path, 'rb') as f:
+            image_data = f.read()
+
+        pixels = decode_to_model_array(image_data, self.image_size)
+        heatmap, _ = self.scheduler.predict(pixels)
+        png = render_overlay(image_data, heatmap, max_size=self.max_size, alpha=self.alpha)
+
+        # Write-then-rename so readers never see a partial PNG
+        tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, output_path)
+
+    def get_stats(self):
+        with self._lock:
+            in_flight = len(self._in_flight)
+        return {"layer": self.gradcam.layer_name, "in_flight": in_flight, "batching": self.scheduler.get_stats()}
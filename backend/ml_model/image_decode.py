@@ -0,0 +1,42 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+
+def decode_to_model_array(image_data, image_size=(224, 224), out=None):
+    """
+    Decodes raw image bytes straight into a (H, W, 3) uint8 array at model size.
+
+    For JPEGs the decoder's draft mode is used: libjpeg's DCT scaling decodes
+    at 1/2, 1/4 or 1/8 resolution (the smallest that is still >= image_size),
+    so a 12 MP phone photo is never fully materialized. Only the final small
+    resize runs at pixel level.
+
+    If `out` is given (a writable (H, W, 3) uint8 view, e.g. one row of a batch
+    buffer) the pixels are written into it and no new array is allocated.
+    """
+    # BytesIO over immutable bytes shares the buffer instead of copying it (other
+    # buffers, e.g. the memory-mapped upload, are copied once here)
+    img = Image.open(BytesIO(image_data))
+
+    if img.format == 'JPEG':
+        img.draft('RGB', tuple(image_size))
+
+    img = img.convert('RGB')
+    if img.size != tuple(image_size):
+        img = img.resize(tuple(image_size))
+
+    pixels = np.asarray(img, dtype=np.uint8)
+    if out is None:
+        return pixels
+    np.copyto(out, pixels)
+    return out
+
+
+def normalize_batch(batch, out=None):
+    """
+    Scales a uint8 batch to float32 in [0, 1] in a single pass (one allocation,
+    or none when `out` is a preallocated float32 buffer of the same shape).
+    """
+    return np.multiply(batch, np.float32(1.0 / 255.0), out=out, dtype=np.float32)
@@ -0,0 +1,223 @@
+import os
+import threading
+
+import numpy as np
+
+# Supported values for the MODEL_BACKEND config key
+KERAS = 'keras'
+TFLITE_FP16 = 'tflite-fp16'
+TFLITE_INT8 = 'tflite-int8'
+ONNX = 'onnx'
+
+BACKENDS = (KERAS, TFLITE_FP16, TFLITE_INT8, ONNX)
+
+# Artifact suffixes produced by convert_model.py next to the source .h5 file
+ARTIFACT_SUFFIXES = {
+    TFLITE_FP16: '.fp16.tflite',
+    TFLITE_INT8: '.int8.tflite',
+    ONNX: '.onnx',
+}
+
+
+def resolve_backend_name(model_path, backend=None):
+    """
+    Picks the inference backend. An explicit MODEL_BACKEND wins; otherwise the
+    backend is inferred from the MODEL_PATH extension (defaulting to keras).
+    """
+    if backend:
+        backend = backend.lower()
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown MODEL_BACKEND '{backend}'. Expected one of: {', '.join(BACKENDS)}")
+        return backend
+
+    path = model_path.lower()
+    if path.endswith('.onnx'):
+        return ONNX
+    if path.endswith('.tflite'):
+        return TFLITE_INT8 if path.endswith(ARTIFACT_SUFFIXES[TFLITE_INT8]) else TFLITE_FP16
+    return KERAS
+
+
+def resolve_artifact_path(model_path, backend):
+    """
+    Maps MODEL_PATH to the artifact a backend should load. If MODEL_PATH
+    already points at a converted artifact it is used as is; otherwise the
+    conventional sibling of the .h5 file is used (e.g. model.int8.tflite).
+    """
+    if backend == KERAS or not model_path.lower().endswith(('.h5', '.keras')):
+        return model_path
+    stem = os.path.splitext(model_path)[0]
+    return stem + ARTIFACT_SUFFIXES[backend]
+
+
+class KerasBackend:
+    """Full TensorFlow/Keras runtime using a traced, fixed-signature forward pass."""
+    name = KERAS
+
+    def __init__(self, model_path, image_size=(224, 224), num_threads=None, inter_op_threads=None):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+
+        self._tf = tf
+        # Thread pools can only be sized before the TF runtime executes its first op
+        try:
+            if num_threads:
+                tf.config.threading.set_intra_op_parallelism_threads(int(num_threads))
+            if inter_op_threads:
+                tf.config.threading.set_inter_op_parallelism_threads(int(inter_op_threads))
+        except RuntimeError:
+            pass  # Runtime already initialized in this process; keep its pools
+        self.model_path = model_path
+        # Load the H5 model for inference only: the optimizer, loss and
+        # metrics are never used for prediction, so skip compile().
+        self.model = load_model(model_path, compile=False)
+        self.inference_fn, self.uint8_inference_fn = self._build_inference_fns(self.model, image_size)
+        self.embedding_fn = self._build_embedding_fn(self.model, image_size)
+        self.supports_embeddings = self.embedding_fn is not None
+
+    def _build_inference_fns(self, model, image_size):
+        """
+        Traces the forward pass once with a fixed input signature
+        (variable batch, H x W x 3, float32). Calling the concrete graph avoids
+        the per-call data adapter and distribution setup of model.predict().
+        A second graph accepts raw uint8 pixels and folds the /255
+        normalization into the model, so no float32 copy is made in Python.
+        """
+        tf = self._tf
+        width, height = image_size
+
+        @tf.function(input_signature=[tf.TensorSpec(shape=[None, height, width, 3], dtype=tf.float32)])
+        def serve(images):
+            return model(images, training=False)
+
+        @tf.function(input_signature=[tf.TensorSpec(shape=[None, height, width, 3], dtype=tf.uint8)])
+        def serve_uint8(pixels):
+            return model(tf.cast(pixels, tf.float32) * (1.0 / 255.0), training=False)
+
+        return serve.get_concrete_function(), serve_uint8.get_concrete_function()
+
+    def _build_embedding_fn(self, model, image_size):
+        """
+        Traces a uint8 forward pass that also returns the penultimate-layer
+        embedding (the input of the final classification layer), so a scan
+        yields its class probabilities and its embedding in one pass.
+        Returns None if the model has no flat penultimate feature vector.
+        """
+        tf = self._tf
+        width, height = image_size
+        try:
+            features = model.layers[-1].input
+            if len(features.shape) != 2:
+                return None
+            embedding_model = tf.keras.Model(model.inputs, [model.output, features])
+        except (AttributeError, ValueError):
+            return None
+
+        @tf.function(input_signature=[tf.TensorSpec(shape=[None, height, width, 3], dtype=tf.uint8)])
+        def serve_with_embeddings(pixels):
+            return embedding_model(tf.cast(pixels, tf.float32) * (1.0 / 255.0), training=False)
+
+        return serve_with_embeddings.get_concrete_function()
+
+    def predict(self, batch):
+        batch = self._tf.convert_to_tensor(batch, dtype=self._tf.float32)
+        return self.inference_fn(batch).numpy()
+
+    def predict_uint8(self, batch):
+        """Same as predict() but takes unnormalized uint8 pixels."""
+        batch = self._tf.convert_to_tensor(batch, dtype=self._tf.uint8)
+        return self.uint8_inference_fn(batch).numpy()
+
+    def predict_with_embeddings_uint8(self, batch):
+        """uint8 pixels -> ((N, classes) probabilities, (N, D) penultimate embeddings)."""
+        batch = self._tf.convert_to_tensor(batch, dtype=self._tf.uint8)
+        probabilities, embeddings = self.embedding_fn(batch)
+        return probabilities.numpy(), embeddings.numpy()
+
+
+class TFLiteBackend:
+    """
+    TensorFlow Lite interpreter for float16 or int8-quantized artifacts.
+    Prefers the standalone tflite_runtime package so the full TensorFlow
+    runtime never has to be imported by the worker.
+    """
+
+    def __init__(self, model_path, name=TFLITE_FP16, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.name = name
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter is not thread-safe; calls are serialized.
+        self._lock = threading.Lock()
+
+    def _quantize(self, batch):
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, output):
+        if output.dtype == np.float32:
+            return output
+        scale, zero_point = self._output['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch):
+        batch = self._quantize(np.asarray(batch))
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+        return self._dequantize(output)
+
+
+class OnnxBackend:
+    """ONNX Runtime CPU execution provider."""
+    name = ONNX
+
+    def __init__(self, model_path, num_threads=None, inter_op_threads=None):
+        import onnxruntime as ort
+
+        self.model_path = model_path
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        if inter_op_threads:
+            options.inter_op_num_threads = int(inter_op_threads)
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+def create_backend(model_path, backend=None, image_size=(224, 224), num_threads=None, inter_op_threads=None):
+    """
+    Instantiates the inference backend selected by MODEL_BACKEND / MODEL_PATH.
+    Every backend exposes predict(batch) -> (N, num_classes) float32 probabilities.
+    `num_threads` / `inter_op_threads` size the runtime's intra-op and inter-op
+    thread pools (see cpu_tuning.py); None keeps the runtime default.
+    """
+    name = resolve_backend_name(model_path, backend)
+    artifact_path = resolve_artifact_path(model_path, name)
+
+    if name == KERAS:
+        return KerasBackend(artifact_path, image_size, num_threads=num_threads, inter_op_threads=inter_op_threads)
+    if name in (TFLITE_FP16, TFLITE_INT8):
+        return TFLiteBackend(artifact_path, name=name, num_threads=num_threads)
+    return OnnxBackend(artifact_path, num_threads=num_threads, inter_op_threads=inter_op_threads)
@@ -0,0 +1,84 @@
+import json
+import socket
+import threading
+
+import numpy as np
+
+from .batch_scheduler import InferenceQueueFull
+from .model_protocol import (
+    MAGIC, OP_INFO, OP_PREDICT, REQUEST_HEADER, RESPONSE_HEADER, STATUS_BUSY, STATUS_OK,
+    ProtocolError, recv_exact
+)
+
+
+class RemoteModelClient:
+    """
+    Inference backend that forwards preprocessed uint8 tensors to the shared
+    model server (see model_server.py) over a Unix-domain socket. Each calling
+    thread keeps its own persistent connection.
+    """
+    name = 'remote'
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _roundtrip(self, header, payload=None):
+        """Sends one request and returns (count, width, body). Reconnects once on a stale connection."""
+        for attempt in (1, 2):
+            try:
+                sock = self._connection()
+                sock.sendall(header)
+                if payload is not None:
+                    sock.sendall(payload)
+                magic, status, count, width = RESPONSE_HEADER.unpack(recv_exact(sock, RESPONSE_HEADER.size))
+                if magic != MAGIC:
+                    raise ProtocolError("Bad magic in model server response")
+                body_size = count * width * 4 if status == STATUS_OK and count else width
+                body = recv_exact(sock, body_size)
+                break
+            except (OSError, ProtocolError):
+                self._reset()
+                if attempt == 2:
+                    raise
+
+        if status == STATUS_BUSY:
+            raise InferenceQueueFull(body.decode('utf-8', 'replace'))
+        if status != STATUS_OK:
+            raise RuntimeError(f"Model server error: {body.decode('utf-8', 'replace')}")
+        return count, width, body
+
+    def get_info(self):
+        """Returns the server's model metadata (model_version, backend, classes)."""
+        _, _, body = self._roundtrip(REQUEST_HEADER.pack(MAGIC, OP_INFO, 0, 0, 0, 0))
+        return json.loads(body.decode('utf-8'))
+
+    def predict(self, batch):
+        """Sends an (N, H, W, C) uint8 batch and returns (N, num_classes) float32 probabilities."""
+        batch = np.ascontiguousarray(batch, dtype=np.uint8)
+        count, height, width, channels = batch.shape
+        header = REQUEST_HEADER.pack(MAGIC, OP_PREDICT, count, height, width, channels)
+        count, num_classes, body = self._roundtrip(header, memoryview(batch).cast('B'))
+        return np.frombuffer(body, dtype='<f4').reshape(count, num_classes)
+
+    # The server normalizes, so uint8 pixels are the native input
+    predict_uint8 = predict
@@ -1,41 +1,234 @@
-import tensorflow as tf
-from tensorflow.keras.models import load_model
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+from .inference_backends import KERAS, create_backend
 
 class ModelLoader:
     """
-    Manages the singleton instance of the TensorFlow/Keras CNN model.
-    The model is loaded once at application startup.
+    Manages the singleton instance of the CNN model's inference backend
+    (Keras, TFLite or ONNX Runtime). The model is loaded once at application startup,
+    either synchronously (load_model) or on a background thread (load_model_async)
+    so the web app can serve non-scan routes while the model loads.
+
+    Load state machine: idle -> loading -> ready | failed
     """
-    _model = None
+    IDLE = 'idle'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    _backend = None
+    _model_version = None
+    # Optional fast first-stage model for the two-stage cascade (see cascade.py)
+    _stage1_backend = None
+    _stage1_model_version = None
+    _thread_plan = None
+
+    _state = IDLE
+    _error = None
+    _warmup_total = 0
+    _warmup_completed = 0
+    _started_at = None
+    _finished_at = None
+    _thread = None
+    _state_lock = threading.Lock()
 
     @classmethod
-    def load_model(cls, model_path: str):
+    def load_model(cls, model_path: str, image_size=(224, 224), warmup_runs: int = 0, backend: str = None, on_ready=None,
+                   thread_plan: dict = None, stage1_model_path: str = None, stage1_backend: str = None):
         """
-        Loads the model from the specified path.
+        Loads the model from the specified path using the selected backend.
         This operation should only be performed once.
+
+        `thread_plan` (from cpu_tuning.resolve_thread_plan) sizes the runtime's
+        intra-op / inter-op thread pools before the model is created.
+
+        `stage1_model_path` (optional) also loads the cascade's fast first-stage
+        model, with the same thread plan.
+
+        `on_ready` (optional) is called after warm-up and before the state flips
+        to 'ready', so services built on the model are in place once the loader
+        reports ready. An exception from it marks the load as failed.
         """
-        if cls._model is None:
+        if cls._backend is not None:
+            return
+
+        with cls._state_lock:
+            cls._state = cls.LOADING
+            cls._error = None
+            cls._warmup_total = max(0, int(warmup_runs or 0))
+            cls._warmup_completed = 0
+            cls._started_at = time.time()
+            cls._finished_at = None
+
+        try:
             try:
-                # Disable eager execution for better performance on large models
-                # tf.config.experimental_run_functions_eagerly(False)
-                
-                # Load the H5 model
-                cls._model = load_model(model_path)
-                cls._model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+                thread_plan = thread_plan or {}
+                cls._thread_plan = thread_plan or None
+                cls._backend = create_backend(
+                    model_path, backend=backend, image_size=image_size,
+                    num_threads=thread_plan.get('intra_op_threads'),
+                    inter_op_threads=thread_plan.get('inter_op_threads')
+                )
+                cls._model_version = cls._compute_model_version(cls._backend)
+                if stage1_model_path:
+                    cls._stage1_backend = create_backend(
+                        stage1_model_path, backend=stage1_backend, image_size=image_size,
+                        num_threads=thread_plan.get('intra_op_threads'),
+                        inter_op_threads=thread_plan.get('inter_op_threads')
+                    )
+                    cls._stage1_model_version = cls._compute_model_version(cls._stage1_backend)
                 
             except Exception as e:
                 # Log the error and raise an exception if the model fails to load
                 raise RuntimeError(f"Failed to load the ML model from {model_path}: {e}")
 
+            if warmup_runs:
+                cls.warm_up(image_size, warmup_runs)
+
+            if on_ready is not None:
+                on_ready()
+
+        except Exception as e:
+            cls._set_finished(cls.FAILED, str(e))
+            raise
+
+        cls._set_finished(cls.READY)
+
+    @classmethod
+    def load_model_async(cls, model_path: str, image_size=(224, 224), warmup_runs: int = 0, backend: str = None,
+                         on_ready=None, on_error=None, thread_plan: dict = None, stage1_model_path: str = None,
+                         stage1_backend: str = None):
+        """
+        Starts load_model() on a daemon thread and returns immediately. Progress
+        is reported by get_status(); `on_error(exc)` is called if loading fails.
+        """
+        with cls._state_lock:
+            if cls._thread is not None and cls._thread.is_alive():
+                return cls._thread
+            cls._state = cls.LOADING
+            cls._started_at = time.time()
+
+        def run():
+            try:
+                cls.load_model(model_path, image_size=image_size, warmup_runs=warmup_runs,
+                               backend=backend, on_ready=on_ready, thread_plan=thread_plan,
+                               stage1_model_path=stage1_model_path, stage1_backend=stage1_backend)
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+
+        cls._thread = threading.Thread(target=run, name='model-loader', daemon=True)
+        cls._thread.start()
+        return cls._thread
+
+    @classmethod
+    def _set_finished(cls, state, error=None):
+        with cls._state_lock:
+            cls._state = state
+            cls._error = error
+            cls._finished_at = time.time()
+
+    @classmethod
+    def get_state(cls) -> str:
+        """Returns the load state: 'idle', 'loading', 'ready' or 'failed'."""
+        return cls._state
+
+    @classmethod
+    def get_status(cls) -> dict:
+        """Load state, warm-up progress and timing, for health/readiness endpoints."""
+        with cls._state_lock:
+            end = cls._finished_at or time.time()
+            return {
+                "state": cls._state,
+                "error": cls._error,
+                "backend": cls._backend.name if cls._backend is not None else None,
+                "model_version": cls._model_version,
+                "stage1_model_version": cls._stage1_model_version,
+                "warmup": {"completed": cls._warmup_completed, "total": cls._warmup_total},
+                "threads": cls._thread_plan,
+                "load_seconds": round(end - cls._started_at, 3) if cls._started_at else None,
+            }
+
+    @staticmethod
+    def _compute_model_version(backend):
+        """Derives a version string from the backend name and a digest of the model file contents."""
+        digest = hashlib.sha256()
+        with open(backend.model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return f"{backend.name}-{digest.hexdigest()[:16]}"
+
     @classmethod
-    def get_model(cls) -> tf.keras.Model:
+    def get_model_version(cls) -> str:
         """
-        Returns the loaded model instance.
+        Returns the version of the loaded model. It changes whenever the model
+        file changes, which invalidates cached predictions.
+        """
+        cls.get_backend()
+        return cls._model_version
+
+    @classmethod
+    def warm_up(cls, image_size=(224, 224), runs: int = 3):
+        """
+        Runs a few dummy forward passes so graph building and kernel
+        initialization happen before the first real scan.
+        """
+        backends = [cls.get_backend()]
+        if cls._stage1_backend is not None:
+            backends.append(cls._stage1_backend)
+        dummy = np.zeros((1, image_size[1], image_size[0], 3), dtype=np.float32)
+        dummy_pixels = np.zeros(dummy.shape, dtype=np.uint8)
+        for _ in range(max(0, int(runs))):
+            for backend in backends:
+                backend.predict(dummy)
+                if hasattr(backend, 'predict_uint8'):
+                    backend.predict_uint8(dummy_pixels)
+            with cls._state_lock:
+                cls._warmup_completed += 1
+
+    @classmethod
+    def get_backend(cls):
+        """
+        Returns the loaded inference backend.
         Raises an error if the model has not been loaded yet.
         """
-        if cls._model is None:
+        if cls._backend is None:
             raise RuntimeError("ML Model has not been loaded. Call load_model() first.")
-        return cls._model
+        return cls._backend
+
+    @classmethod
+    def get_stage1_backend(cls):
+        """Returns the cascade's first-stage backend, or None when no stage-1 model is configured."""
+        cls.get_backend()
+        return cls._stage1_backend
+
+    @classmethod
+    def get_stage1_model_version(cls):
+        """Version of the first-stage model (None without a cascade)."""
+        return cls._stage1_model_version
+
+    @classmethod
+    def get_model(cls):
+        """
+        Returns the loaded tf.keras.Model instance (Keras backend only).
+        Raises an error if the model has not been loaded yet.
+        """
+        backend = cls.get_backend()
+        if backend.name != KERAS:
+            raise RuntimeError(f"The '{backend.name}' backend does not expose a Keras model.")
+        return backend.model
+
+    @classmethod
+    def get_inference_fn(cls):
+        """
+        Returns the inference callable: (N, H, W, 3) float32 -> (N, classes).
+        Raises an error if the model has not been loaded yet.
+        """
+        return cls.get_backend().predict
 
 # Placeholder for image pre-processing utility (will be detailed later)
 def preprocess_image(image_data, target_size=(224, 224)):
@@ -0,0 +1,41 @@
+"""
+Compact binary protocol spoken between web workers and the model server
+over a Unix-domain socket.
+
+Request:  header '!4sBIHHB' = magic, op, count, height, width, channels
+          followed (for OP_PREDICT) by count*height*width*channels uint8 pixels.
+Response: header '!4sBII'   = magic, status, count, width
+          followed by count*width little-endian float32 probabilities (STATUS_OK),
+          or by `width` bytes of UTF-8 JSON (OP_INFO) / error message (STATUS_ERROR,
+          STATUS_BUSY).
+"""
+import struct
+
+MAGIC = b'LGM1'
+
+OP_PREDICT = 0
+OP_INFO = 1
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_BUSY = 2  # Server-side inference queue is full
+
+REQUEST_HEADER = struct.Struct('!4sBIHHB')
+RESPONSE_HEADER = struct.Struct('!4sBII')
+
+
+class ProtocolError(RuntimeError):
+    """Raised on malformed frames or when the peer closes the connection mid-frame."""
+
+
+def recv_exact(sock, size):
+    """Reads exactly `size` bytes from a socket into a new bytearray."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ProtocolError("Connection closed by peer")
+        received += n
+    return buffer
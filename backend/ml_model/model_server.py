@@ -0,0 +1,184 @@
+"""
+Out-of-process model server shared by all web workers.
+
+One process owns the model (and its thread pools) and serves predictions over
+a local Unix-domain socket. Requests from every web worker go through a single
+BatchScheduler, so concurrent scans are batched across workers.
+
+Usage:
+    python -m backend.ml_model.model_server --socket /tmp/leafguard-model.sock
+
+Web workers connect to it when INFERENCE_MODE = 'remote'.
+"""
+import argparse
+import json
+import logging
+import os
+import socketserver
+import sys
+
+import numpy as np
+
+from config import Config
+from .batch_scheduler import BatchScheduler, InferenceQueueFull
+from .model_loader import ModelLoader
+from .cpu_tuning import config_values, resolve_thread_plan
+from .image_decode import normalize_batch
+from .model_protocol import (
+    MAGIC, OP_INFO, OP_PREDICT, REQUEST_HEADER, RESPONSE_HEADER, STATUS_BUSY, STATUS_ERROR, STATUS_OK,
+    ProtocolError, recv_exact
+)
+
+logger = logging.getLogger('leafguard.model_server')
+
+
+class _ModelRequestHandler(socketserver.BaseRequestHandler):
+    """Serves framed requests on one persistent client connection."""
+
+    def handle(self):
+        while True:
+            try:
+                header = recv_exact(self.request, REQUEST_HEADER.size)
+            except (ProtocolError, ConnectionError):
+                return
+
+            magic, op, count, height, width, channels = REQUEST_HEADER.unpack(header)
+            if magic != MAGIC:
+                self._send_error("Bad magic")
+                return
+
+            try:
+                if op == OP_INFO:
+                    payload = json.dumps(self.server.info).encode('utf-8')
+                    self.request.sendall(RESPONSE_HEADER.pack(MAGIC, STATUS_OK, 0, len(payload)) + payload)
+                    continue
+
+                if op != OP_PREDICT:
+                    self._send_error(f"Unknown op {op}")
+                    continue
+
+                # Validate the header before allocating anything for its payload
+                problem = self.server.check_shape(count, height, width, channels)
+                if problem:
+                    # The payload cannot be skipped safely, so the connection is dropped
+                    self._send_error(problem)
+                    return
+
+                pixels = recv_exact(self.request, count * height * width * channels)
+                batch = np.frombuffer(pixels, dtype=np.uint8).reshape(count, height, width, channels)
+                probabilities = self.server.predict(batch)
+                body = np.ascontiguousarray(probabilities, dtype='<f4')
+                self.request.sendall(RESPONSE_HEADER.pack(MAGIC, STATUS_OK, body.shape[0], body.shape[1]))
+                self.request.sendall(memoryview(body).cast('B'))
+
+            except (ProtocolError, ConnectionError):
+                return
+            except InferenceQueueFull as e:
+                self._send_error(str(e), status=STATUS_BUSY)
+            except Exception as e:
+                logger.error(f"Prediction failed: {e}")
+                self._send_error(str(e))
+
+    def _send_error(self, message, status=STATUS_ERROR):
+        payload = message.encode('utf-8')
+        try:
+            self.request.sendall(RESPONSE_HEADER.pack(MAGIC, status, 0, len(payload)) + payload)
+        except OSError:
+            pass
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Threaded Unix-socket server. Each connection gets a handler thread; all
+    images are funneled through one BatchScheduler for cross-worker batching.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, scheduler, info, image_size, max_images=64):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _ModelRequestHandler)
+        os.chmod(socket_path, 0o660)
+        self.scheduler = scheduler
+        self.info = info
+        self.image_size = tuple(image_size)  # (width, height)
+        self.max_images = int(max_images)
+
+    def check_shape(self, count, height, width, channels):
+        """Error message for a predict request the model cannot take, or None."""
+        if not 1 <= count <= self.max_images:
+            return f"Batch of {count} images; expected 1 to {self.max_images}"
+        if (width, height, channels) != (*self.image_size, 3):
+            return f"Images are {width}x{height}x{channels}; expected {self.image_size[0]}x{self.image_size[1]}x3"
+        return None
+
+    def predict(self, batch):
+        """Splits a client batch into per-image jobs so it can merge with other clients' images."""
+        futures = []
+        try:
+            for image in batch:
+                futures.append(self.scheduler.submit(image))
+        except InferenceQueueFull:
+            # Don't compute the part of a rejected batch nobody will read
+            for future in futures:
+                future.cancel()
+            raise
+        return np.stack([future.result() for future in futures], axis=0)
+
+
+def _normalized_predict(batch):
+    """uint8 pixels in, probabilities out: normalization happens server-side."""
+    backend = ModelLoader.get_backend()
+    if hasattr(backend, 'predict_uint8'):
+        return backend.predict_uint8(batch)
+    return backend.predict(normalize_batch(batch))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the mango leaf classifier over a Unix socket.")
+    parser.add_argument('--socket', default=Config.MODEL_SERVER_SOCKET, help="Unix socket path to listen on")
+    parser.add_argument('--model', default=Config.MODEL_PATH, help="Path to the model file")
+    parser.add_argument('--backend', default=Config.MODEL_BACKEND, help="Inference backend (see MODEL_BACKEND)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    # The server is the only process running the model, so it gets every available CPU
+    thread_plan = resolve_thread_plan(config_values(), workers=1)
+    ModelLoader.load_model(
+        args.model,
+        image_size=Config.IMAGE_SIZE,
+        warmup_runs=Config.MODEL_WARMUP_RUNS,
+        backend=args.backend,
+        thread_plan=thread_plan
+    )
+    scheduler = BatchScheduler(
+        predict_fn=_normalized_predict,
+        max_batch_size=Config.INFERENCE_MAX_BATCH_SIZE,
+        max_wait_ms=Config.INFERENCE_MAX_WAIT_MS,
+        max_queue_depth=Config.INFERENCE_QUEUE_DEPTH,
+        name='model-server-batcher'
+    )
+    info = {
+        "model_version": ModelLoader.get_model_version(),
+        "backend": ModelLoader.get_backend().name,
+        "image_size": list(Config.IMAGE_SIZE),
+        "classes": Config.DISEASE_CLASSES,
+    }
+
+    server = ModelServer(args.socket, scheduler, info, Config.IMAGE_SIZE, max_images=Config.MODEL_SERVER_MAX_IMAGES)
+    logger.info(f"Model server ({info['backend']}, {info['model_version']}) listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        scheduler.shutdown()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
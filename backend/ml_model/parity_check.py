@@ -0,0 +1,91 @@
+"""
+Parity harness comparing a converted inference backend against the Keras model.
+
+Usage:
+    python -m backend.ml_model.parity_check --backend tflite-int8 \
+        --images data/validation_leaves --min-agreement 0.98 --max-drift 0.05
+
+Reports overall and per-class top-1 agreement (grouped by the Keras
+prediction, over all DISEASE_CLASSES) plus the absolute probability drift.
+Exits with status 1 if the candidate falls outside the tolerances.
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from config import Config
+from .convert_model import list_image_files, preprocess_file
+from .inference_backends import KERAS, TFLITE_FP16, TFLITE_INT8, ONNX, create_backend
+
+
+def compare_backends(reference, candidate, image_paths, classes, image_size=(224, 224), batch_size=32):
+    """Runs both backends over the same images and summarizes their disagreement."""
+    ref_probs, cand_probs = [], []
+    for start in range(0, len(image_paths), batch_size):
+        batch = np.concatenate([
+            preprocess_file(path, image_size)
+            for path in image_paths[start:start + batch_size]
+        ])
+        ref_probs.append(reference.predict(batch))
+        cand_probs.append(candidate.predict(batch))
+
+    ref_probs = np.concatenate(ref_probs)
+    cand_probs = np.concatenate(cand_probs)
+    ref_top1 = ref_probs.argmax(axis=1)
+    cand_top1 = cand_probs.argmax(axis=1)
+    drift = np.abs(ref_probs - cand_probs)
+
+    per_class = {}
+    for index, name in enumerate(classes):
+        mask = ref_top1 == index
+        count = int(mask.sum())
+        per_class[name] = {
+            "images": count,
+            "top1_agreement": float((cand_top1[mask] == index).mean()) if count else None,
+            "mean_abs_drift": float(drift[:, index].mean()),
+            "max_abs_drift": float(drift[:, index].max()),
+        }
+
+    return {
+        "images": len(image_paths),
+        "top1_agreement": float((ref_top1 == cand_top1).mean()),
+        "mean_abs_drift": float(drift.mean()),
+        "max_abs_drift": float(drift.max()),
+        "per_class": per_class,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a converted backend against the Keras model.")
+    parser.add_argument('--model', default=Config.MODEL_PATH, help="Path to the source .h5 model")
+    parser.add_argument('--backend', required=True, choices=[TFLITE_FP16, TFLITE_INT8, ONNX])
+    parser.add_argument('--images', required=True, help="Directory of leaf images to evaluate")
+    parser.add_argument('--min-agreement', type=float, default=0.98, help="Minimum overall top-1 agreement")
+    parser.add_argument('--max-drift', type=float, default=0.05, help="Maximum mean absolute probability drift")
+    parser.add_argument('--output', help="Optional path for the JSON report")
+    args = parser.parse_args(argv)
+
+    image_paths = list_image_files(args.images)
+    if not image_paths:
+        print(f"No images found in {args.images}", file=sys.stderr)
+        return 2
+
+    reference = create_backend(args.model, backend=KERAS, image_size=Config.IMAGE_SIZE)
+    candidate = create_backend(args.model, backend=args.backend, image_size=Config.IMAGE_SIZE)
+    report = compare_backends(reference, candidate, image_paths, Config.DISEASE_CLASSES, Config.IMAGE_SIZE)
+    report["backend"] = args.backend
+    report["passed"] = report["top1_agreement"] >= args.min_agreement and report["mean_abs_drift"] <= args.max_drift
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+    return 0 if report["passed"] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
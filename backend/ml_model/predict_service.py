@@ -1,10 +1,24 @@
 # adarshns007/my-project/my-project-b969c78bfb99d884a2432d5eaa1211441070eb9e/backend/ml_model/predict_service.py
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import numpy as np
-from PIL import Image
-from io import BytesIO
 from flask import current_app
 from .model_loader import ModelLoader
-import cv2 # FIX: Import for blur detection
+from .batch_scheduler import BatchScheduler
+from .prediction_cache import PredictionCache
+from .model_client import RemoteModelClient
+from .model_protocol import ProtocolError
+from .image_decode import decode_to_model_array, normalize_batch
+from backend.models.prediction_cache_model import PredictionCacheModel
+from .quality_gate import QualityGate
+from .cascade import ModelCascade, STAGE_NAMES
+
+# Retry delays (seconds) while the model server cannot be reached for its model version
+MODEL_VERSION_RETRY_INITIAL = 1.0
+MODEL_VERSION_RETRY_MAX = 30.0
 
 class PredictService:
     """
@@ -17,52 +31,230 @@ class PredictService:
         self.classes = current_app.config['DISEASE_CLASSES']
         self.image_size = current_app.config['IMAGE_SIZE']
         self.color_mode = current_app.config['COLOR_MODE']
-        self.model = ModelLoader.get_model()
-        # FIX: Define a blur threshold 
-        self.BLUR_THRESHOLD = 100.0 # Standard threshold value
+        # Keep a direct logger reference: preprocessing may run on pool threads without an app context
+        self.logger = current_app.logger
+        # 'local' = model loaded in this process, 'remote' = shared model server over a Unix socket
+        self.inference_mode = current_app.config.get('INFERENCE_MODE', 'local')
+        # 'fast' = backend's direct inference call, 'legacy' = Keras model.predict()
+        self.inference_path = current_app.config.get('INFERENCE_PATH', 'fast')
+        self.model = None
+        self.cascade = None
+        self._model_version = None
+        self._version_lock = threading.Lock()
+        self._version_retry_at = 0.0
+        self._version_retry_delay = MODEL_VERSION_RETRY_INITIAL
+        if self.inference_mode == 'remote':
+            self.backend = RemoteModelClient(
+                current_app.config['MODEL_SERVER_SOCKET'],
+                timeout=current_app.config.get('MODEL_SERVER_TIMEOUT', 30.0)
+            )
+            # Asked of the server on first use: it may still be starting when this worker boots
+            model_version = None
+        else:
+            self.backend = ModelLoader.get_backend()
+            model_version = ModelLoader.get_model_version()
+            if self.inference_path == 'legacy':
+                self.model = ModelLoader.get_model()
+        self._model_version = model_version
+        # Penultimate-layer embeddings for the "similar scans" index (Keras fast path only)
+        self.embeddings_enabled = (
+            current_app.config.get('EMBEDDINGS_ENABLED', False)
+            and self.model is None
+            and getattr(self.backend, 'supports_embeddings', False)
+        )
+        if self.inference_mode != 'remote':
+            # Two-stage cascade: fast model first, full model only for low-confidence scans
+            stage1_backend = ModelLoader.get_stage1_backend()
+            if stage1_backend is not None and self.model is None:
+                if self.embeddings_enabled:
+                    # Every scan needs the full model's embedding, so the cascade would save nothing
+                    self.logger.warning(
+                        "CASCADE_STAGE1_MODEL_PATH is ignored while EMBEDDINGS_ENABLED is on: "
+                        "similar-scans needs the full model's embedding for every scan. "
+                        "Set EMBEDDINGS_ENABLED=false to use the cascade."
+                    )
+                else:
+                    self.cascade = ModelCascade(
+                        stage1_backend, self.backend,
+                        threshold=current_app.config.get('CASCADE_CONFIDENCE_THRESHOLD', 0.9)
+                    )
+        # Blur / exposure / leaf-presence checks (thresholds from QUALITY_* config)
+        self.quality_gate = QualityGate.from_config(current_app.config)
+
+        # Micro-batching scheduler: concurrent scans share one forward pass.
+        # The model server batches across all workers itself, so remote mode sends requests straight on.
+        self.scheduler = None
+        if current_app.config.get('INFERENCE_BATCHING_ENABLED', False) and self.inference_mode != 'remote':
+            self.scheduler = BatchScheduler(
+                predict_fn=self._predict_batch,
+                max_batch_size=current_app.config.get('INFERENCE_MAX_BATCH_SIZE', 16),
+                max_wait_ms=current_app.config.get('INFERENCE_MAX_WAIT_MS', 10),
+                max_queue_depth=current_app.config.get('INFERENCE_QUEUE_DEPTH', 256)
+            )
+
+        # Optional callable(stage, seconds) told how long each pipeline stage took
+        # ('decode', 'quality_gate', 'predict', 'postprocess'); used by benchmarks/inference
+        self.stage_hook = None
 
-    def _preprocess_image(self, image_file_storage):
+        # Thread pool for decoding multi-image batches in parallel (PIL/OpenCV release the GIL)
+        self.max_batch_size = current_app.config.get('INFERENCE_MAX_BATCH_SIZE', 16)
+        self.preprocess_pool = ThreadPoolExecutor(
+            max_workers=current_app.config.get('PREPROCESS_WORKERS', 4),
+            thread_name_prefix='preprocess'
+        )
+
+        # Content-hash prediction cache: duplicate uploads skip inference.
+        # Built once the model version is known (see the `cache` property).
+        self.cache_enabled = current_app.config.get('PREDICTION_CACHE_ENABLED', False)
+        self.cache_persistent = current_app.config.get('PREDICTION_CACHE_PERSISTENT', False)
+        self.cache_size = current_app.config.get('PREDICTION_CACHE_SIZE', 1024)
+        self._cache = None
+        if self.cache_enabled and model_version is not None:
+            self._cache = self._build_cache(model_version)
+
+    @property
+    def model_version(self):
         """
-        Loads the image from FileStorage, resizes it, and converts it to a 
-        model-ready numpy array. Includes blur detection and rejection.
+        Version of the serving model. In remote mode it is fetched from the model
+        server on first use, retried with backoff while the server is unreachable
+        (None until then).
         """
+        if self._model_version is None and self.inference_mode == 'remote':
+            self._fetch_remote_model_version()
+        return self._model_version
+
+    def _fetch_remote_model_version(self):
+        with self._version_lock:
+            if self._model_version is not None or time.monotonic() < self._version_retry_at:
+                return
+            try:
+                self._model_version = self.backend.get_info()['model_version']
+            except (OSError, ProtocolError, RuntimeError) as e:
+                self.logger.warning(
+                    f"Model server not reachable for its model version ({e}); "
+                    f"retrying in {self._version_retry_delay:g}s."
+                )
+                self._version_retry_at = time.monotonic() + self._version_retry_delay
+                self._version_retry_delay = min(self._version_retry_delay * 2, MODEL_VERSION_RETRY_MAX)
+
+    @property
+    def cache(self):
+        """The prediction cache, or None when disabled or the model version is still unknown."""
+        if self._cache is None and self.cache_enabled:
+            model_version = self.model_version
+            if model_version is not None:
+                with self._version_lock:
+                    if self._cache is None:
+                        self._cache = self._build_cache(model_version)
+        return self._cache
+
+    def _build_cache(self, model_version):
+        # Cascade answers also depend on the first-stage model and the threshold
+        if self.cascade is not None:
+            model_version = (f"{model_version}+{ModelLoader.get_stage1_model_version()}"
+                             f"@{self.cascade.threshold:g}")
+        persistent_store = None
+        if self.cache_persistent:
+            persistent_store = PredictionCacheModel()
+            try:
+                # Entries from a previous model file can never be hit again
+                persistent_store.delete_stale_predictions(model_version)
+            except Exception as e:
+                self.logger.warning(f"Could not purge stale cached predictions: {e}")
+        return PredictionCache(
+            model_version=model_version,
+            max_entries=self.cache_size,
+            persistent_store=persistent_store
+        )
+
+    @contextmanager
+    def _stage(self, name):
+        """Reports the duration of the enclosed block to `stage_hook`, if one is set."""
+        hook = self.stage_hook
+        if hook is None:
+            yield
+            return
+        start = time.perf_counter()
         try:
-            # 1. Load Image from FileStorage
-            image_data = image_file_storage.read()
-            img_stream = BytesIO(image_data)
-            img = Image.open(img_stream)
-            
-            # 2. Convert and Resize for ML Model
-            img_resized = img.convert('RGB').resize(self.image_size)
-            
-            # 3. Blur Detection (Perform on resized image for efficiency)
-            # Convert PIL image to OpenCV format (NumPy array)
-            img_array_cv = np.asarray(img_resized, dtype=np.uint8)
-            gray = cv2.cvtColor(img_array_cv, cv2.COLOR_RGB2GRAY)
-            
-            # Compute the Laplacian variance (a measure of image sharpness/blur)
-            variance_of_laplacian = cv2.Laplacian(gray, cv2.CV_64F).var()
-
-            if variance_of_laplacian < self.BLUR_THRESHOLD:
-                # Reject the image if too blurry
-                current_app.logger.warning(f"Image rejected: Blur score ({variance_of_laplacian:.2f}) below threshold ({self.BLUR_THRESHOLD}).")
-                # FIX: Raise a clean ValueError for the user
-                raise ValueError("Image is too blurry. Please upload a clear photo of the leaf.")
-            
-            # 4. Final Preprocessing for Model
-            img_array = np.asarray(img_resized, dtype=np.float32)
+            yield
+        finally:
+            hook(name, time.perf_counter() - start)
+
+    def _predict_batch(self, batch):
+        """
+        Runs one forward pass over a (N, H, W, C) uint8 batch and returns 
+        (N, num_classes) probabilities. Backends that accept uint8 pixels 
+        (the traced Keras graph, the remote model server) normalize internally;
+        the others get a float32 tensor normalized in a single pass.
+        With embeddings enabled, returns (probabilities, embeddings) instead,
+        and with the cascade (probabilities, embeddings, stages).
+        """
+        if self.cascade is not None:
+            return self.cascade.predict(batch)
+        if self.embeddings_enabled:
+            return self.backend.predict_with_embeddings_uint8(batch)
+        if self.model is None and hasattr(self.backend, 'predict_uint8'):
+            return self.backend.predict_uint8(batch)
+
+        # Normalize pixel values (0-255 to 0.0-1.0)
+        model_input = normalize_batch(batch)
+        if self.model is not None:
+            return self.model.predict(model_input, verbose=0)
+        return self.backend.predict(model_input)
+
+    def _run_inference(self, model_input):
+        """
+        Returns the probability vector for a single (1, H, W, C) input, routed 
+        through the batching scheduler when it is enabled.
+        """
+        if self.scheduler is not None:
+            return self.scheduler.predict(model_input)
+        outputs = self._predict_batch(model_input)
+        if isinstance(outputs, tuple):
+            return tuple(output[0] for output in outputs)
+        return outputs[0]
+
+    def get_stats(self):
+        """Returns runtime inference statistics (batch-size histogram, latencies)."""
+        return {
+            "inference_mode": self.inference_mode,
+            "backend": self.backend.name,
+            "inference_path": self.inference_path,
+            "embeddings_enabled": self.embeddings_enabled,
+            "cascade": self.cascade.get_stats() if self.cascade is not None else None,
+            "batching_enabled": self.scheduler is not None,
+            "batching": self.scheduler.get_stats() if self.scheduler is not None else None,
+            "cache": self.cache.get_stats() if self.cache is not None else None
+        }
+
+    def _preprocess_image(self, image_data):
+        """
+        Loads the image from raw upload bytes, resizes it, and converts it to a 
+        model-ready numpy array. Rejects images that fail the quality gate.
+        """
+        try:
+            # 1. Decode straight to model size into the (1, H, W, 3) input buffer.
+            # JPEGs use DCT-scaled draft decoding, so full-resolution pixels never exist.
+            with self._stage('decode'):
+                model_input = np.empty((1, self.image_size[1], self.image_size[0], 3), dtype=np.uint8)
+                decode_to_model_array(image_data, self.image_size, out=model_input[0])
             
-            # Normalize pixel values (0-255 to 0.0-1.0)
-            img_array = img_array / 255.0
+            # 2. Quality gate (blur, exposure, leaf presence) on the same uint8 buffer the model will consume
+            try:
+                with self._stage('quality_gate'):
+                    self.quality_gate.check(model_input[0])
+            except ValueError as rejection:
+                self.logger.warning(f"Image rejected by quality gate: {rejection}")
+                raise
             
-            # Expand dimensions to create a batch size of 1
-            return np.expand_dims(img_array, axis=0)
+            # 3. Keep uint8 pixels; normalization happens right before (or inside) the forward pass
+            return model_input
 
         except ValueError as ve:
-            # Re-raise explicit ValueError for blur rejection
+            # Re-raise explicit ValueError for quality-gate rejection
             raise ve
         except Exception as e:
-            current_app.logger.error(f"Image preprocessing failed: {e}")
+            self.logger.error(f"Image preprocessing failed: {e}")
             raise ValueError("Invalid image file, format, or server preprocessing error.")
 
 
@@ -71,14 +263,104 @@ class PredictService:
         Runs the full prediction pipeline: preprocess, predict, post-process.
         Returns a dictionary with the prediction result.
         """
-        # 1. Preprocess (This will now consume the stream and check for blur)
-        model_input = self._preprocess_image(image_file_storage) 
+        return self.analyze_bytes(image_file_storage.read())
+
+    def analyze_bytes(self, image_data, content_hash=None):
+        """
+        Runs the prediction pipeline on raw image bytes. Identical uploads are
+        answered from the prediction cache without decoding or inference.
+        `content_hash` (sha256 hex) skips re-hashing when the caller already has it.
+        """
+        content_hash = content_hash or hashlib.sha256(image_data).hexdigest()
+        if self.cache is not None:
+            cached = self.cache.get(content_hash)
+            if cached is not None:
+                return cached
+
+        # 1. Preprocess (decode and check for blur)
+        model_input = self._preprocess_image(image_data) 
 
-        # 2. Predict
-        predictions = self.model.predict(model_input)[0] 
+        # 2. Predict (batched with concurrent requests when enabled)
+        with self._stage('predict'):
+            predictions = self._run_inference(model_input)
 
         # 3. Post-process
-        
+        with self._stage('postprocess'):
+            result = self._postprocess(predictions)
+        if self.cache is not None:
+            self.cache.put(content_hash, result)
+
+        # Return the structured result
+        return result
+
+    def check_quality(self, image_data, content_hash=None):
+        """
+        Decodes the image and runs the quality gate without inference, so bad
+        uploads can be rejected before anything is written to disk. Raises 
+        ValueError on rejection. Known (cached) images pass immediately.
+        """
+        if self.cache is not None and self.cache.get(content_hash or hashlib.sha256(image_data).hexdigest()) is not None:
+            return
+        self._preprocess_image(image_data)
+
+    def analyze_batch(self, images_data, content_hashes=None):
+        """
+        Runs the prediction pipeline over many images at once: cache lookups,
+        parallel decoding, then forward passes of up to INFERENCE_MAX_BATCH_SIZE.
+        Returns one entry per input, either a result dictionary or the 
+        ValueError that rejected that image (e.g. too blurry).
+        """
+        results = [None] * len(images_data)
+        if content_hashes is None:
+            content_hashes = [hashlib.sha256(data).hexdigest() for data in images_data]
+
+        # 1. Answer duplicates from the cache
+        pending = []
+        for index, content_hash in enumerate(content_hashes):
+            cached = self.cache.get(content_hash) if self.cache is not None else None
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+
+        # 2. Preprocess the remaining images in parallel
+        futures = {index: self.preprocess_pool.submit(self._preprocess_image, images_data[index]) for index in pending}
+        inputs = []
+        for index in pending:
+            try:
+                inputs.append((index, futures[index].result()))
+            except ValueError as ve:
+                results[index] = ve
+
+        # 3. Predict in model-sized batches and post-process
+        for start in range(0, len(inputs), self.max_batch_size):
+            chunk = inputs[start:start + self.max_batch_size]
+            batch = np.concatenate([model_input for _, model_input in chunk], axis=0)
+            with self._stage('predict'):
+                outputs = self._predict_batch(batch)
+            rows = zip(*outputs) if isinstance(outputs, tuple) else outputs
+            for (index, _), row in zip(chunk, rows):
+                with self._stage('postprocess'):
+                    result = self._postprocess(row)
+                if self.cache is not None:
+                    self.cache.put(content_hashes[index], result)
+                results[index] = result
+
+        return results
+
+    def _postprocess(self, predictions):
+        """
+        Converts one probability vector (or a (probabilities, embedding[, stage])
+        tuple) into the structured prediction result. The embedding, when present,
+        is returned as float16 under 'embedding'; with the cascade, raw_output
+        records which stage answered under 'cascade_stage'.
+        """
+        embedding = stage = None
+        if isinstance(predictions, tuple):
+            predictions, embedding, *rest = predictions
+            stage = int(rest[0]) if rest else None
+            if np.size(embedding) == 0:
+                embedding = None
         # Get the index of the highest probability
         max_confidence_index = np.argmax(predictions)
         
@@ -90,10 +372,14 @@ class PredictService:
         raw_output = {}
         for i, prob in enumerate(predictions):
             raw_output[self.classes[i]] = float(prob)
+        if stage is not None:
+            raw_output['cascade_stage'] = STAGE_NAMES[stage]
 
-        # Return the structured result
-        return {
+        result = {
             "predicted_class": predicted_class,
             "confidence_score": confidence_score,
             "raw_output": raw_output
-        }
\ No newline at end of file
+        }
+        if embedding is not None:
+            result["embedding"] = np.asarray(embedding, dtype=np.float16)
+        return result
\ No newline at end of file
@@ -0,0 +1,80 @@
+import copy
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Two-tier cache of prediction results keyed by the SHA-256 of the uploaded
+    image bytes plus the model version.
+
+    - Tier 1: bounded in-process LRU (no I/O).
+    - Tier 2: optional persistent store (the 'prediction_cache' table), shared
+      across workers and restarts.
+
+    Because every key includes the model version, replacing the model file
+    automatically invalidates all previous entries.
+    """
+
+    def __init__(self, model_version, max_entries=1024, persistent_store=None):
+        self.model_version = model_version
+        self.max_entries = max(1, int(max_entries))
+        self.persistent_store = persistent_store
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._persistent_hits = 0
+        self._misses = 0
+
+    def get(self, content_hash):
+        """Returns a copy of the cached result for an image hash, or None on a miss."""
+        with self._lock:
+            result = self._entries.get(content_hash)
+            if result is not None:
+                self._entries.move_to_end(content_hash)
+                self._memory_hits += 1
+                return copy.deepcopy(result)
+
+        if self.persistent_store is not None:
+            result = self.persistent_store.get_prediction(content_hash, self.model_version)
+            if result is not None:
+                self._remember(content_hash, result)
+                with self._lock:
+                    self._persistent_hits += 1
+                return copy.deepcopy(result)
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, content_hash, result):
+        """Stores a prediction result in both tiers."""
+        self._remember(content_hash, copy.deepcopy(result))
+        if self.persistent_store is not None:
+            self.persistent_store.save_prediction(
+                content_hash, self.model_version,
+                result['predicted_class'], result['confidence_score'], result['raw_output']
+            )
+
+    def _remember(self, content_hash, result):
+        with self._lock:
+            self._entries[content_hash] = result
+            self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self):
+        """Returns hit/miss counters for both tiers."""
+        with self._lock:
+            lookups = self._memory_hits + self._persistent_hits + self._misses
+            hits = self._memory_hits + self._persistent_hits
+            return {
+                "model_version": self.model_version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "memory_hits": self._memory_hits,
+                "persistent_hits": self._persistent_hits,
+                "misses": self._misses,
+                "hit_rate": (hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+
+class QualityGate:
+    """
+    Cheap image quality checks run on the small decoded thumbnail before an
+    upload is persisted or sent to the model:
+
+    - sharpness: variance of the Laplacian (rejects blurry photos)
+    - exposure: mean luminance (rejects photos that are too dark or washed out)
+    - leaf presence: fraction of green-dominant pixels (rejects photos with no leaf);
+      off by default, since diseased leaves can be mostly brown or black
+
+    All metrics come from one grayscale conversion and one vectorized pass
+    over the RGB pixels.
+    """
+
+    def __init__(self, blur_threshold=100.0, min_brightness=40.0, max_brightness=225.0, min_green_ratio=0.0):
+        self.blur_threshold = float(blur_threshold)
+        self.min_brightness = float(min_brightness)
+        self.max_brightness = float(max_brightness)
+        self.min_green_ratio = float(min_green_ratio)
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds the gate from the QUALITY_* keys of the Flask config."""
+        return cls(
+            blur_threshold=config.get('QUALITY_BLUR_THRESHOLD', 100.0),
+            min_brightness=config.get('QUALITY_MIN_BRIGHTNESS', 40.0),
+            max_brightness=config.get('QUALITY_MAX_BRIGHTNESS', 225.0),
+            min_green_ratio=config.get('QUALITY_MIN_GREEN_RATIO', 0.0),
+        )
+
+    def measure(self, pixels):
+        """Computes the quality metrics for an (H, W, 3) uint8 RGB thumbnail."""
+        gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+
+        # Green-dominant pixels: G strictly above both R and B
+        r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+        green_ratio = float(np.count_nonzero((g > r) & (g > b))) / gray.size
+
+        return {
+            "blur_score": float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+            "brightness": float(gray.mean()),
+            "green_ratio": green_ratio,
+        }
+
+    def check(self, pixels):
+        """
+        Returns the metrics if the thumbnail passes every check; otherwise raises
+        a ValueError with a user-facing reason.
+        """
+        metrics = self.measure(pixels)
+
+        if metrics["blur_score"] < self.blur_threshold:
+            raise ValueError("Image is too blurry. Please upload a clear photo of the leaf.")
+        if metrics["brightness"] < self.min_brightness:
+            raise ValueError("Image is too dark. Please take the photo in better light.")
+        if metrics["brightness"] > self.max_brightness:
+            raise ValueError("Image is overexposed. Please avoid direct glare and retake the photo.")
+        if self.min_green_ratio > 0 and metrics["green_ratio"] < self.min_green_ratio:
+            raise ValueError("No leaf detected. Please photograph a single mango leaf filling most of the frame.")
+
+        return metrics
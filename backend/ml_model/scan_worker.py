@@ -0,0 +1,173 @@
+"""
+Background worker pool for asynchronous scans.
+
+Uploads made in async mode are stored as 'pending' rows in the images table,
+which doubles as a durable job queue. Workers claim pending rows, run them
+through PredictService in batches and flip them to 'analyzed' (or 'failed').
+Claims expire, so jobs held by a crashed or restarted process are retried.
+
+The pool normally runs inside each web process (SCAN_ASYNC_WORKERS threads),
+but can also run standalone so web workers never perform inference:
+
+    python -m backend.ml_model.scan_worker
+"""
+import os
+import sys
+import threading
+import uuid
+
+from backend.models.image_model import ImageModel
+from backend.services.image_store import ImageStore
+from backend.services.database_service import DatabaseService
+
+
+class ScanJobWorker:
+    """
+    Pool of threads draining the pending-scan queue.
+    """
+
+    def __init__(self, app, predict_service, num_threads=2, batch_size=8, poll_interval=1.0,
+                 stale_after_seconds=300, max_attempts=3):
+        self.app = app
+        self.predict_service = predict_service
+        self.num_threads = max(1, int(num_threads))
+        self.batch_size = max(1, int(batch_size))
+        self.poll_interval = float(poll_interval)
+        self.stale_after_seconds = int(stale_after_seconds)
+        self.max_attempts = int(max_attempts)
+
+        self.image_model = ImageModel()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Starts the worker threads (daemon threads; they exit with the process)."""
+        if self._threads:
+            return
+        for n in range(self.num_threads):
+            thread = threading.Thread(target=self._run, name=f'scan-worker-{n}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def join(self):
+        """Blocks until the worker threads exit."""
+        for thread in self._threads:
+            thread.join()
+
+    def notify(self):
+        """Wakes idle workers immediately after a new job has been queued."""
+        self._wake.set()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    processed = self.run_once()
+                except Exception as e:
+                    self.app.logger.error(f"Scan worker iteration failed: {e}")
+                    processed = 0
+                finally:
+                    # Hand the pooled connection back between batches instead of pinning it
+                    DatabaseService.close_db_connection()
+
+                if not processed:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+
+    def run_once(self):
+        """Claims and processes one batch of pending scans. Returns the number of jobs handled."""
+        job_token = str(uuid.uuid4())
+        jobs = self.image_model.claim_pending_images(job_token, self.batch_size, self.stale_after_seconds)
+        if not jobs:
+            return 0
+
+        runnable = []
+        images_data = []
+        for job in jobs:
+            if job['job_attempts'] > self.max_attempts:
+                self.image_model.fail_scan_job(job['image_id'], "Analysis failed repeatedly. Please upload the image again.")
+                continue
+            try:
+                with open(self._local_path(job['file_path']), 'rb') as f:
+                    images_data.append(f.read())
+                runnable.append(job)
+            except OSError as e:
+                self.app.logger.error(f"Scan job {job['image_id']}: cannot read upload: {e}")
+                self.image_model.fail_scan_job(job['image_id'], "Uploaded file is missing.")
+
+        if not runnable:
+            return len(jobs)
+
+        # An exception here leaves the jobs claimed; they are retried once the claim goes stale.
+        analyses = self.predict_service.analyze_batch(images_data)
+
+        for job, analysis in zip(runnable, analyses):
+            if isinstance(analysis, Exception):
+                self.image_model.fail_scan_job(job['image_id'], str(analysis))
+                # Stored (content-addressed) files may be shared and are left to `image_store gc`;
+                # only a legacy per-upload file is removed here
+                if not job.get('content_hash'):
+                    local_path = self._local_path(job['file_path'])
+                    if local_path and os.path.exists(local_path):
+                        os.remove(local_path)
+                continue
+
+            # Prediction, embedding and status change commit together
+            self.image_model.complete_scan_job(
+                job['image_id'],
+                analysis['predicted_class'],
+                analysis['confidence_score'],
+                analysis['raw_output'],
+                embedding=analysis.get('embedding'),
+                model_version=self.predict_service.model_version
+            )
+
+        return len(jobs)
+
+    def _local_path(self, file_path):
+        """Maps the stored 'uploads/...' path to the file in the image store."""
+        return ImageStore.from_app(self.app).path(file_path)
+
+
+def main():
+    """Runs a standalone worker pool (no HTTP server) against the shared queue."""
+    from app import create_app
+    from config import Config
+    import backend.api.scan_routes as scan_routes
+
+    class WorkerConfig(Config):
+        # Nothing to serve until the model is up, so load it in the foreground
+        MODEL_LOAD_ASYNC = False
+
+    app = create_app(WorkerConfig)
+    if scan_routes.predict_service is None:
+        print("ML model failed to load; cannot process scan jobs.", file=sys.stderr)
+        return 1
+
+    worker = scan_routes.scan_worker or ScanJobWorker(
+        app, scan_routes.predict_service,
+        num_threads=app.config.get('SCAN_ASYNC_WORKERS') or 1,
+        batch_size=app.config.get('SCAN_ASYNC_BATCH_SIZE', 8),
+        poll_interval=app.config.get('SCAN_ASYNC_POLL_INTERVAL', 1.0),
+        stale_after_seconds=app.config.get('SCAN_ASYNC_CLAIM_TIMEOUT', 300),
+        max_attempts=app.config.get('SCAN_ASYNC_MAX_ATTEMPTS', 3)
+    )
+    worker.start()
+
+    app.logger.info(f"Scan worker pool running with {worker.num_threads} thread(s).")
+    try:
+        worker.join()
+    except KeyboardInterrupt:
+        worker.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,455 @@
+"""
+In-memory nearest-neighbour index over leaf embeddings ("similar scans").
+
+Embeddings are the classifier's penultimate-layer features, saved as float16
+in `image_embeddings` at scan time. Vectors are L2-normalized, so similarity
+is the cosine (dot product). Two modes:
+
+- 'flat':  exact search over a float16 matrix (2 bytes per dimension per scan).
+           Fine up to a few hundred thousand scans.
+- 'ivfpq': inverted file + product quantization for millions of rows. Vectors
+           are flat until `train_size` rows exist; then a coarse k-means
+           (nlist cells) and per-subspace codebooks are trained, and each scan
+           is kept as `pq_subvectors` one-byte codes. Queries scan `nprobe`
+           cells using asymmetric distance lookup tables.
+
+Metadata filters (owner, disease class, radius around a point) are applied as
+vectorized masks before scoring.
+
+Backfill embeddings for scans made before embeddings were enabled:
+    python -m backend.ml_model.similarity_index backfill
+"""
+import argparse
+import sys
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+
+FLAT = 'flat'
+IVFPQ = 'ivfpq'
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat, lon, center_lat, center_lon):
+    """Vectorized haversine distance (km) from arrays of points to one center (NaN stays NaN)."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(center_lat), np.radians(center_lon)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _nearest_centroid(data, centroids, chunk=4096):
+    """Index of the nearest centroid (squared L2) for each row, computed in chunks."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk):
+        block = data[start:start + chunk]
+        distances = centroid_norms[None, :] - 2.0 * block @ centroids.T
+        assignments[start:start + chunk] = np.argmin(distances, axis=1)
+    return assignments
+
+
+def _kmeans(data, k, iterations=10, seed=0):
+    """Plain Lloyd's k-means (float32); empty clusters keep their previous centroid."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignments = _nearest_centroid(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        counts = np.bincount(assignments, minlength=k)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class SimilarityIndex:
+    """Incrementally built embedding index with metadata filtering. Thread-safe."""
+
+    def __init__(self, mode=FLAT, nlist=256, nprobe=16, pq_subvectors=16, train_size=20000):
+        if mode not in (FLAT, IVFPQ):
+            raise ValueError(f"Unknown similarity index mode '{mode}'. Expected '{FLAT}' or '{IVFPQ}'.")
+        self.mode = mode
+        self.nlist = int(nlist)
+        self.nprobe = int(nprobe)
+        self.pq_subvectors = int(pq_subvectors)
+        self.train_size = int(train_size)
+
+        self.dim = None
+        self.trained = False
+        self._size = 0
+        self._capacity = 0
+        self._vectors = None      # (capacity, dim) float16, until PQ-trained
+        self._codes = None        # (capacity, m) uint8, after PQ training
+        self._cells = None        # (capacity,) int32 coarse cell, after training
+        self._ids = np.empty(0, dtype=np.int64)
+        self._users = np.empty(0, dtype=np.int64)
+        self._classes = np.empty(0, dtype=np.int16)
+        self._lat = np.empty(0, dtype=np.float32)
+        self._lon = np.empty(0, dtype=np.float32)
+        self._positions = {}      # image_id -> row, so re-added scans replace their row
+        self._class_codes = {}
+        self._coarse = None       # (nlist, dim) float32
+        self._codebooks = None    # (m, 256, dim / m) float32
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._size
+
+    def empty_copy(self):
+        """A new, empty index with the same settings (for full rebuilds)."""
+        return SimilarityIndex(
+            mode=self.mode, nlist=self.nlist, nprobe=self.nprobe,
+            pq_subvectors=self.pq_subvectors, train_size=self.train_size
+        )
+
+    # --- Building ---
+
+    def _grow(self, needed):
+        """Amortized doubling of every per-row array."""
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, self._capacity * 2, 1024)
+
+        def grow(array, shape_tail=(), dtype=None, fill=0):
+            grown = np.full((capacity,) + shape_tail, fill, dtype=dtype or array.dtype)
+            if array is not None and self._size:
+                grown[:self._size] = array[:self._size]
+            return grown
+
+        if self.trained:
+            self._codes = grow(self._codes, (self._codes.shape[1],), np.uint8)
+            self._cells = grow(self._cells, (), np.int32)
+        else:
+            self._vectors = grow(self._vectors, (self.dim,), np.float16)
+        self._ids = grow(self._ids)
+        self._users = grow(self._users)
+        self._classes = grow(self._classes, fill=-1)
+        self._lat = grow(self._lat, fill=np.nan)
+        self._lon = grow(self._lon, fill=np.nan)
+        self._capacity = capacity
+
+    def _class_code(self, class_name):
+        if class_name is None:
+            return -1
+        if class_name not in self._class_codes:
+            self._class_codes[class_name] = len(self._class_codes)
+        return self._class_codes[class_name]
+
+    def add(self, image_ids, vectors, user_ids, class_names, latitudes, longitudes):
+        """
+        Adds scans with their embeddings and filter metadata. A scan already in
+        the index (re-saved embedding, overlapping refresh) replaces its row.
+        """
+        vectors = _normalize(vectors)
+        if len(vectors) == 0:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}.")
+
+            rows = np.empty(len(vectors), dtype=np.int64)
+            end = self._size
+            for i, image_id in enumerate(image_ids):
+                row = self._positions.get(int(image_id))
+                if row is None:
+                    row = self._positions[int(image_id)] = end
+                    end += 1
+                rows[i] = row
+            self._grow(end)
+            if self.trained:
+                self._cells[rows] = _nearest_centroid(vectors, self._coarse)
+                self._codes[rows] = self._encode(vectors)
+            else:
+                self._vectors[rows] = vectors
+            self._ids[rows] = image_ids
+            self._users[rows] = user_ids
+            self._classes[rows] = [self._class_code(name) for name in class_names]
+            self._lat[rows] = [np.nan if value is None else float(value) for value in latitudes]
+            self._lon[rows] = [np.nan if value is None else float(value) for value in longitudes]
+            self._size = end
+
+            if self.mode == IVFPQ and not self.trained and self._size >= self.train_size:
+                self._train()
+
+    def _subvector_count(self):
+        """Largest divisor of dim that does not exceed pq_subvectors."""
+        for m in range(min(self.pq_subvectors, self.dim), 0, -1):
+            if self.dim % m == 0:
+                return m
+        return 1
+
+    def _train(self):
+        """Trains coarse cells and PQ codebooks on the current rows, then re-encodes them."""
+        data = self._vectors[:self._size].astype(np.float32)
+        self._coarse = _kmeans(data, self.nlist)
+
+        m = self._subvector_count()
+        sub_dim = self.dim // m
+        codebooks = np.zeros((m, 256, sub_dim), dtype=np.float32)
+        for i in range(m):
+            trained = _kmeans(data[:, i * sub_dim:(i + 1) * sub_dim], 256, iterations=8, seed=i)
+            codebooks[i, :len(trained)] = trained
+        self._codebooks = codebooks
+
+        cells = _nearest_centroid(data, self._coarse)
+        codes = self._encode(data)
+        self.trained = True
+        self._codes = np.zeros((self._capacity, m), dtype=np.uint8)
+        self._cells = np.zeros(self._capacity, dtype=np.int32)
+        self._codes[:self._size] = codes
+        self._cells[:self._size] = cells
+        self._vectors = None  # Raw vectors are no longer kept
+
+    def _encode(self, vectors):
+        m, _, sub_dim = self._codebooks.shape
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for i in range(m):
+            codes[:, i] = _nearest_centroid(vectors[:, i * sub_dim:(i + 1) * sub_dim], self._codebooks[i])
+        return codes
+
+    # --- Querying ---
+
+    def search(self, query, k=10, class_name=None, center=None, radius_km=None, user_id=None, exclude_ids=()):
+        """
+        Returns up to k (image_id, similarity) pairs, most similar first.
+        Filters: owner (`user_id`), predicted `class_name`, and `radius_km`
+        around `center` = (lat, lon); scans without a location never match a
+        region filter.
+        """
+        query = _normalize(query).reshape(-1)
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return []
+
+            mask = np.ones(n, dtype=bool)
+            if user_id is not None:
+                mask &= self._users[:n] == user_id
+            if class_name is not None:
+                code = self._class_codes.get(class_name)
+                if code is None:
+                    return []
+                mask &= self._classes[:n] == code
+            if center is not None and radius_km is not None:
+                distances = haversine_km(self._lat[:n], self._lon[:n], center[0], center[1])
+                mask &= np.nan_to_num(distances, nan=np.inf) <= radius_km
+            if exclude_ids:
+                mask &= ~np.isin(self._ids[:n], list(exclude_ids))
+
+            if self.trained:
+                candidates, scores = self._search_pq(query, mask, k)
+            else:
+                candidates = np.flatnonzero(mask)
+                scores = self._exact_scores(query, candidates)
+
+            if len(candidates) == 0:
+                return []
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k] if len(scores) > k else np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            return [(int(self._ids[candidates[i]]), float(scores[i])) for i in top]
+
+    def _exact_scores(self, query, candidates, chunk=4096):
+        scores = np.empty(len(candidates), dtype=np.float32)
+        for start in range(0, len(candidates), chunk):
+            block = self._vectors[candidates[start:start + chunk]].astype(np.float32)
+            scores[start:start + chunk] = block @ query
+        return scores
+
+    def _search_pq(self, query, mask, k):
+        """Probes the nprobe nearest cells; widens to every filtered row if they hold fewer than k matches."""
+        n = self._size
+        probe = np.argsort(-(self._coarse @ query))[:self.nprobe]
+        candidates = np.flatnonzero(mask & np.isin(self._cells[:n], probe))
+        if len(candidates) < k:
+            candidates = np.flatnonzero(mask)
+
+        m, _, sub_dim = self._codebooks.shape
+        # Asymmetric distance: per-subspace lookup table of query . codeword
+        lookup = np.einsum('mcd,md->mc', self._codebooks, query.reshape(m, sub_dim))
+        codes = self._codes[candidates]
+        scores = lookup[np.arange(m)[None, :], codes].sum(axis=1)
+        return candidates, scores.astype(np.float32)
+
+    def get_stats(self):
+        with self._lock:
+            if self.trained:
+                memory = self._codes[:self._size].nbytes
+            else:
+                memory = self._vectors[:self._size].nbytes if self._vectors is not None else 0
+            return {
+                "mode": self.mode,
+                "size": self._size,
+                "dim": self.dim,
+                "trained": self.trained,
+                "vector_bytes": int(memory),
+            }
+
+
+class SimilarityService:
+    """
+    Process-wide index kept in sync with the image_embeddings table. Rows written
+    since the last refresh are pulled in write order ((updated_at, image_id) after
+    the last one seen) at most every `refresh_interval` seconds, so scans saved by
+    other workers, async jobs and the backfill show up too. Each refresh re-reads
+    the last `refresh_overlap` seconds, catching rows whose transaction committed
+    after a later-stamped one. Every `rebuild_interval` seconds the index is
+    rebuilt from scratch, dropping archived scans and picking up reclassified ones.
+    """
+
+    def __init__(self, embedding_model, model_version, index, refresh_interval=2.0,
+                 rebuild_interval=3600.0, refresh_overlap=5.0, page_size=5000):
+        self.embedding_model = embedding_model
+        self.model_version = model_version
+        self.index = index
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.refresh_overlap = timedelta(seconds=refresh_overlap)
+        self.page_size = page_size
+        self._watermark = None  # (updated_at, image_id) of the newest row read
+        self._last_refresh = 0.0
+        self._last_rebuild = None
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """
+        Adds embeddings written since the last refresh, or rebuilds the index
+        when it is due. Returns the number of rows read.
+        """
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return 0
+        if not self._refresh_lock.acquire(blocking=force):
+            return 0  # Another request is already refreshing
+        try:
+            now = time.monotonic()
+            if self._last_rebuild is None or (self.rebuild_interval and now - self._last_rebuild >= self.rebuild_interval):
+                # Built aside and swapped in, so searches keep using the old index meanwhile
+                index = self.index.empty_copy()
+                count, self._watermark = self._load(index, None)
+                self.index = index
+                self._last_rebuild = now
+            else:
+                since = None
+                if self._watermark is not None:
+                    since = (self._watermark[0] - self.refresh_overlap, 0)
+                count, newest = self._load(self.index, since)
+                if newest is not None:
+                    self._watermark = max(self._watermark, newest) if self._watermark else newest
+            self._last_refresh = time.monotonic()
+            return count
+        finally:
+            self._refresh_lock.release()
+
+    def _load(self, index, after):
+        """Adds every row after the keyset cursor `after` to `index`. Returns (rows read, newest cursor)."""
+        count, newest = 0, None
+        while True:
+            rows = self.embedding_model.get_embeddings_after(self.model_version, after, self.page_size)
+            if not rows:
+                break
+            index.add(
+                [row['image_id'] for row in rows],
+                np.stack([np.frombuffer(row['vector'], dtype='<f2', count=row['dim']) for row in rows]),
+                [row['user_id'] for row in rows],
+                [row['predicted_class'] for row in rows],
+                [row['latitude'] for row in rows],
+                [row['longitude'] for row in rows],
+            )
+            count += len(rows)
+            after = newest = (rows[-1]['updated_at'], rows[-1]['image_id'])
+            if len(rows) < self.page_size:
+                break
+        return count, newest
+
+    def similar_to(self, image_id, k=10, **filters):
+        """
+        Most similar scans to a stored image, as (image_id, similarity) pairs.
+        Returns None if the image has no embedding for this model version.
+        """
+        row = self.embedding_model.get_embedding(image_id, self.model_version)
+        if not row:
+            return None
+        self.refresh()
+        query = np.frombuffer(row['vector'], dtype='<f2', count=row['dim'])
+        exclude = set(filters.pop('exclude_ids', ())) | {image_id}
+        return self.index.search(query, k=k, exclude_ids=exclude, **filters)
+
+
+# --- Backfill CLI ---
+
+def backfill(app, batch_size=32):
+    """Computes and stores embeddings for analyzed images that have none (current model version)."""
+    from backend.models.embedding_model import EmbeddingModel
+    from backend.services.image_store import ImageStore
+    from .image_decode import decode_to_model_array
+    from .model_loader import ModelLoader
+
+    backend = ModelLoader.get_backend()
+    if not getattr(backend, 'supports_embeddings', False):
+        raise RuntimeError(f"The '{backend.name}' backend cannot produce embeddings.")
+    model_version = ModelLoader.get_model_version()
+    width, height = app.config['IMAGE_SIZE']
+
+    embedding_model = EmbeddingModel()
+    done, skipped = 0, set()
+    while True:
+        rows = [row for row in embedding_model.get_image_ids_without_embedding(model_version, limit=batch_size + len(skipped))
+                if row['image_id'] not in skipped][:batch_size]
+        if not rows:
+            break
+
+        batch, ids = [], []
+        for row in rows:
+            path = ImageStore.from_app(app).path(row['file_path'])
+            try:
+                with open(path, 'rb') as f:
+                    batch.append(decode_to_model_array(f.read(), (width, height)))
+                ids.append(row['image_id'])
+            except Exception as e:
+                app.logger.warning(f"Skipping image {row['image_id']}: {e}")
+                skipped.add(row['image_id'])
+
+        if ids:
+            _, embeddings = backend.predict_with_embeddings_uint8(np.stack(batch))
+            for image_id, embedding in zip(ids, embeddings):
+                embedding_model.save_embedding(image_id, model_version, embedding.astype(np.float16))
+            done += len(ids)
+            print(f"Embedded {done} images...")
+    return done, len(skipped)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the similar-scans embedding store.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    fill = subparsers.add_parser('backfill', help="Compute embeddings for scans that have none")
+    fill.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+
+    class BackfillConfig(Config):
+        MODEL_LOAD_ASYNC = False
+        SCAN_ASYNC_WORKERS = 0
+
+    app = create_app(BackfillConfig)
+    with app.app_context():
+        done, skipped = backfill(app, batch_size=args.batch_size)
+    print(f"Backfill complete: {done} embedded, {skipped} skipped.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,11 +12,20 @@ class AdminModel:
         # Store the classes passed in during instantiation
         self.classes = disease_classes or []
 
-    def get_all_users(self):
-        """Retrieves all users with limited fields (excluding password hash)."""
+    def iter_all_users(self, limit=None, after=None):
+        """
+        Streams users with limited fields (excluding password hash), newest first.
+        Keyset-paged on (created_at, user_id).
+        """
+        keyset, keyset_params = self.db.keyset_condition('created_at', 'user_id', after)
+        limit_sql, limit_params = self.db.limit_clause(limit)
         # FIX: Explicitly include all expected columns for users table queries
-        query = "SELECT user_id, username, email, role, created_at, is_verified FROM users ORDER BY created_at DESC"
-        return self.db.execute_query(query)
+        query = f"""
+            SELECT user_id, username, email, role, created_at, is_verified FROM users
+            WHERE 1 = 1{keyset}
+            ORDER BY created_at DESC, user_id DESC{limit_sql}
+        """
+        return self.db.iter_query(query, (*keyset_params, *limit_params))
 
     def get_system_metrics(self):
         """Retrieves high-level counts for the admin dashboard overview."""
@@ -21,6 +21,16 @@ class DiseaseModel:
         params = (name,)
         return self.db.execute_query(query, params, fetch_one=True)
         
+    def get_diseases_by_names(self, names):
+        """Retrieves several disease records in one query, keyed by name."""
+        names = list(set(names))
+        if not names:
+            return {}
+        placeholders = ", ".join(["%s"] * len(names))
+        query = f"SELECT disease_id, name, description, organic_treatment, chemical_treatment, is_trained FROM diseases WHERE name IN ({placeholders})"
+        results = self.db.execute_query(query, tuple(names))
+        return {row['name']: row for row in results} if results else {}
+        
     def update_disease(self, disease_id, description, organic_treatment, chemical_treatment): # <-- UPDATED SIGNATURE
         """Updates the description, organic, and chemical treatments for a disease."""
         disease_id = int(disease_id) # FIX: Ensure integer type for DB
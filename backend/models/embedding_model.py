@@ -0,0 +1,101 @@
+from backend.services.database_service import DatabaseService
+
+EMBEDDING_UPSERT = """
+    INSERT INTO image_embeddings (image_id, model_version, dim, vector)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE model_version = VALUES(model_version), dim = VALUES(dim), vector = VALUES(vector)
+"""
+
+
+def _embedding_row(image_id, model_version, vector):
+    return (image_id, model_version, int(vector.shape[0]), vector.astype('<f2', copy=False).tobytes())
+
+
+class EmbeddingModel:
+    """
+    Handles all database operations for the 'image_embeddings' table
+    (float16 leaf embeddings behind the "similar scans" index).
+    """
+    
+    def __init__(self):
+        self.db = DatabaseService()
+
+    def save_embedding(self, image_id, model_version, vector):
+        """Stores (or replaces) the embedding of an image. `vector` is a 1-D float16 array."""
+        return self.db.execute_query(EMBEDDING_UPSERT, _embedding_row(image_id, model_version, vector), commit=True)
+
+    def save_embeddings(self, rows):
+        """Stores many (image_id, model_version, vector) embeddings with one batched statement."""
+        return self.db.execute_many(EMBEDDING_UPSERT, [_embedding_row(*row) for row in rows])
+
+    def get_embedding(self, image_id, model_version):
+        """Retrieves the raw embedding row (vector bytes and dim) for one image."""
+        query = """
+            SELECT image_id, dim, vector
+            FROM image_embeddings
+            WHERE image_id = %s AND model_version = %s
+        """
+        return self.db.execute_query(query, (image_id, model_version), fetch_one=True)
+
+    def get_latest_model_version(self):
+        """Model version of the most recently stored embedding (None if the table is empty)."""
+        query = "SELECT model_version FROM image_embeddings ORDER BY updated_at DESC, image_id DESC LIMIT 1"
+        result = self.db.execute_query(query, fetch_one=True)
+        return result['model_version'] if result else None
+
+    def get_embeddings_after(self, model_version, after=None, limit=5000):
+        """
+        Retrieves embeddings of analyzed scans in write order, after the keyset
+        cursor `after` = (updated_at, image_id) (None = from the start), together
+        with the metadata the index filters on: owner, predicted class and
+        location (scan coordinates, falling back to the farm's coordinates).
+        """
+        keyset, keyset_params = self.db.keyset_condition('e.updated_at', 'e.image_id', after, descending=False)
+        query = f"""
+            SELECT 
+                e.image_id, e.dim, e.vector, e.updated_at,
+                i.user_id, 
+                p.predicted_class, 
+                COALESCE(i.scan_latitude, f.latitude) AS latitude,
+                COALESCE(i.scan_longitude, f.longitude) AS longitude
+            FROM image_embeddings e
+            JOIN images i ON e.image_id = i.image_id
+            LEFT JOIN predictions p ON e.image_id = p.image_id
+            LEFT JOIN trees t ON i.tree_id = t.tree_id
+            LEFT JOIN farms f ON t.farm_id = f.farm_id
+            WHERE e.model_version = %s AND i.status = 'analyzed'{keyset}
+            ORDER BY e.updated_at ASC, e.image_id ASC
+            LIMIT %s
+        """
+        return self.db.execute_query(query, (model_version,) + keyset_params + (int(limit),)) or []
+
+    def get_image_ids_without_embedding(self, model_version, limit=1000):
+        """Analyzed images that have no embedding for this model version yet (for backfill)."""
+        query = """
+            SELECT i.image_id, i.file_path
+            FROM images i
+            LEFT JOIN image_embeddings e ON i.image_id = e.image_id AND e.model_version = %s
+            WHERE i.status IN ('analyzed', 'archived') AND e.image_id IS NULL
+            ORDER BY i.image_id ASC
+            LIMIT %s
+        """
+        return self.db.execute_query(query, (model_version, limit)) or []
+
+    def get_scan_summaries(self, image_ids):
+        """Gallery-style details for a set of images, keyed by image_id (archived scans excluded)."""
+        if not image_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(image_ids))
+        query = f"""
+            SELECT 
+                i.image_id, i.user_id, i.file_path, i.upload_date, i.scan_latitude, i.scan_longitude,
+                p.predicted_class, p.confidence_score,
+                t.tree_name, f.farm_name
+            FROM images i
+            LEFT JOIN predictions p ON i.image_id = p.image_id
+            LEFT JOIN trees t ON i.tree_id = t.tree_id
+            LEFT JOIN farms f ON t.farm_id = f.farm_id
+            WHERE i.image_id IN ({placeholders}) AND i.status = 'analyzed'
+        """
+        rows = self.db.execute_query(query, tuple(image_ids)) or []
+        return {row['image_id']: row for row in rows}
@@ -19,20 +19,24 @@ class FeedbackModel:
         # Returns the ID of the new feedback
         return self.db.execute_query(query, params, commit=True)
 
-    def get_all_feedbacks(self):
+    def iter_all_feedbacks(self, limit=None, after=None):
         """
-        Retrieves all feedback records, joining with user data for admin view.
+        Streams feedback records, joined with user data, for the admin view,
+        newest first. Keyset-paged on (submitted_at, feedback_id).
         """
+        keyset, keyset_params = self.db.keyset_condition('f.submitted_at', 'f.feedback_id', after)
+        limit_sql, limit_params = self.db.limit_clause(limit)
         # FIX: Explicitly select all columns from both tables to avoid ambiguity
-        query = """
+        query = f"""
             SELECT 
                 f.feedback_id, f.user_id, f.subject, f.message, f.rating, f.submitted_at, f.status,
                 u.username, u.email
             FROM feedbacks f
             JOIN users u ON f.user_id = u.user_id
-            ORDER BY f.submitted_at DESC
+            WHERE 1 = 1{keyset}
+            ORDER BY f.submitted_at DESC, f.feedback_id DESC{limit_sql}
         """
-        return self.db.execute_query(query)
+        return self.db.iter_query(query, (*keyset_params, *limit_params))
         
     def get_feedback_by_id(self, feedback_id):
         """Retrieves a single feedback record."""
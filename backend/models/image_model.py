@@ -1,7 +1,16 @@
 # adarshns007/my-project/my-project-b969c78bfb99d884a2432d5eaa1211441070eb9e/backend/models/image_model.py
 from backend.services.database_service import DatabaseService
+from flask import current_app
+from mysql.connector import Error
 import json
 
+from backend.models.embedding_model import EmbeddingModel
+
+PREDICTION_INSERT = """
+    INSERT INTO predictions (image_id, predicted_class, confidence_score, raw_output)
+    VALUES (%s, %s, %s, %s)
+"""
+
 class ImageModel:
     """
     Handles all database operations for the 'images' and 'predictions' tables.
@@ -10,15 +19,17 @@ class ImageModel:
     def __init__(self):
         self.db = DatabaseService()
 
-    def create_image(self, user_id, file_path, tree_id=None, status='analyzed', scan_latitude=None, scan_longitude=None):
+    def create_image(self, user_id, file_path, tree_id=None, status='analyzed', scan_latitude=None, scan_longitude=None,
+                     content_hash=None):
         """
         Inserts a new image record with optional scan-specific coordinates.
+        `content_hash` (sha256 of the file) references the shared blob in the image store.
         """
         query = """
-            INSERT INTO images (user_id, file_path, tree_id, status, scan_latitude, scan_longitude)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            INSERT INTO images (user_id, file_path, content_hash, tree_id, status, scan_latitude, scan_longitude)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
         """
-        params = (user_id, file_path, tree_id, status, scan_latitude, scan_longitude)
+        params = (user_id, file_path, content_hash, tree_id, status, scan_latitude, scan_longitude)
         return self.db.execute_query(query, params, commit=True)
 
     def save_prediction(self, image_id, predicted_class, confidence_score, raw_output):
@@ -28,12 +39,145 @@ class ImageModel:
         # Ensure raw_output is stored as a JSON string
         raw_output_json = json.dumps(raw_output)
         
+        params = (image_id, predicted_class, confidence_score, raw_output_json)
+        return self.db.execute_query(PREDICTION_INSERT, params, commit=True)
+
+    def create_analyzed_images_bulk(self, user_id, records, model_version=None):
+        """
+        Inserts many analyzed images with their predictions (and leaf embeddings,
+        when a record has one and `model_version` is given) in a single transaction.
+        Each record holds file_path, content_hash, tree_id, scan_latitude,
+        scan_longitude, predicted_class, confidence_score and raw_output.
+        Returns the new image IDs in record order, or None if the transaction failed.
+        """
+        if not records:
+            return []
+
+        try:
+            with self.db.transaction():
+                # 1. Image rows one by one, for their generated IDs: file paths are no longer
+                # unique (identical uploads share one stored blob)
+                image_ids = [
+                    self.create_image(
+                        user_id, record['file_path'], tree_id=record.get('tree_id'), status='analyzed',
+                        scan_latitude=record.get('scan_latitude'), scan_longitude=record.get('scan_longitude'),
+                        content_hash=record.get('content_hash')
+                    )
+                    for record in records
+                ]
+
+                # 2. All prediction rows in one batched INSERT
+                self.db.execute_many(PREDICTION_INSERT, [
+                    (image_id, record['predicted_class'], record['confidence_score'], json.dumps(record['raw_output']))
+                    for image_id, record in zip(image_ids, records)
+                ])
+
+                # 3. Leaf embeddings for the "similar scans" index
+                if model_version is not None:
+                    EmbeddingModel().save_embeddings([
+                        (image_id, model_version, record['embedding'])
+                        for image_id, record in zip(image_ids, records)
+                        if record.get('embedding') is not None
+                    ])
+            return image_ids
+
+        except (Error, KeyError) as e:
+            current_app.logger.error(f"Bulk image insert failed, rolled back: {e}")
+            return None
+
+    # --- Content-addressed storage (see backend/services/image_store.py) ---
+
+    def get_unhashed_images(self, after_image_id=0, limit=500):
+        """Rows still pointing at pre-content-addressed uploads, in image_id order."""
         query = """
-            INSERT INTO predictions (image_id, predicted_class, confidence_score, raw_output)
-            VALUES (%s, %s, %s, %s)
+            SELECT image_id, file_path
+            FROM images
+            WHERE content_hash IS NULL AND image_id > %s
+            ORDER BY image_id
+            LIMIT %s
         """
-        params = (image_id, predicted_class, confidence_score, raw_output_json)
-        return self.db.execute_query(query, params, commit=True)
+        return self.db.execute_query(query, (after_image_id, int(limit))) or []
+
+    def set_content_location(self, old_file_path, new_file_path, content_hash):
+        """Points every row that used `old_file_path` at its content-addressed blob."""
+        query = "UPDATE images SET file_path = %s, content_hash = %s WHERE file_path = %s"
+        return self.db.execute_query(query, (new_file_path, content_hash, old_file_path), commit=True)
+
+    def get_referenced_file_paths(self, file_paths):
+        """The subset of `file_paths` referenced by at least one image row (None on database error)."""
+        if not file_paths:
+            return set()
+        placeholders = ', '.join(['%s'] * len(file_paths))
+        query = f"SELECT DISTINCT file_path FROM images WHERE file_path IN ({placeholders})"
+        rows = self.db.execute_query(query, tuple(file_paths))
+        return None if rows is None else {row['file_path'] for row in rows}
+
+    # --- Asynchronous scan job queue (backed by images.status = 'pending') ---
+
+    def claim_pending_images(self, job_token, limit=8, stale_after_seconds=300):
+        """
+        Atomically claims up to `limit` pending images for one worker. Claims 
+        older than `stale_after_seconds` (e.g. from a crashed worker) are reclaimed.
+        Returns the claimed rows.
+        """
+        claim_query = """
+            UPDATE images
+            SET job_token = %s, job_claimed_at = NOW(), job_attempts = job_attempts + 1
+            WHERE status = 'pending'
+                AND (job_token IS NULL OR job_claimed_at < NOW() - INTERVAL %s SECOND)
+            ORDER BY image_id
+            LIMIT %s
+        """
+        if self.db.execute_query(claim_query, (job_token, int(stale_after_seconds), int(limit)), commit=True) is None:
+            return []
+
+        select_query = """
+            SELECT image_id, user_id, file_path, content_hash, job_attempts
+            FROM images
+            WHERE job_token = %s AND status = 'pending'
+        """
+        return self.db.execute_query(select_query, (job_token,)) or []
+
+    def complete_scan_job(self, image_id, predicted_class, confidence_score, raw_output,
+                          embedding=None, model_version=None):
+        """
+        Stores the prediction (and embedding, if given) for a pending image and
+        marks it as analyzed, in one transaction.
+        """
+        query = "UPDATE images SET status = 'analyzed', job_token = NULL, job_error = NULL WHERE image_id = %s"
+        try:
+            with self.db.transaction():
+                self.save_prediction(image_id, predicted_class, confidence_score, raw_output)
+                if embedding is not None and model_version is not None:
+                    EmbeddingModel().save_embedding(image_id, model_version, embedding)
+                self.db.execute_query(query, (image_id,), commit=True)
+            return True
+        except Error as e:
+            current_app.logger.error(f"Completing scan job {image_id} failed, rolled back: {e}")
+            return False
+
+    def fail_scan_job(self, image_id, error_message):
+        """Marks a pending image as failed with a user-facing reason."""
+        query = "UPDATE images SET status = 'failed', job_token = NULL, job_error = %s WHERE image_id = %s"
+        return self.db.execute_query(query, (error_message[:255], image_id), commit=True) is not None
+
+    def get_scan_job(self, image_id, user_id):
+        """Retrieves the state of an asynchronous scan, with its prediction once analyzed."""
+        query = """
+            SELECT 
+                i.image_id, i.file_path, i.status, i.job_token, i.job_error,
+                p.predicted_class, p.confidence_score, p.raw_output
+            FROM images i
+            LEFT JOIN predictions p ON i.image_id = p.image_id
+            WHERE i.image_id = %s AND i.user_id = %s
+        """
+        result = self.db.execute_query(query, (image_id, user_id), fetch_one=True)
+        if result and result.get('raw_output'):
+            try:
+                result['raw_output'] = json.loads(result['raw_output'])
+            except json.JSONDecodeError:
+                result['raw_output'] = {}
+        return result
 
     def get_image_details(self, image_id, user_id):
         """
@@ -66,11 +210,14 @@ class ImageModel:
         
         return result
 
-    def get_user_gallery(self, user_id):
+    def get_user_gallery(self, user_id, limit=None, after=None):
         """
-        Retrieves a list of all analyzed images for the user's gallery.
+        Retrieves the user's analyzed images for the gallery, newest first.
+        Keyset-paged: `after` = (upload_date, image_id) of the previous page's last row.
         """
-        query = """
+        keyset, keyset_params = self.db.keyset_condition('i.upload_date', 'i.image_id', after)
+        limit_sql, limit_params = self.db.limit_clause(limit)
+        query = f"""
             SELECT 
                 i.image_id, i.upload_date, i.file_path, i.tree_id,
                 i.scan_latitude, i.scan_longitude, 
@@ -79,35 +226,42 @@ class ImageModel:
             FROM images i
             JOIN predictions p ON i.image_id = p.image_id
             LEFT JOIN trees t ON i.tree_id = t.tree_id
-            WHERE i.user_id = %s AND i.status = 'analyzed'
-            ORDER BY i.upload_date DESC
+            WHERE i.user_id = %s AND i.status = 'analyzed'{keyset}
+            ORDER BY i.upload_date DESC, i.image_id DESC{limit_sql}
         """
-        params = (user_id,)
+        params = (user_id, *keyset_params, *limit_params)
         return self.db.execute_query(query, params)
 
-    def get_images_by_tree(self, tree_id):
+    def get_images_by_tree(self, tree_id, limit=None, after=None):
         """
-        Retrieves all analyzed images linked to a specific tree_id.
+        Retrieves the analyzed images linked to a specific tree_id, newest first
+        (keyset-paged like get_user_gallery).
         """
         tree_id = int(tree_id)
-        query = """
+        keyset, keyset_params = self.db.keyset_condition('i.upload_date', 'i.image_id', after)
+        limit_sql, limit_params = self.db.limit_clause(limit)
+        query = f"""
             SELECT 
                 i.image_id, i.upload_date, i.file_path,
                 i.scan_latitude, i.scan_longitude, 
                 p.predicted_class, p.confidence_score
             FROM images i
             JOIN predictions p ON i.image_id = p.image_id
-            WHERE i.tree_id = %s AND i.status = 'analyzed'
-            ORDER BY i.upload_date DESC
+            WHERE i.tree_id = %s AND i.status = 'analyzed'{keyset}
+            ORDER BY i.upload_date DESC, i.image_id DESC{limit_sql}
         """
-        params = (tree_id,)
+        params = (tree_id, *keyset_params, *limit_params)
         return self.db.execute_query(query, params)
         
-    def get_all_system_scans(self):
+    def iter_all_system_scans(self, limit=None, after=None):
         """
-        Retrieves a list of all analyzed images for the Admin gallery view.
+        Streams the analyzed images of all users for the Admin gallery view, newest
+        first, row by row (DatabaseService.iter_query) instead of loading the whole
+        table. Keyset-paged on (upload_date, image_id); limit=None streams everything.
         """
-        query = """
+        keyset, keyset_params = self.db.keyset_condition('i.upload_date', 'i.image_id', after)
+        limit_sql, limit_params = self.db.limit_clause(limit)
+        query = f"""
             SELECT 
                 i.image_id, i.upload_date, i.file_path, i.status AS image_status,
                 i.scan_latitude, i.scan_longitude, 
@@ -120,6 +274,7 @@ class ImageModel:
             JOIN users u ON i.user_id = u.user_id
             LEFT JOIN trees t ON i.tree_id = t.tree_id
             LEFT JOIN farms f ON t.farm_id = f.farm_id
-            ORDER BY i.upload_date DESC
+            WHERE 1 = 1{keyset}
+            ORDER BY i.upload_date DESC, i.image_id DESC{limit_sql}
         """
-        return self.db.execute_query(query)
\ No newline at end of file
+        return self.db.iter_query(query, (*keyset_params, *limit_params))
\ No newline at end of file
@@ -0,0 +1,48 @@
+from backend.services.database_service import DatabaseService
+import json
+
+class PredictionCacheModel:
+    """
+    Handles all database operations for the 'prediction_cache' table
+    (persistent tier of the content-hash prediction cache).
+    """
+    
+    def __init__(self):
+        self.db = DatabaseService()
+
+    def get_prediction(self, content_hash, model_version):
+        """Retrieves a cached prediction for the given image hash and model version."""
+        query = """
+            SELECT predicted_class, confidence_score, raw_output
+            FROM prediction_cache
+            WHERE content_hash = %s AND model_version = %s
+        """
+        params = (content_hash, model_version)
+        result = self.db.execute_query(query, params, fetch_one=True)
+        if not result:
+            return None
+
+        try:
+            raw_output = json.loads(result['raw_output']) if result.get('raw_output') else {}
+        except json.JSONDecodeError:
+            return None
+
+        return {
+            "predicted_class": result['predicted_class'],
+            "confidence_score": float(result['confidence_score']),
+            "raw_output": raw_output
+        }
+
+    def save_prediction(self, content_hash, model_version, predicted_class, confidence_score, raw_output):
+        """Stores a prediction result (ignored if the entry already exists)."""
+        query = """
+            INSERT IGNORE INTO prediction_cache (content_hash, model_version, predicted_class, confidence_score, raw_output)
+            VALUES (%s, %s, %s, %s, %s)
+        """
+        params = (content_hash, model_version, predicted_class, confidence_score, json.dumps(raw_output))
+        return self.db.execute_query(query, params, commit=True)
+
+    def delete_stale_predictions(self, model_version):
+        """Removes cached predictions produced by any other model version."""
+        query = "DELETE FROM prediction_cache WHERE model_version != %s"
+        return self.db.execute_query(query, (model_version,), commit=True) is not None
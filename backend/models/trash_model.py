@@ -1,4 +1,6 @@
 from backend.services.database_service import DatabaseService
+from flask import current_app
+from mysql.connector import Error
 
 class TrashModel:
     """
@@ -14,42 +16,105 @@ class TrashModel:
         Moves an image to the archive. Updates status in 'images' 
         and inserts a record in 'archived_images'.
         """
+        return bool(self.archive_images([image_id], user_id))
+
+    def archive_images(self, image_ids, user_id):
+        """
+        Archives many of the user's images in one transaction (one commit).
+        Images that are not the user's or are already archived are skipped.
+        Returns the archived image IDs, or None if the transaction failed.
+        """
         user_id = int(user_id) # FIX: Ensure user_id is an integer
-        # 1. Update status in images table (optional, but good practice)
-        update_image_query = "UPDATE images SET status = 'archived' WHERE image_id = %s AND user_id = %s"
-        self.db.execute_query(update_image_query, (image_id, user_id), commit=True)
-        
-        # 2. Insert into archive table
-        archive_query = "INSERT INTO archived_images (image_id, user_id) VALUES (%s, %s)"
-        return self.db.execute_query(archive_query, (image_id, user_id), commit=True)
+        image_ids = sorted({int(image_id) for image_id in image_ids})
+        if not image_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(image_ids))
+        try:
+            with self.db.transaction():
+                # 1. Lock the rows that can be archived
+                select_query = f"""
+                    SELECT image_id FROM images
+                    WHERE user_id = %s AND status <> 'archived' AND image_id IN ({placeholders})
+                    FOR UPDATE
+                """
+                rows = self.db.execute_query(select_query, (user_id, *image_ids))
+                archived_ids = [row['image_id'] for row in rows]
+                if not archived_ids:
+                    return []
+
+                # 2. Update status in images table
+                update_placeholders = ", ".join(["%s"] * len(archived_ids))
+                update_image_query = f"UPDATE images SET status = 'archived' WHERE user_id = %s AND image_id IN ({update_placeholders})"
+                self.db.execute_query(update_image_query, (user_id, *archived_ids), commit=True)
+
+                # 3. Insert into archive table (one batched INSERT)
+                archive_query = "INSERT INTO archived_images (image_id, user_id) VALUES (%s, %s)"
+                self.db.execute_many(archive_query, [(image_id, user_id) for image_id in archived_ids])
+            return archived_ids
+        except Error as e:
+            current_app.logger.error(f"Archiving images {image_ids} failed, rolled back: {e}")
+            return None
         
     def restore_image(self, image_id, user_id):
         """
         Restores an image from the archive. Deletes record in 'archived_images'
         and updates status in 'images' back to 'analyzed'.
         """
+        return bool(self.restore_images([image_id], user_id))
+
+    def restore_images(self, image_ids, user_id):
+        """
+        Restores many of the user's archived images in one transaction (one commit).
+        Returns the restored image IDs, or None if the transaction failed.
+        """
         user_id = int(user_id) # FIX: Ensure user_id is an integer
-        # 1. Delete from archive table
-        delete_archive_query = "DELETE FROM archived_images WHERE image_id = %s AND user_id = %s"
-        self.db.execute_query(delete_archive_query, (image_id, user_id), commit=True)
-        
-        # 2. Update status in images table
-        restore_image_query = "UPDATE images SET status = 'analyzed' WHERE image_id = %s AND user_id = %s"
-        return self.db.execute_query(restore_image_query, (image_id, user_id), commit=True) is not None
+        image_ids = sorted({int(image_id) for image_id in image_ids})
+        if not image_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(image_ids))
+        try:
+            with self.db.transaction():
+                # 1. Lock the rows that can be restored
+                select_query = f"""
+                    SELECT image_id FROM images
+                    WHERE user_id = %s AND status = 'archived' AND image_id IN ({placeholders})
+                    FOR UPDATE
+                """
+                rows = self.db.execute_query(select_query, (user_id, *image_ids))
+                restored_ids = [row['image_id'] for row in rows]
+                if not restored_ids:
+                    return []
+                restore_placeholders = ", ".join(["%s"] * len(restored_ids))
+                params = (user_id, *restored_ids)
+
+                # 2. Delete from archive table
+                delete_archive_query = f"DELETE FROM archived_images WHERE user_id = %s AND image_id IN ({restore_placeholders})"
+                self.db.execute_query(delete_archive_query, params, commit=True)
+
+                # 3. Update status in images table
+                restore_image_query = f"UPDATE images SET status = 'analyzed' WHERE user_id = %s AND image_id IN ({restore_placeholders})"
+                self.db.execute_query(restore_image_query, params, commit=True)
+            return restored_ids
+        except Error as e:
+            current_app.logger.error(f"Restoring images {image_ids} failed, rolled back: {e}")
+            return None
 
-    def get_user_archived_images(self, user_id):
+    def get_user_archived_images(self, user_id, limit=None, after=None):
         """
-        Retrieves all archived images for a user, including prediction data.
+        Retrieves the user's archived images, including prediction data, most
+        recently archived first. Keyset-paged on (archived_at, archive_id).
         """
         user_id = int(user_id) # FIX: Ensure user_id is an integer
-        query = """
+        keyset, keyset_params = self.db.keyset_condition('a.archived_at', 'a.archive_id', after)
+        limit_sql, limit_params = self.db.limit_clause(limit)
+        query = f"""
             SELECT 
-                i.image_id, i.upload_date, i.file_path,
+                a.archive_id, i.image_id, i.upload_date, i.file_path,
                 p.predicted_class, a.archived_at
             FROM archived_images a
             JOIN images i ON a.image_id = i.image_id
             JOIN predictions p ON i.image_id = p.image_id
-            WHERE a.user_id = %s
-            ORDER BY a.archived_at DESC
+            WHERE a.user_id = %s{keyset}
+            ORDER BY a.archived_at DESC, a.archive_id DESC{limit_sql}
         """
-        return self.db.execute_query(query, (user_id,))
\ No newline at end of file
+        return self.db.execute_query(query, (user_id, *keyset_params, *limit_params))
\ No newline at end of file
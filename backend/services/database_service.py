@@ -1,87 +1,284 @@
 
 
-import mysql.connector
+import time
+from contextlib import contextmanager
+
 from flask import current_app, g
 from mysql.connector import Error
 
+from .db_pool import PREPARABLE_STATEMENTS, get_pool
+
+# Connections held longer than this by one app context are pinged before reuse
+DB_CONTEXT_REVALIDATE_SECONDS = 30
+
 class DatabaseService:
     """
-    Manages the MySQL database connection using a simple connection per request 
-    pattern (non-pooled) for maximum stability.
+    Manages MySQL connections for the application: each request (or app context)
+    checks one connection out of the per-process pool on first use and returns it
+    on teardown (see backend/services/db_pool.py).
     """
     
     @staticmethod
     def get_db_connection():
-        """Establishes a new database connection or returns the existing one, checking validity first."""
+        """Checks a connection out of the pool, or returns the one this context already holds."""
         # Check if 'db' exists in the application context global object 'g'
         db = g.get('db', None)
-        
-        # Check if connection needs to be established/re-established
-        if db is None or not db.is_connected():
-            app = current_app
+        if db is not None:
+            # Long-lived contexts (background workers) re-validate now and then
+            if time.monotonic() - g.get('db_checked_out_at', 0) < DB_CONTEXT_REVALIDATE_SECONDS:
+                return db
             try:
-                # Close the old connection explicitly if it exists but isn't connected
-                if db is not None:
-                    try:
-                        db.close()
-                    except:
-                        pass
-                        
-                # Establish a new connection
-                db = mysql.connector.connect(
-                    host=app.config['MYSQL_HOST'],
-                    user=app.config['MYSQL_USER'],
-                    password=app.config['MYSQL_PASSWORD'],
-                    database=app.config['MYSQL_DB'],
-                )
-                g.db = db # Store the new connection in g
-                app.logger.info("New MySQL connection established.")
-                
-            except Error as e:
-                app.logger.critical(f"FATAL: Error connecting to MySQL Database: {e}")
-                # CRITICAL: In DEBUG mode, raise the error to get a traceback
-                if app.config.get('DEBUG'):
-                    raise RuntimeError(f"Failed to connect to DB: {e}")
-                g.db = None
-                return None
+                db.ping(reconnect=False)
+                g.db_checked_out_at = time.monotonic()
+                return db
+            except Error:
+                DatabaseService.close_db_connection()
+
+        app = current_app
+        try:
+            db = get_pool(app).acquire()
+            g.db = db # Store the connection in g
+            g.db_checked_out_at = time.monotonic()
+        except Error as e:
+            app.logger.critical(f"FATAL: Error connecting to MySQL Database: {e}")
+            # CRITICAL: In DEBUG mode, raise the error to get a traceback
+            if app.config.get('DEBUG'):
+                raise RuntimeError(f"Failed to connect to DB: {e}")
+            g.db = None
+            return None
                 
         return db
 
     @staticmethod
     def close_db_connection(e=None):
-        """Closes the connection when the application context tears down."""
+        """Returns the context's connection to the pool when the application context tears down."""
         db = g.pop('db', None)
-        if db is not None and db.is_connected():
+        g.pop('db_checked_out_at', None)
+        if db is not None:
             try:
                 db.close()
             except Error as close_e:
-                 current_app.logger.error(f"Error closing MySQL connection: {close_e}")
+                 current_app.logger.error(f"Error releasing MySQL connection: {close_e}")
+
+    @staticmethod
+    def _cursor(conn, query, params):
+        """
+        Dictionary cursor for one statement: the connection's cached prepared
+        statement for plain parameterized DML/SELECTs, else a regular cursor.
+        Returns (cursor, query, prepared).
+        """
+        if (
+            getattr(conn, 'prepared_cursor', None) is not None
+            and conn._pool.prepared_statements
+            and params and not isinstance(params, dict)
+            and query.lstrip()[:7].upper().startswith(PREPARABLE_STATEMENTS)
+        ):
+            cursor, query = conn.prepared_cursor(query)
+            return cursor, query, True
+        return conn.cursor(dictionary=True), query, False
+
+    @staticmethod
+    def keyset_condition(sort_column, id_column, after, descending=True):
+        """
+        (' AND ...' SQL, params) that selects the rows after a keyset cursor
+        `after` = (sort_value, id) for `ORDER BY sort_column DESC, id_column DESC`
+        (ASC with descending=False); ('', ()) for the first page. The expanded OR
+        form lets MySQL range-scan an index on (..., sort_column, id_column).
+        """
+        if after is None:
+            return "", ()
+        sort_value, row_id = after
+        op = '<' if descending else '>'
+        condition = f" AND ({sort_column} {op} %s OR ({sort_column} = %s AND {id_column} {op} %s))"
+        return condition, (sort_value, sort_value, row_id)
+
+    @staticmethod
+    def limit_clause(limit):
+        """(' LIMIT %s', params) or ('', ()) when unlimited."""
+        return (" LIMIT %s", (int(limit),)) if limit else ("", ())
 
+    @staticmethod
+    def in_transaction():
+        return g.get('db_transaction') is not None
+
+    @staticmethod
+    @contextmanager
+    def transaction():
+        """
+        Groups statements into one atomic unit with a single commit:
+
+            with DatabaseService.transaction():
+                image_id = db.execute_query(insert_image, params, commit=True)   # not committed yet
+                db.execute_many(insert_predictions, rows)
+            # committed here, once
+
+        Inside the block `commit=True` only defers to the final commit, and a
+        failing statement raises its mysql.connector Error instead of returning
+        None. An exception leaving the block rolls everything back. Nested blocks
+        join the outer transaction; if an inner block fails (even if the caller
+        swallows the error) the outer one rolls back and raises.
+        """
+        state = g.get('db_transaction')
+        if state is not None:
+            state['depth'] += 1
+            try:
+                yield
+            except BaseException:
+                state['failed'] = True
+                raise
+            finally:
+                state['depth'] -= 1
+            return
+
+        conn = DatabaseService.get_db_connection()
+        if not conn:
+            raise Error(msg="Database connection is not available for a transaction.")
+        if conn.in_transaction:
+            # Only the read snapshot of earlier queries can be open here: writes outside a block commit themselves
+            conn.rollback()
+        conn.start_transaction()
+        state = g.db_transaction = {'depth': 1, 'failed': False}
+        try:
+            yield
+            if state['failed']:
+                raise Error(msg="Transaction rolled back: a statement inside it failed.")
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except Error as rollback_e:
+                current_app.logger.error(f"MySQL rollback failed: {rollback_e}")
+            raise
+        finally:
+            g.pop('db_transaction', None)
+
+    @staticmethod
+    def _statement_failed(e, query, params):
+        """Inside a transaction a failed statement dooms it and is raised to the caller."""
+        state = g.get('db_transaction')
+        if state is None:
+            return False
+        state['failed'] = True
+        current_app.logger.error(f"MySQL Query Error (transaction rolled back): {e} | Query: {query} | Params: {params}")
+        return True
+
+    @staticmethod
+    def execute_many(query, seq_of_params, commit=True):
+        """
+        Runs one statement for many parameter rows; multi-row INSERTs are sent as
+        a single batched INSERT. Returns the affected row count (None on error).
+        Commits once at the end, or with the surrounding transaction.
+        """
+        seq_of_params = list(seq_of_params)
+        if not seq_of_params:
+            return 0
+        conn = DatabaseService.get_db_connection()
+        if not conn:
+            current_app.logger.error("Database connection is not available for query execution.")
+            if DatabaseService.in_transaction():
+                raise Error(msg="Database connection lost during a transaction.")
+            return None
+
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(query, seq_of_params)
+            if commit and not DatabaseService.in_transaction():
+                conn.commit()
+            return cursor.rowcount
+        except Error as e:
+            if DatabaseService._statement_failed(e, query, f"{len(seq_of_params)} rows"):
+                raise
+            current_app.logger.error(f"MySQL Query Error: {e} | Query: {query} | Rows: {len(seq_of_params)}")
+            if commit:
+                conn.rollback()
+            return None
+        finally:
+            if cursor is not None:
+                cursor.close()
+
+    @staticmethod
+    def iter_query(query, params=None, chunk_size=None):
+        """
+        Yields the rows of a large SELECT as dictionaries without loading the
+        whole result set: an unbuffered cursor reads them off the socket
+        `chunk_size` (DB_STREAM_CHUNK_SIZE) rows at a time.
+
+        The statement runs on the first next(); errors are raised, not returned
+        as None. While iterating, the context's connection is busy, so run no other
+        query until the iterator is exhausted or closed. A connection abandoned
+        with unread rows is dropped from the pool instead of being drained.
+        """
+        chunk_size = chunk_size or current_app.config.get('DB_STREAM_CHUNK_SIZE', 500)
+        conn = DatabaseService.get_db_connection()
+        if not conn:
+            raise Error(msg="Database connection is not available for query execution.")
+
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        finished = False
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+            finished = True
+        except Error as e:
+            current_app.logger.error(f"MySQL Query Error: {e} | Query: {query} | Params: {params}")
+            raise
+        finally:
+            if finished:
+                cursor.close()
+            else:
+                # Unread rows would have to be read to reuse the connection: close it instead
+                if g.get('db_transaction') is not None:
+                    g.db_transaction['failed'] = True
+                g.pop('db', None)
+                g.pop('db_checked_out_at', None)
+                if hasattr(conn, '_pool'):
+                    conn._pool.discard(conn)
+                else:
+                    conn.close()
 
     @staticmethod
     def execute_query(query, params=None, fetch_one=False, commit=False):
-        """Executes a SQL query and returns results if applicable."""
+        """
+        Executes a SQL query and returns results if applicable (lastrowid for
+        commit=True). Inside DatabaseService.transaction() the commit is deferred.
+        """
         conn = DatabaseService.get_db_connection()
         if not conn:
             current_app.logger.error("Database connection is not available for query execution.")
+            if DatabaseService.in_transaction():
+                raise Error(msg="Database connection lost during a transaction.")
             return None
 
         cursor = None
+        prepared = False
         app = current_app 
         try:
-            cursor = conn.cursor(dictionary=True)
+            cursor, query, prepared = DatabaseService._cursor(conn, query, params)
             cursor.execute(query, params)
             
             if commit:
-                conn.commit()
+                if not DatabaseService.in_transaction():
+                    conn.commit()
                 return cursor.lastrowid
             
+            # Prepared cursors are reused: always drain the result
+            rows = cursor.fetchall() if cursor.with_rows else []
             if fetch_one:
-                return cursor.fetchone()
+                return rows[0] if rows else None
             else:
-                return cursor.fetchall()
+                return rows
         
         except Error as e:
+            if prepared:
+                conn.discard_prepared(query)
+                prepared = False
+            if DatabaseService._statement_failed(e, query, params):
+                raise
             # CRITICAL LOGGING: Log the exact MySQL error and the query that failed
             app.logger.error(f"MySQL Query Error: {e} | Query: {query} | Params: {params}")
             
@@ -96,10 +293,10 @@ class DatabaseService:
         except Exception as e:
             # Catch any other unexpected Python exceptions during query execution
             app.logger.critical(f"Unexpected Python Error during DB query: {e} | Query: {query} | Params: {params}")
-            if app.config.get('DEBUG'):
+            if DatabaseService._statement_failed(e, query, params) or app.config.get('DEBUG'):
                 raise e
             return None
         
         finally:
-            if cursor is not None:
+            if cursor is not None and not prepared:
                 cursor.close()
\ No newline at end of file
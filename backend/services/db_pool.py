@@ -0,0 +1,295 @@
+"""
+Per-process MySQL connection pool used by DatabaseService.
+
+Each worker process keeps DB_POOL_SIZE open connections and may open up to
+DB_POOL_MAX_OVERFLOW more under load; overflow connections are closed when they
+are returned. Checkout waits up to DB_POOL_TIMEOUT seconds for a free
+connection instead of opening an unbounded number of them. On checkout a
+connection is pinged (cheap COM_PING round trip) and replaced if it is dead or
+older than DB_POOL_RECYCLE seconds, so MySQL's wait_timeout never hands a
+request a stale socket.
+
+Connections prefer the C extension (use_pure=False, falling back to the pure
+Python driver when it is not installed) and keep a small LRU of prepared
+statements, so hot queries are parsed by the server once per connection.
+
+Sizing: every worker process has its own pool, so MySQL sees up to
+workers x (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW) connections; keep that below
+max_connections. DB_POOL_SIZE should cover one connection per request thread
+plus SCAN_ASYNC_WORKERS.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import mysql.connector
+from mysql.connector import Error
+
+# Statements that can be prepared and reused; anything else runs on a plain cursor
+PREPARABLE_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class PoolTimeout(Error):
+    """No connection became available within DB_POOL_TIMEOUT."""
+
+
+class PooledConnection:
+    """
+    A pooled MySQL connection. Attribute access is forwarded to the driver
+    connection, so callers use it like the connection itself; `close()`
+    returns it to the pool instead of disconnecting.
+    """
+
+    def __init__(self, pool, raw, overflow=False):
+        self._pool = pool
+        self._raw = raw
+        self.overflow = overflow
+        self.created_at = time.monotonic()
+        self._prepared = OrderedDict()  # query text -> prepared dict cursor
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created_at
+
+    def prepared_cursor(self, query):
+        """
+        Cached prepared-statement cursor for `query` (dictionary rows). Returns
+        (cursor, query) where `query` is the cached string object: the driver
+        only skips re-preparing when it is given the identical object.
+        """
+        entry = self._prepared.get(query)
+        if entry is not None:
+            self._prepared.move_to_end(query)
+            return entry[1], entry[0]
+        cursor = self._raw.cursor(prepared=True, dictionary=True)
+        self._prepared[query] = (query, cursor)
+        while len(self._prepared) > self._pool.statement_cache_size:
+            _, (_, evicted) = self._prepared.popitem(last=False)
+            self._close_cursor(evicted)
+        return cursor, query
+
+    def discard_prepared(self, query):
+        entry = self._prepared.pop(query, None)
+        if entry is not None:
+            self._close_cursor(entry[1])
+
+    @staticmethod
+    def _close_cursor(cursor):
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+    def close(self):
+        """Returns the connection to its pool."""
+        self._pool.release(self)
+
+    def disconnect(self):
+        for _, cursor in self._prepared.values():
+            self._close_cursor(cursor)
+        self._prepared.clear()
+        try:
+            self._raw.close()
+        except Error:
+            pass
+
+
+class ConnectionPool:
+    """Fixed-size pool with bounded overflow, ping-on-checkout and age-based recycling."""
+
+    def __init__(self, connect_kwargs, size=5, max_overflow=5, timeout=10.0,
+                 recycle_seconds=1800, statement_cache_size=64, prepared_statements=True):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.size = max(1, int(size))
+        self.max_overflow = max(0, int(max_overflow))
+        self.timeout = float(timeout)
+        self.recycle_seconds = recycle_seconds
+        self.statement_cache_size = max(1, int(statement_cache_size))
+        self.prepared_statements = prepared_statements
+        self.pid = os.getpid()
+
+        self._idle = deque()
+        self._open = 0  # connections that exist (idle + in use)
+        self._condition = threading.Condition()
+
+        self._checkouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._waits = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._ping_failures = 0
+        self._overflow_peak = 0
+
+    def _connect(self, overflow):
+        raw = mysql.connector.connect(**self.connect_kwargs)
+        with self._condition:
+            self._created += 1
+        return PooledConnection(self, raw, overflow=overflow)
+
+    def _is_usable(self, conn):
+        if self.recycle_seconds and conn.age > self.recycle_seconds:
+            with self._condition:
+                self._recycled += 1
+            return False
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Error:
+            with self._condition:
+                self._ping_failures += 1
+            return False
+
+    def acquire(self):
+        """Checks out a healthy connection; raises PoolTimeout or a connection Error."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            with self._condition:
+                while not self._idle and self._open >= self.size + self.max_overflow:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            msg=f"No database connection available within {self.timeout:g}s "
+                                f"(pool size {self.size}, overflow {self.max_overflow})"
+                        )
+                    waited = True
+                    self._condition.wait(remaining)
+                conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    self._open += 1
+                    overflow = self._open > self.size
+                    if overflow:
+                        self._overflow_peak = max(self._overflow_peak, self._open - self.size)
+
+            if conn is None:
+                try:
+                    conn = self._connect(overflow)
+                except Exception:
+                    self._forget()
+                    raise
+            elif not self._is_usable(conn):
+                conn.disconnect()
+                self._forget()
+                continue
+
+            wait_seconds = time.monotonic() - start
+            with self._condition:
+                self._checkouts += 1
+                self._waits += waited
+                self._wait_seconds += wait_seconds
+                self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+            return conn
+
+    def _forget(self):
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+    def release(self, conn):
+        """Returns a connection: rolled back and kept idle, or closed if it is overflow, broken or stale."""
+        if conn._pool is not self or self.pid != os.getpid():
+            # Inherited across a fork: the socket belongs to the parent, leave it alone
+            return
+        # No ping here: a connection that died while idle is caught on its next checkout
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            keep = True
+        except Error:
+            keep = False
+
+        with self._condition:
+            keep = keep and not conn.overflow and len(self._idle) < self.size
+            if keep:
+                self._idle.append(conn)
+            else:
+                self._open -= 1
+            self._condition.notify()
+        if not keep:
+            conn.disconnect()
+
+    def discard(self, conn):
+        """Closes a checked-out connection that cannot be reused (e.g. abandoned mid-result)."""
+        if conn._pool is not self or self.pid != os.getpid():
+            return
+        conn.disconnect()
+        self._forget()
+
+    def close(self):
+        """Closes every idle connection (checked-out ones close when released)."""
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for conn in idle:
+            conn.disconnect()
+
+    def get_stats(self):
+        with self._condition:
+            idle = len(self._idle)
+            return {
+                "pid": self.pid,
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "in_use": self._open - idle,
+                "idle": idle,
+                "overflow": max(0, self._open - self.size),
+                "overflow_peak": self._overflow_peak,
+                "checkouts": self._checkouts,
+                "waited_checkouts": self._waits,
+                "mean_wait_ms": round(self._wait_seconds * 1000.0 / self._checkouts, 3) if self._checkouts else 0.0,
+                "max_wait_ms": round(self._max_wait_seconds * 1000.0, 3),
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "recycled": self._recycled,
+                "ping_failures": self._ping_failures,
+                "c_extension": self.connect_kwargs.get('use_pure') is False and mysql.connector.HAVE_CEXT,
+                "prepared_statements": self.prepared_statements,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(app):
+    """This process's pool, created from `app.config` on first use (and again after a fork)."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            config = app.config
+            _pool = ConnectionPool(
+                {
+                    'host': config['MYSQL_HOST'],
+                    'user': config['MYSQL_USER'],
+                    'password': config['MYSQL_PASSWORD'],
+                    'database': config['MYSQL_DB'],
+                    'use_pure': False,
+                },
+                size=config.get('DB_POOL_SIZE', 5),
+                max_overflow=config.get('DB_POOL_MAX_OVERFLOW', 5),
+                timeout=config.get('DB_POOL_TIMEOUT', 10.0),
+                recycle_seconds=config.get('DB_POOL_RECYCLE', 1800),
+                statement_cache_size=config.get('DB_STATEMENT_CACHE_SIZE', 64),
+                prepared_statements=config.get('DB_PREPARED_STATEMENTS', True),
+            )
+        return _pool
+
+
+def get_pool_stats():
+    """Metrics of this process's pool, or None before its first checkout."""
+    pool = _pool
+    if pool is None or pool.pid != os.getpid():
+        return None
+    return pool.get_stats()
@@ -0,0 +1,79 @@
+"""
+Cache-friendly serving of stored uploads and their derivatives.
+
+Stored files never change under their name: blobs are content-addressed
+('ab/cd/<sha256>.<ext>'), legacy uploads have unique UUID names and thumbnails
+are derived from those. So responses carry a strong ETag and
+`Cache-Control: public, max-age=<UPLOAD_CACHE_MAX_AGE>, immutable`, and
+conditional (If-None-Match / If-Modified-Since) and Range requests are honoured.
+
+UPLOAD_SENDFILE_MODE hands the transfer itself to the front proxy so Python
+workers never stream bytes:
+    'x-accel-redirect'  nginx: internal location UPLOAD_ACCEL_PREFIX aliased to UPLOAD_FOLDER
+    'x-sendfile'        Apache mod_xsendfile / lighttpd
+    'none'              Flask streams the file (default)
+"""
+import mimetypes
+import os
+import re
+
+from flask import current_app, request, send_file
+
+SENDFILE_NONE = 'none'
+X_ACCEL_REDIRECT = 'x-accel-redirect'
+X_SENDFILE = 'x-sendfile'
+SENDFILE_MODES = (SENDFILE_NONE, X_ACCEL_REDIRECT, X_SENDFILE)
+
+# 'ab/cd/<sha256>.<ext>' (optionally '.<size>.<ext>' for derivatives)
+_CONTENT_KEY = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})((?:\.\d+)?)\.[a-z0-9]+$')
+
+
+def content_etag(key):
+    """
+    Strong ETag derived from the storage key for content-addressed files (the
+    hash, plus the size for derivatives), or None to fall back to Flask's
+    mtime/size-based ETag.
+    """
+    match = _CONTENT_KEY.match(key)
+    if not match:
+        return None
+    return match.group(1) + match.group(2)
+
+
+def send_stored_file(path, key):
+    """
+    Response for a stored file at `path` (storage key `key`), with immutable
+    caching headers, served directly or via the configured proxy offload.
+    """
+    config = current_app.config
+    mode = (config.get('UPLOAD_SENDFILE_MODE') or SENDFILE_NONE).lower()
+    max_age = int(config.get('UPLOAD_CACHE_MAX_AGE') or 0)
+    etag = content_etag(key)
+
+    if mode in (X_ACCEL_REDIRECT, X_SENDFILE):
+        # The proxy streams the file (and answers Range itself); Python only sets headers.
+        # Conditional requests are still answered here, before the proxy is involved.
+        stat = os.stat(path)
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        )
+        if mode == X_ACCEL_REDIRECT:
+            response.headers['X-Accel-Redirect'] = config.get('UPLOAD_ACCEL_PREFIX', '/protected-uploads/') + key
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+        response.set_etag(etag or f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+        response.last_modified = int(stat.st_mtime)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            # Nothing to transfer; the proxy would otherwise replace the 304 with the file
+            response.headers.pop('X-Accel-Redirect', None)
+            response.headers.pop('X-Sendfile', None)
+    else:
+        response = send_file(path, etag=etag or True, conditional=True, max_age=None)
+
+    if max_age > 0:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    return response
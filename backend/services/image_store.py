@@ -0,0 +1,286 @@
+"""
+Content-addressed, sharded storage for uploaded scans.
+
+Each upload is stored once per distinct content, named by its sha256 in a
+two-level shard tree under UPLOAD_FOLDER:
+
+    ab/cd/abcd1234....jpg        (images.file_path = 'uploads/ab/cd/abcd1234....jpg')
+
+Rows in `images` that share content share the blob (images.content_hash). A
+blob is only deleted when no row references it any more, by `gc`, never
+inline by a request (a blob that looks unreferenced may be about to be
+referenced by a concurrent upload of the same content). Derivatives
+(thumbnails, Grad-CAM heatmaps) live next to the blob and are shared too.
+Uploads from before this layout ('uploads/<uuid>.<ext>') keep working until
+they are migrated:
+
+    python -m backend.services.image_store migrate     # move flat uploads into the shard tree
+    python -m backend.services.image_store gc --dry-run  # list unreferenced files
+"""
+import argparse
+import glob
+import hashlib
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import safe_join
+
+from .thumbnails import is_original
+
+# Prefix of images.file_path; the rest is the key under UPLOAD_FOLDER
+FILE_PATH_PREFIX = 'uploads/'
+
+# Uploaded extensions that name the same format
+EXTENSION_ALIASES = {'jpeg': 'jpg'}
+
+# What may follow a blob's stem in the name of something derived from it:
+# thumbnails (.<size>.webp|jpg), the Grad-CAM heatmap, and their temp files.
+# Anything else (e.g. <hash>.png next to <hash>.jpg) is another original.
+DERIVED_SUFFIX = re.compile(r'\.(\d+\.(webp|jpg)|heatmap\.png)(\.[0-9a-f]+\.tmp)?')
+
+
+def normalize_extension(extension):
+    extension = extension.lower().lstrip('.')
+    return EXTENSION_ALIASES.get(extension, extension)
+
+
+def blob_key(content_hash, extension):
+    """Sharded key of a blob: 'ab/cd/<hash>.<ext>'."""
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.{normalize_extension(extension)}"
+
+
+def key_for(file_path):
+    """Storage key for an images.file_path value (sharded or legacy flat)."""
+    if file_path.startswith(FILE_PATH_PREFIX):
+        return file_path[len(FILE_PATH_PREFIX):]
+    return file_path
+
+
+def file_path_for(key):
+    """images.file_path value for a storage key."""
+    return FILE_PATH_PREFIX + key
+
+
+def hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """Maps storage keys to files under `root` and writes blobs by content hash."""
+
+    def __init__(self, root):
+        self.root = root
+
+    @classmethod
+    def from_app(cls, app=None):
+        return cls((app or current_app).config['UPLOAD_FOLDER'])
+
+    def path(self, file_path_or_key):
+        """Absolute path of a stored image; None if the key escapes the store."""
+        return safe_join(self.root, key_for(file_path_or_key))
+
+    def put(self, ingest, extension):
+        """
+        Stores a fully ingested upload (backend.services.upload_ingest.IngestStream)
+        under its content hash. If the blob already exists the temp file is dropped
+        and the blob's mtime refreshed, so `gc` (which skips recent files) cannot
+        collect it before the caller's row references it. Returns (key, created).
+        """
+        key = blob_key(ingest.content_hash, extension)
+        path = self.path(key)
+        if os.path.exists(path):
+            ingest.discard()
+            os.utime(path)
+            return key, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ingest.commit(path)
+        return key, True
+
+    def put_file(self, source_path, content_hash, extension):
+        """
+        Adds an existing file to the shard tree by hard link (or an atomic copy
+        where links are unsupported). The source is left in place, so it stays
+        servable until the caller has repointed its rows. Returns (key, created).
+        """
+        key = blob_key(content_hash, extension)
+        path = self.path(key)
+        if os.path.exists(path):
+            return key, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(source_path, path)
+        except OSError:
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, path)
+        return key, True
+
+    def _stem_siblings(self, key):
+        """(derivatives and caches, other originals) stored next to a blob under the same stem."""
+        path = self.path(key)
+        stem = os.path.splitext(path)[0]
+        derived, originals = [], []
+        for candidate in glob.glob(glob.escape(stem) + '.*'):
+            if candidate == path:
+                continue
+            if DERIVED_SUFFIX.fullmatch(candidate[len(stem):]) or (
+                    candidate.startswith(path + '.') and candidate.endswith('.tmp')):
+                derived.append(candidate)
+            else:
+                originals.append(candidate)
+        return derived, originals
+
+    def derived_paths(self, key):
+        """Derivatives and caches stored next to a blob (thumbnails, heatmap, temp files)."""
+        return self._stem_siblings(key)[0]
+
+    def delete(self, key):
+        """
+        Removes a blob and everything derived from it. The same content stored
+        under another extension (<hash>.png next to <hash>.jpg) is left alone,
+        and so are the derivatives it shares with this blob.
+        """
+        derived, originals = self._stem_siblings(key)
+        for path in ([] if originals else derived) + [self.path(key)]:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def iter_originals(self, sizes=()):
+        """Yields the key of every stored original (flat legacy files and shard-tree blobs)."""
+        for directory, subdirectories, filenames in os.walk(self.root):
+            subdirectories.sort()
+            for filename in sorted(filenames):
+                if is_original(filename, sizes):
+                    yield os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, '/')
+
+
+# --- Bulk tools ---
+
+def migrate(app, batch_size=500, hash_workers=8):
+    """
+    Moves flat uploads ('uploads/<uuid>.<ext>') into the shard tree, batch by
+    batch: hashes the files in parallel, moves each blob (duplicates collapse
+    into one) with its derivatives, then points every row at the new key.
+    Safe to re-run after an interruption.
+    """
+    from backend.models.image_model import ImageModel
+
+    store = ImageStore.from_app(app)
+    image_model = ImageModel()
+    moved = deduplicated = missing = 0
+    after_image_id = 0
+
+    with ThreadPoolExecutor(max_workers=hash_workers) as pool:
+        while True:
+            rows = image_model.get_unhashed_images(after_image_id, batch_size)
+            if not rows:
+                break
+            after_image_id = rows[-1]['image_id']
+
+            file_paths = sorted({row['file_path'] for row in rows})
+            sources = {file_path: store.path(file_path) for file_path in file_paths}
+            present = [file_path for file_path in file_paths if sources[file_path] and os.path.exists(sources[file_path])]
+            missing += len(file_paths) - len(present)
+            hashes = dict(zip(present, pool.map(lambda file_path: hash_file(sources[file_path]), present)))
+
+            for file_path, content_hash in hashes.items():
+                source = sources[file_path]
+                key, created = store.put_file(source, content_hash, os.path.splitext(source)[1])
+                # Repoint the rows before the old name disappears, so the image stays servable
+                if image_model.set_content_location(file_path, file_path_for(key), content_hash) is None:
+                    print(f"Database update failed for {file_path}; left in place.", file=sys.stderr)
+                    continue
+
+                # Thumbnails and heatmaps follow the blob (dropped if the blob already has its own)
+                source_stem = os.path.splitext(source)[0]
+                target_stem = os.path.splitext(store.path(key))[0]
+                for path in glob.glob(glob.escape(source_stem) + '.*'):
+                    target = target_stem + path[len(source_stem):]
+                    if path == source or os.path.exists(target):
+                        os.remove(path)
+                    else:
+                        os.replace(path, target)
+
+                moved += created
+                deduplicated += not created
+            print(f"Migrated {moved + deduplicated} files ({deduplicated} duplicates, {missing} missing)...")
+
+    return {"moved": moved, "deduplicated": deduplicated, "missing": missing}
+
+
+def collect_garbage(app, min_age_seconds=3600, dry_run=False, batch_size=500):
+    """
+    Deletes stored originals (and their derivatives) that no images row
+    references. Files younger than `min_age_seconds` are skipped so uploads
+    still being written are never collected.
+    """
+    from backend.models.image_model import ImageModel
+
+    store = ImageStore.from_app(app)
+    image_model = ImageModel()
+    cutoff = time.time() - min_age_seconds
+    deleted = []
+
+    def sweep(keys):
+        referenced = image_model.get_referenced_file_paths([file_path_for(key) for key in keys])
+        if referenced is None:
+            raise RuntimeError("Database unavailable; aborting garbage collection.")
+        for key in keys:
+            if file_path_for(key) in referenced or os.path.getmtime(store.path(key)) > cutoff:
+                continue
+            deleted.append(key)
+            if not dry_run:
+                store.delete(key)
+
+    batch = []
+    for key in store.iter_originals(app.config.get('THUMBNAIL_SIZES', ())):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            sweep(batch)
+            batch = []
+    if batch:
+        sweep(batch)
+    return deleted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the content-addressed upload store.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="Move flat uploads into the sharded layout")
+    migrate_parser.add_argument('--batch-size', type=int, default=500)
+    migrate_parser.add_argument('--hash-workers', type=int, default=8)
+    gc_parser = subparsers.add_parser('gc', help="Delete files no image references")
+    gc_parser.add_argument('--min-age-seconds', type=int, default=3600)
+    gc_parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+
+    class ToolConfig(Config):
+        APP_ROLE = 'api'  # No model needed
+
+    app = create_app(ToolConfig)
+    with app.app_context():
+        if args.command == 'migrate':
+            print(migrate(app, batch_size=args.batch_size, hash_workers=args.hash_workers))
+        else:
+            deleted = collect_garbage(app, min_age_seconds=args.min_age_seconds, dry_run=args.dry_run)
+            for key in deleted:
+                print(key)
+            print(f"{'Would delete' if args.dry_run else 'Deleted'} {len(deleted)} files.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
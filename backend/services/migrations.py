@@ -0,0 +1,421 @@
+"""
+Versioned schema migrations on top of the baseline schema in database.sql.
+
+Each change is a numbered pair of SQL files in MIGRATIONS_FOLDER:
+
+    0001_hot_path_indexes.up.sql      applied by `up`
+    0001_hot_path_indexes.down.sql    reverts it, applied by `down`
+
+Applied versions are recorded in the `schema_migrations` table (with a
+checksum of the up file, so `status` notices edits to applied migrations).
+
+    python -m backend.services.migrations status
+    python -m backend.services.migrations up [--to 2] [--dry-run]
+    python -m backend.services.migrations down [--steps 1 | --to 0] [--dry-run]
+    python -m backend.services.migrations explain [--user-id 1 --tree-id 1]
+
+MySQL commits DDL implicitly, so a migration is not atomic: keep one index or
+column change per statement. Re-running a migration that stopped half way
+skips the indexes/columns it already created (or dropped).
+
+`explain` runs EXPLAIN on the hot ImageModel and StatisticsModel queries and
+exits non-zero unless each one reads its tables through the index it was
+written for (tests/test_query_plans.py runs the same check under pytest).
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+from datetime import datetime
+
+from mysql.connector import Error, errorcode
+
+_FILE_NAME = re.compile(r'^(\d+)_([A-Za-z0-9_]+)\.(up|down)\.sql$')
+
+# Errors that mean a statement's change is already in place (partial earlier run)
+ALREADY_APPLIED = {
+    'up': {errorcode.ER_DUP_KEYNAME, errorcode.ER_DUP_FIELDNAME, errorcode.ER_TABLE_EXISTS_ERROR},
+    'down': {errorcode.ER_CANT_DROP_FIELD_OR_KEY, errorcode.ER_BAD_TABLE_ERROR},
+}
+
+TRACKING_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    """One numbered migration: its up and (optional) down SQL file."""
+
+    def __init__(self, version, name):
+        self.version = version
+        self.name = name
+        self.up_path = None
+        self.down_path = None
+
+    @property
+    def checksum(self):
+        with open(self.up_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def statements(self, direction):
+        path = self.up_path if direction == 'up' else self.down_path
+        if path is None:
+            raise MigrationError(f"Migration {self.version:04d}_{self.name} has no {direction} file.")
+        with open(path, encoding='utf-8') as f:
+            return split_statements(f.read())
+
+    def __str__(self):
+        return f"{self.version:04d}_{self.name}"
+
+    __repr__ = __str__
+
+
+def split_statements(sql):
+    """Splits a script into statements on ';', ignoring '--' comments and semicolons inside quotes."""
+    statements, current, quote = [], [], None
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if quote:
+            current.append(char)
+            if char == '\\':
+                current.append(sql[i + 1:i + 2])
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in ("'", '"', '`'):
+            quote = char
+            current.append(char)
+        elif sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = len(sql) if end == -1 else end
+            continue
+        elif char == ';':
+            statements.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    statements.append(''.join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def discover(folder):
+    """Migrations in `folder`, ordered by version."""
+    migrations = {}
+    for file_name in sorted(os.listdir(folder)):
+        match = _FILE_NAME.match(file_name)
+        if not match:
+            continue
+        version, name, direction = int(match.group(1)), match.group(2), match.group(3)
+        migration = migrations.setdefault(version, Migration(version, name))
+        if migration.name != name:
+            raise MigrationError(f"Version {version} is used by both {migration.name} and {name}.")
+        setattr(migration, f"{direction}_path", os.path.join(folder, file_name))
+    for migration in migrations.values():
+        if migration.up_path is None:
+            raise MigrationError(f"Migration {migration!r} has no up file.")
+    return [migrations[version] for version in sorted(migrations)]
+
+
+class MigrationRunner:
+    """Applies and reverts migrations on one MySQL connection, tracked in schema_migrations."""
+
+    def __init__(self, conn, folder, log=print):
+        self.conn = conn
+        self.folder = folder
+        self.log = log
+        self.migrations = discover(folder)
+
+    def _execute(self, statement, params=None):
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(statement, params)
+            if cursor.with_rows:
+                cursor.fetchall()
+        finally:
+            cursor.close()
+        self.conn.commit()
+
+    def applied(self):
+        """{version: (name, checksum, applied_at)} of the applied migrations."""
+        self._execute(TRACKING_TABLE)
+        cursor = self.conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        return {row['version']: (row['name'], row['checksum'], row['applied_at']) for row in rows}
+
+    def status(self):
+        """[(migration, state, applied_at)] with state 'applied', 'pending' or 'changed'."""
+        applied = self.applied()
+        rows = []
+        for migration in self.migrations:
+            record = applied.pop(migration.version, None)
+            if record is None:
+                rows.append((migration, 'pending', None))
+            else:
+                state = 'applied' if record[1] == migration.checksum else 'changed'
+                rows.append((migration, state, record[2]))
+        for version, (name, _, applied_at) in sorted(applied.items()):
+            rows.append((f"{version:04d}_{name}", 'missing file', applied_at))
+        return rows
+
+    def _run(self, migration, direction, dry_run):
+        self.log(f"{'Applying' if direction == 'up' else 'Reverting'} {migration!r}...")
+        for statement in migration.statements(direction):
+            if dry_run:
+                self.log(f"  {statement};")
+                continue
+            try:
+                self._execute(statement)
+            except Error as e:
+                if e.errno in ALREADY_APPLIED[direction]:
+                    self.log(f"  already done, skipped: {e.msg}")
+                    continue
+                raise MigrationError(f"{migration!r} failed: {e}\nStatement: {statement}") from e
+        if dry_run:
+            return
+        if direction == 'up':
+            self._execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum),
+            )
+        else:
+            self._execute("DELETE FROM schema_migrations WHERE version = %s", (migration.version,))
+
+    def up(self, target=None, dry_run=False):
+        """Applies pending migrations up to `target` (default: all). Returns the applied ones."""
+        applied = self.applied()
+        pending = [
+            migration for migration in self.migrations
+            if migration.version not in applied and (target is None or migration.version <= target)
+        ]
+        for migration in pending:
+            self._run(migration, 'up', dry_run)
+        return pending
+
+    def down(self, steps=1, target=None, dry_run=False):
+        """
+        Reverts the latest `steps` applied migrations, or every migration above
+        version `target` when given. Returns the reverted ones.
+        """
+        applied = self.applied()
+        by_version = {migration.version: migration for migration in self.migrations}
+        missing = [version for version in applied if version not in by_version]
+        versions = sorted(applied, reverse=True)
+        if target is not None:
+            versions = [version for version in versions if version > target]
+        else:
+            versions = versions[:steps]
+        if any(version in missing for version in versions):
+            raise MigrationError(f"No files for applied migration(s) {sorted(missing)}; cannot revert.")
+        reverted = [by_version[version] for version in versions]
+        for migration in reverted:
+            self._run(migration, 'down', dry_run)
+        return reverted
+
+
+# --- Query plan check ---
+
+def _explain(conn, query, params):
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("EXPLAIN " + query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+class ExplainingDatabase:
+    """
+    Stands in for a model's DatabaseService: records the EXPLAIN plan of each
+    statement the model would run and returns empty results instead of running it.
+    """
+
+    def __init__(self, db, conn):
+        self.db = db
+        self.conn = conn
+        self.plans = []
+
+    def __getattr__(self, name):
+        # keyset_condition, limit_clause, ...
+        return getattr(self.db, name)
+
+    def execute_query(self, query, params=None, fetch_one=False, commit=False):
+        if query.lstrip()[:6].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+            self.plans.append((query, _explain(self.conn, query, params)))
+        return None if fetch_one else []
+
+    def iter_query(self, query, params=None, chunk_size=None):
+        self.execute_query(query, params)
+        return iter(())
+
+
+# EXPLAIN access types that read a whole table or a whole index
+SCAN_TYPES = ('ALL', 'index')
+
+
+def plan_problems(plan, expected_keys):
+    """
+    [(table, problem)] for one EXPLAIN plan. `expected_keys` maps a table (as
+    EXPLAIN names it: the alias, if any) to the index it must be read with, or
+    a tuple of acceptable ones; such tables must not be scanned in full either.
+    Other tables only fail when read in full with no index they could use.
+    Tables MySQL resolved while planning (const lookups that found no row) do
+    not show up in the plan and are not reported.
+    """
+    problems = []
+    for row in plan:
+        table = row.get('table')
+        if not table or str(table).startswith('<'):  # derived tables / unions
+            continue
+        if table in expected_keys:
+            accepted = expected_keys[table]
+            accepted = (accepted,) if isinstance(accepted, str) else tuple(accepted)
+            if row.get('type') in SCAN_TYPES:
+                problems.append((table, f"{row['type']} scan (key={row.get('key')}), expected {' or '.join(accepted)}"))
+            elif row.get('key') not in accepted:
+                problems.append((table, f"reads key {row.get('key')}, expected {' or '.join(accepted)}"))
+        elif row.get('type') == 'ALL' and not row.get('possible_keys'):
+            problems.append((table, "full table scan with no usable index"))
+    return problems
+
+
+def hot_queries(user_id, tree_id):
+    """
+    (label, expected keys, callable(image_model, statistics_model)) of the
+    queries the plan check covers; see plan_problems for the expected keys.
+    """
+    after = (datetime.now(), 2 ** 31 - 1)  # a next-page cursor
+    prediction = {'p': 'uq_predictions_image'}  # predictions joined to their image
+    return [
+        ('ImageModel.get_user_gallery', {'i': 'idx_images_user_status_date', **prediction},
+         lambda im, sm: im.get_user_gallery(user_id, limit=51)),
+        ('ImageModel.get_user_gallery (next page)', {'i': 'idx_images_user_status_date', **prediction},
+         lambda im, sm: im.get_user_gallery(user_id, limit=51, after=after)),
+        ('ImageModel.get_images_by_tree', {'i': 'idx_images_tree_date', **prediction},
+         lambda im, sm: im.get_images_by_tree(tree_id, limit=51)),
+        ('ImageModel.get_images_by_tree (next page)', {'i': 'idx_images_tree_date', **prediction},
+         lambda im, sm: im.get_images_by_tree(tree_id, limit=51, after=after)),
+        ('ImageModel.iter_all_system_scans (next page)', {'i': 'idx_images_upload_date', **prediction},
+         lambda im, sm: list(im.iter_all_system_scans(limit=51, after=after))),
+        ('ImageModel.get_image_details', {'i': 'PRIMARY', **prediction},
+         lambda im, sm: im.get_image_details(1, user_id)),
+        ('ImageModel.get_scan_job', {'i': 'PRIMARY', **prediction},
+         lambda im, sm: im.get_scan_job(1, user_id)),
+        ('ImageModel.claim_pending_images', {'images': 'idx_images_status'},
+         lambda im, sm: im.claim_pending_images('explain')),
+        ('ImageModel.get_unhashed_images', {'images': ('idx_images_content_hash', 'PRIMARY')},
+         lambda im, sm: im.get_unhashed_images(0, 500)),
+        ('ImageModel.get_referenced_file_paths', {'images': 'idx_images_file_path'},
+         lambda im, sm: im.get_referenced_file_paths(['uploads/explain.jpg'])),
+        ('StatisticsModel.get_user_disease_distribution', {'i': 'idx_images_user_status_date', **prediction},
+         lambda im, sm: sm.get_user_disease_distribution(user_id, '2000-01-01', '2100-01-01')),
+        ('StatisticsModel.get_user_scans_by_tree', {'i': 'idx_images_user_status_date'},
+         lambda im, sm: sm.get_user_scans_by_tree(user_id, '2000-01-01')),
+        ('StatisticsModel.get_user_total_scans', {'images': 'idx_images_user_status_date'},
+         lambda im, sm: sm.get_user_total_scans(user_id, '2000-01-01')),
+        ('StatisticsModel.get_tree_health_scores', {'i': 'idx_images_tree_date', **prediction},
+         lambda im, sm: sm.get_tree_health_scores(tree_id)),
+        ('StatisticsModel.get_regional_disease_data', {'p': 'idx_predictions_class', 'i': 'PRIMARY'},
+         lambda im, sm: sm.get_regional_disease_data(0.0, 0.0)),
+        ('StatisticsModel.check_geo_outbreak_risk',
+         {'i': 'idx_images_upload_date', **prediction, 'farms': 'idx_farms_user_name'},
+         lambda im, sm: sm.check_geo_outbreak_risk(user_id)),
+    ]
+
+
+def check_query_plans(conn, user_id=1, tree_id=1, log=print):
+    """
+    EXPLAINs the hot ImageModel/StatisticsModel queries on `conn`. Returns the
+    [(label, table, problem)] found (empty list = every query uses its index).
+    """
+    from backend.models.image_model import ImageModel
+    from backend.models.statistics_model import StatisticsModel
+
+    failures = []
+    for label, expected_keys, call in hot_queries(user_id, tree_id):
+        image_model, statistics_model = ImageModel(), StatisticsModel()
+        recorder = ExplainingDatabase(image_model.db, conn)
+        image_model.db = statistics_model.db = statistics_model.farm_model.db = recorder
+        call(image_model, statistics_model)
+
+        for _, plan in recorder.plans:
+            problems = plan_problems(plan, expected_keys)
+            failures.extend((label, table, problem) for table, problem in problems)
+            flagged = {table for table, _ in problems}
+            for row in plan:
+                marker = 'FAIL' if row.get('table') in flagged else 'ok'
+                log(f"{label:<50} {str(row.get('table')):<8} {str(row.get('type')):<7} "
+                    f"key={row.get('key')} rows={row.get('rows')} {marker}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Versioned schema migrations and query plan checks.")
+    parser.add_argument('--folder', default=None, help="Migrations folder (default: MIGRATIONS_FOLDER)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="List applied and pending migrations")
+    up_parser = subparsers.add_parser('up', help="Apply pending migrations")
+    up_parser.add_argument('--to', type=int, default=None, help="Stop after this version")
+    up_parser.add_argument('--dry-run', action='store_true', help="Print the statements only")
+    down_parser = subparsers.add_parser('down', help="Revert applied migrations")
+    down_parser.add_argument('--steps', type=int, default=1, help="Number of migrations to revert (default 1)")
+    down_parser.add_argument('--to', type=int, default=None, help="Revert every migration above this version")
+    down_parser.add_argument('--dry-run', action='store_true', help="Print the statements only")
+    explain_parser = subparsers.add_parser('explain', help="Fail if a hot query does not use its index")
+    explain_parser.add_argument('--user-id', type=int, default=1)
+    explain_parser.add_argument('--tree-id', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from config import Config
+    from backend.services.database_service import DatabaseService
+
+    class ToolConfig(Config):
+        APP_ROLE = 'api'  # No model needed
+        DEBUG = True  # Raise instead of returning None when MySQL is unreachable
+
+    app = create_app(ToolConfig)
+    with app.app_context():
+        conn = DatabaseService.get_db_connection()
+
+        if args.command == 'explain':
+            failures = check_query_plans(conn, user_id=args.user_id, tree_id=args.tree_id)
+            for label, table, problem in failures:
+                print(f"{label}: `{table}` {problem}", file=sys.stderr)
+            print("Query plans OK." if not failures else f"{len(failures)} query plan problem(s).")
+            return 1 if failures else 0
+
+        runner = MigrationRunner(conn, args.folder or app.config['MIGRATIONS_FOLDER'])
+        try:
+            if args.command == 'status':
+                for migration, state, applied_at in runner.status():
+                    print(f"{str(migration):<45} {state:<13} {applied_at or ''}")
+            elif args.command == 'up':
+                done = runner.up(target=args.to, dry_run=args.dry_run)
+                print(f"{'Would apply' if args.dry_run else 'Applied'} {len(done)} migration(s).")
+            else:
+                done = runner.down(steps=args.steps, target=args.to, dry_run=args.dry_run)
+                print(f"{'Would revert' if args.dry_run else 'Reverted'} {len(done)} migration(s).")
+        except MigrationError as e:
+            print(e, file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Multi-resolution derivatives of uploaded scans for gallery views.
+
+Gallery-style listings link to a downscaled copy (THUMBNAIL_SIZES, longest side
+in pixels) instead of the full-size phone photo. Derivatives are stored next to
+the original as <name>.<size>.<webp|jpg>, created lazily on first request (or
+ahead of time by the backfill command), and written via temp file + rename so a
+concurrent request never serves a partial file.
+
+    python -m backend.services.thumbnails backfill --workers 4
+
+Pillow only: API-only workers (APP_ROLE=api) can serve and generate these.
+"""
+import argparse
+import os
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps, features
+
+# Files in UPLOAD_FOLDER that are derivatives / caches, never originals
+DERIVED_MARKERS = ('.heatmap.png', '.tmp')
+
+
+def derivative_format(requested='webp'):
+    """'webp' when Pillow was built with WebP support, else 'jpeg'."""
+    if requested == 'webp' and not features.check('webp'):
+        return 'jpeg'
+    return requested
+
+
+def derivative_path(original_path, size, fmt='webp'):
+    """Location of the `size` px derivative of an uploaded image (next to the original)."""
+    extension = 'webp' if fmt == 'webp' else 'jpg'
+    return f"{os.path.splitext(original_path)[0]}.{size}.{extension}"
+
+
+def is_original(filename, sizes):
+    """True for uploaded originals, False for derivatives, heatmaps and temp files."""
+    if filename.startswith('.') or filename.endswith(DERIVED_MARKERS):
+        return False
+    parts = filename.rsplit('.', 2)
+    return not (len(parts) == 3 and parts[1].isdigit() and int(parts[1]) in sizes)
+
+
+def _save_atomic(img, path, fmt, quality):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if fmt == 'webp':
+            img.save(tmp_path, 'WEBP', quality=quality, method=4)
+        else:
+            img.save(tmp_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def generate_derivatives(original_path, sizes=(128, 512), fmt='webp', quality=80, overwrite=False):
+    """
+    Creates the missing derivatives of one image from a single decode: JPEGs are
+    draft-decoded at the largest requested size, EXIF orientation is applied,
+    and each smaller size is downscaled from the previous one.
+    Returns {size: path}.
+    """
+    fmt = derivative_format(fmt)
+    paths = {size: derivative_path(original_path, size, fmt) for size in sizes}
+    missing = sorted((size for size, path in paths.items() if overwrite or not os.path.exists(path)), reverse=True)
+    if not missing:
+        return paths
+
+    with Image.open(original_path) as img:
+        if img.format == 'JPEG':
+            img.draft('RGB', (missing[0], missing[0]))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+
+    for size in missing:
+        img.thumbnail((size, size), Image.LANCZOS)
+        _save_atomic(img, paths[size], fmt, quality)
+    return paths
+
+
+def ensure_derivative(original_path, size, sizes=(128, 512), fmt='webp', quality=80):
+    """
+    Path of the `size` px derivative, generating the image's derivatives first if
+    needed. Raises FileNotFoundError if the original does not exist.
+    """
+    path = derivative_path(original_path, size, derivative_format(fmt))
+    if os.path.exists(path):
+        return path
+    if not os.path.exists(original_path):
+        raise FileNotFoundError(original_path)
+    return generate_derivatives(original_path, sizes=sizes, fmt=fmt, quality=quality)[size]
+
+
+def _backfill_one(args):
+    original_path, sizes, fmt, quality = args
+    try:
+        generate_derivatives(original_path, sizes=sizes, fmt=fmt, quality=quality)
+        return original_path, None
+    except Exception as e:
+        return original_path, str(e)
+
+
+def backfill(upload_folder, sizes=(128, 512), fmt='webp', quality=80, workers=None):
+    """
+    Generates missing derivatives for every original in `upload_folder` (flat
+    uploads and the content-addressed shard tree) with a process pool.
+    """
+    originals = [
+        os.path.join(directory, name)
+        for directory, _, names in sorted(os.walk(upload_folder))
+        for name in sorted(names) if is_original(name, sizes)
+    ]
+    done, failed = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tasks = ((path, tuple(sizes), fmt, quality) for path in originals)
+        for path, error in pool.map(_backfill_one, tasks, chunksize=16):
+            if error:
+                failed += 1
+                print(f"Failed: {path}: {error}", file=sys.stderr)
+            else:
+                done += 1
+            if (done + failed) % 100 == 0:
+                print(f"Processed {done + failed} of {len(originals)} images...")
+    return done, failed
+
+
+def main(argv=None):
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Maintain gallery thumbnails of uploaded scans.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    fill = subparsers.add_parser('backfill', help="Create missing derivatives for existing uploads")
+    fill.add_argument('--folder', default=Config.UPLOAD_FOLDER)
+    fill.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    done, failed = backfill(
+        args.folder, sizes=Config.THUMBNAIL_SIZES, fmt=Config.THUMBNAIL_FORMAT,
+        quality=Config.THUMBNAIL_QUALITY, workers=args.workers
+    )
+    print(f"Done: {done} images, {failed} failed.")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Single-pass upload ingest.
+
+Werkzeug's multipart parser normally spools each uploaded file into a
+SpooledTemporaryFile, which the scan routes then read back, copy into bytes and
+write out again. IngestRequest replaces that spool with an IngestStream: as the
+parser streams the request body in chunks, each chunk is hashed (sha256) and
+written to a temp file next to its final location. Nothing is kept on the heap:
+the decoder reads the upload through a read-only memory map of that file, whose
+pages the kernel can drop under memory pressure, so a large batch request does
+not pin its whole body in RAM. Accepting the upload is then an atomic
+os.replace(); rejected or abandoned uploads are deleted when the request closes.
+Files larger than MAX_UPLOAD_BYTES are rejected while streaming.
+"""
+import hashlib
+import mmap
+import os
+import shutil
+import uuid
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+TMP_PREFIX = '.ingest-'
+TMP_SUFFIX = '.tmp'
+
+
+class IngestStream:
+    """
+    Writable/readable file object handed to Werkzeug's form parser for one
+    uploaded file. Reads (read/seek/tell) are served from the temp file.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.tmp_path = os.path.join(directory, f"{TMP_PREFIX}{uuid.uuid4().hex}{TMP_SUFFIX}")
+        self.committed_path = None
+        self._hash = hashlib.sha256()
+        self._view = None
+        self._closed = False
+        self._file = open(self.tmp_path, 'w+b')
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge()
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        return len(chunk)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    @property
+    def content_hash(self):
+        """sha256 hex digest of the upload, computed while it streamed in."""
+        return self._hash.hexdigest()
+
+    def getvalue(self):
+        """
+        The upload as a read-only, bytes-like memory map of the temp file (no
+        heap copy). It stays valid after commit() moves the file.
+        """
+        if self._view is None:
+            if self.size == 0:
+                return b''  # Empty files cannot be mapped
+            if self._file.closed:
+                with open(self.committed_path or self.tmp_path, 'rb') as f:
+                    self._view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._file.flush()
+                self._view = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._view
+
+    def commit(self, path):
+        """Atomically moves the fully written temp file to its final `path`."""
+        self._file.close()
+        os.replace(self.tmp_path, path)
+        self.committed_path = path
+        return path
+
+    def discard(self):
+        """Deletes the temp file (no-op once committed)."""
+        if not self._file.closed:
+            self._file.close()
+        if self.committed_path is None and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def close(self):
+        # Called by Werkzeug when the request ends: uncommitted uploads are dropped
+        self.discard()
+        if self._view is not None:
+            try:
+                self._view.close()
+            except BufferError:
+                pass  # Still exported (e.g. a NumPy view); unmapped once that is collected
+        self._closed = True
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class IngestRequest(Request):
+    """Flask request class whose uploaded files stream straight into IngestStreams."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        return IngestStream(config['UPLOAD_FOLDER'], max_bytes=config.get('MAX_UPLOAD_BYTES'))
+
+
+def ingest_file(file_storage, directory, max_bytes=None, chunk_size=64 * 1024):
+    """
+    Returns the IngestStream behind an uploaded file. Files parsed by another
+    request class are copied into one first (and it replaces their stream, so
+    it is still cleaned up when the request closes), giving callers a single code path.
+    """
+    if isinstance(file_storage.stream, IngestStream):
+        return file_storage.stream
+    stream = IngestStream(directory, max_bytes=max_bytes)
+    try:
+        file_storage.stream.seek(0)
+        shutil.copyfileobj(file_storage.stream, stream, chunk_size)
+    except Exception:
+        stream.close()
+        raise
+    file_storage.stream.close()
+    file_storage.stream = stream
+    stream.seek(0)
+    return stream
@@ -0,0 +1,309 @@
+"""
+End-to-end scan-path benchmark: drives PredictService with synthetic (or real)
+JPEGs and reports per-stage timings, images/sec at several concurrency levels,
+and p50/p95/p99 latencies. Stage timings come from PredictService.stage_hook
+while analyze_bytes / analyze_batch run, so they always measure the real pipeline.
+
+Usage (from the repository root):
+    python -m benchmarks.inference.bench_inference --stub                     # stub model, any CPU box
+    python -m benchmarks.inference.bench_inference --model ml_model_files/mango_leaf_classifier_final.h5
+    python -m benchmarks.inference.bench_inference --stub --images photos/ --concurrency 1,4,16 --output run.json
+
+The stub is a small Keras CNN with the production signature (224x224x3 -> 8
+classes), so the numbers track framework and preprocessing overhead rather
+than the real network's FLOPs. Save the JSON output of each run and diff it
+against the previous one when changing TF versions, image sizes or thread settings.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from flask import Flask
+from PIL import Image
+
+from config import Config
+from backend.ml_model.batch_scheduler import _percentile
+from backend.ml_model.model_loader import ModelLoader
+from backend.ml_model.predict_service import PredictService
+
+# Realistic upload sizes: 12 MP phone camera, 3 MP downscaled share, ~1 MP web image
+SYNTHETIC_SIZES = ((4032, 3024), (2048, 1536), (1280, 960))
+# Stages reported by PredictService.stage_hook
+STAGES = ('decode', 'quality_gate', 'predict', 'postprocess')
+
+
+class BenchmarkConfig(Config):
+    # Duplicate images would otherwise be answered from the cache
+    PREDICTION_CACHE_ENABLED = False
+    PREDICTION_CACHE_PERSISTENT = False
+
+
+def build_stub_model(path, image_size=(224, 224), num_classes=8):
+    """Saves a small Keras CNN with the production input/output signature to `path`."""
+    import tensorflow as tf
+
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input(shape=(image_size[1], image_size[0], 3)),
+        tf.keras.layers.Conv2D(16, 3, strides=2, activation='relu'),
+        tf.keras.layers.Conv2D(32, 3, strides=2, activation='relu'),
+        tf.keras.layers.Conv2D(64, 3, strides=2, activation='relu'),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(num_classes, activation='softmax'),
+    ])
+    model.save(path)
+    return path
+
+
+def make_leaf_jpegs(directory, count, size, quality=92):
+    """
+    Writes synthetic leaf photos: a green leaf-shaped ellipse with veins and
+    lesion-like spots on a soil-coloured background. Texture is drawn at a coarse
+    scale and upsampled, so it survives the resize to model size and the photos
+    pass the blur / exposure / leaf-presence quality gate like real scans.
+    """
+    rng = np.random.default_rng(size[0])
+    width, height = size
+    coarse_w, coarse_h = 448, 336
+    y, x = np.mgrid[0:coarse_h, 0:coarse_w]
+    paths = []
+    for i in range(count):
+        leaf = ((x - coarse_w / 2) / (coarse_w * 0.45)) ** 2 + ((y - coarse_h / 2) / (coarse_h * 0.4)) ** 2 < 1.0
+        veins = (np.abs(y - coarse_h / 2) < 2) | (np.abs((x + i * 7) % 40 - np.abs(y - coarse_h / 2) * 0.6) < 1.5)
+        spots = rng.random((coarse_h, coarse_w)) < 0.01
+
+        pixels = np.empty((coarse_h, coarse_w, 3), dtype=np.float32)
+        pixels[...] = (120, 95, 70)  # soil
+        pixels[leaf] = (55, 140, 45)
+        pixels[leaf & veins] = (150, 190, 90)
+        pixels[leaf & spots] = (70, 45, 30)
+        pixels += rng.normal(0, 12, size=pixels.shape)
+
+        coarse = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+        path = os.path.join(directory, f"leaf_{width}x{height}_{i}.jpg")
+        coarse.resize((width, height), Image.NEAREST).save(path, quality=quality)
+        paths.append(path)
+    return paths
+
+
+def load_images(image_dir, tmp_dir, per_size):
+    """Reads JPEG bytes from `image_dir`, or generates synthetic leaf photos at each realistic size."""
+    if image_dir:
+        paths = sorted(
+            os.path.join(image_dir, name) for name in os.listdir(image_dir)
+            if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+        )
+    else:
+        paths = []
+        for size in SYNTHETIC_SIZES:
+            size_dir = os.path.join(tmp_dir, f"{size[0]}x{size[1]}")
+            os.makedirs(size_dir, exist_ok=True)
+            paths.extend(make_leaf_jpegs(size_dir, per_size, size))
+
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+    return images
+
+
+def summarize(timings_ms):
+    """Mean and nearest-rank percentiles of a list of millisecond timings."""
+    ordered = sorted(timings_ms)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered), 3) if ordered else 0.0,
+        "p50_ms": round(_percentile(ordered, 50), 3),
+        "p95_ms": round(_percentile(ordered, 95), 3),
+        "p99_ms": round(_percentile(ordered, 99), 3),
+    }
+
+
+class StageRecorder:
+    """PredictService.stage_hook that collects per-stage timings in milliseconds (thread-safe appends)."""
+
+    def __init__(self):
+        self.timings = {stage: [] for stage in STAGES}
+
+    def __call__(self, stage, seconds):
+        self.timings.setdefault(stage, []).append(seconds * 1000.0)
+
+    def summary(self):
+        return {stage: summarize(values) for stage, values in self.timings.items()}
+
+
+def measure_stages(service, images, repeats):
+    """
+    Per-stage timings of the single-image scan path, reported by the service's
+    own stage hook while PredictService.analyze_bytes runs (decode includes the
+    resize to model size).
+    """
+    recorder = StageRecorder()
+    rejected = 0
+    service.stage_hook = recorder
+    try:
+        for _ in range(repeats):
+            for image_data in images:
+                try:
+                    service.analyze_bytes(image_data)
+                except ValueError:
+                    rejected += 1
+    finally:
+        service.stage_hook = None
+
+    result = recorder.summary()
+    result['quality_gate_rejections'] = rejected
+    return result
+
+
+def measure_batch(service, images, repeats):
+    """
+    Runs the whole image set through PredictService.analyze_batch; reports
+    images/sec and per-stage timings (decode runs on the preprocess pool,
+    predict is per forward pass of up to INFERENCE_MAX_BATCH_SIZE images).
+    """
+    recorder = StageRecorder()
+    rejected = 0
+    service.stage_hook = recorder
+    started = time.perf_counter()
+    try:
+        for _ in range(repeats):
+            rejected += sum(isinstance(result, ValueError) for result in service.analyze_batch(images))
+    finally:
+        service.stage_hook = None
+    elapsed = time.perf_counter() - started
+
+    return {
+        "images_per_sec": round(len(images) * repeats / elapsed, 2) if elapsed else 0.0,
+        "wall_seconds": round(elapsed, 3),
+        "rejected": rejected,
+        "stages": recorder.summary(),
+    }
+
+
+def measure_throughput(service, images, concurrency, requests):
+    """Runs `requests` end-to-end scans from `concurrency` threads; reports images/sec and latency."""
+    latencies_ms = []
+    errors = 0
+
+    def scan(i):
+        start = time.perf_counter()
+        try:
+            service.analyze_bytes(images[i % len(images)])
+            return (time.perf_counter() - start) * 1000.0, None
+        except ValueError as e:
+            return (time.perf_counter() - start) * 1000.0, e
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, error in pool.map(scan, range(requests)):
+            latencies_ms.append(latency)
+            errors += error is not None
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies_ms)
+    result.update({
+        "concurrency": concurrency,
+        "images_per_sec": round(requests / elapsed, 2) if elapsed else 0.0,
+        "wall_seconds": round(elapsed, 3),
+        "rejected": errors,
+    })
+    return result
+
+
+def environment_info(model_path, stub):
+    """Metadata recorded with every run so results can be compared across machines and versions."""
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "model": "stub" if stub else model_path,
+        "model_version": ModelLoader.get_model_version(),
+        "backend": ModelLoader.get_backend().name,
+    }
+    try:
+        import tensorflow as tf
+        info["tensorflow"] = tf.__version__
+    except ImportError:
+        info["tensorflow"] = None
+    return info
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scan path through PredictService.")
+    model_group = parser.add_mutually_exclusive_group()
+    model_group.add_argument('--model', default=Config.MODEL_PATH, help="Model file to benchmark (default: MODEL_PATH)")
+    model_group.add_argument('--stub', action='store_true', help="Use a stub Keras model with the production signature")
+    parser.add_argument('--backend', default=Config.MODEL_BACKEND, help="Inference backend (see MODEL_BACKEND)")
+    parser.add_argument('--images', help="Directory of sample JPEGs (default: synthetic photos at several sizes)")
+    parser.add_argument('--per-size', type=int, default=4, help="Synthetic images per size")
+    parser.add_argument('--repeats', type=int, default=3, help="Passes over the images for per-stage timings")
+    parser.add_argument('--concurrency', default='1,2,4,8', help="Comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=64, help="Scans per concurrency level")
+    parser.add_argument('--batching', action='store_true', help="Enable the micro-batching scheduler")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    concurrency_levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = build_stub_model(os.path.join(tmp, 'stub_model.h5'), Config.IMAGE_SIZE, len(Config.DISEASE_CLASSES)) \
+            if args.stub else args.model
+        backend = None if args.stub else args.backend
+
+        ModelLoader.load_model(model_path, image_size=Config.IMAGE_SIZE,
+                               warmup_runs=Config.MODEL_WARMUP_RUNS, backend=backend)
+        images = load_images(args.images, tmp, args.per_size)
+        if not images:
+            print("No images to benchmark.", file=sys.stderr)
+            return 1
+
+        app = Flask(__name__)
+        app.config.from_object(BenchmarkConfig)
+        app.config['INFERENCE_BATCHING_ENABLED'] = args.batching
+        app.logger.setLevel('ERROR')  # Per-image rejection warnings would swamp the report
+        with app.app_context():
+            service = PredictService()
+
+        stages = measure_stages(service, images, args.repeats)
+        batch = measure_batch(service, images, args.repeats)
+        throughput = [measure_throughput(service, images, level, args.requests) for level in concurrency_levels]
+        results = {
+            "environment": environment_info(model_path, args.stub),
+            "settings": {
+                "image_size": list(Config.IMAGE_SIZE),
+                "images": len(images),
+                "source": args.images or "synthetic",
+                "batching": args.batching,
+                "inference_path": BenchmarkConfig.INFERENCE_PATH,
+            },
+            "stages": stages,
+            "batch": batch,
+            "throughput": throughput,
+        }
+        if service.scheduler is not None:
+            service.scheduler.shutdown()
+
+    for stage in STAGES:
+        s = stages[stage]
+        print(f"{stage:>12}: mean {s['mean_ms']:8.2f} ms  p50 {s['p50_ms']:8.2f}  p95 {s['p95_ms']:8.2f}  p99 {s['p99_ms']:8.2f}")
+    print(f"analyze_batch: {batch['images_per_sec']:8.2f} img/s  "
+          f"predict p50 {batch['stages']['predict']['p50_ms']:8.2f} ms per forward pass")
+    for t in throughput:
+        print(f"concurrency {t['concurrency']:>3}: {t['images_per_sec']:8.2f} img/s  "
+              f"p50 {t['p50_ms']:8.2f} ms  p95 {t['p95_ms']:8.2f} ms  p99 {t['p99_ms']:8.2f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
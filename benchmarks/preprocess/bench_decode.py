@@ -0,0 +1,155 @@
+"""
+Microbenchmark: per-image decode/preprocess time and peak RSS for the legacy
+full-resolution path versus the draft-mode (DCT-scaled) path used by
+PredictService._preprocess_image.
+
+Usage (from the repository root):
+    python -m benchmarks.preprocess.bench_decode                  # synthetic 12 MP JPEGs
+    python -m benchmarks.preprocess.bench_decode --images photos/ # real phone photos
+
+Each variant runs in its own subprocess so peak RSS is measured independently.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from backend.ml_model.image_decode import decode_to_model_array, normalize_batch
+
+IMAGE_SIZE = (224, 224)
+VARIANTS = ('legacy', 'draft')
+
+
+def make_synthetic_jpegs(directory, count=8, size=(4032, 3024), quality=92):
+    """Writes phone-camera-sized JPEGs with leaf-like green texture and noise."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        height, width = size[1], size[0]
+        y, x = np.mgrid[0:height, 0:width]
+        base = np.stack([
+            60 + 40 * np.sin(x / 97.0 + i),
+            140 + 60 * np.cos(y / 131.0),
+            50 + 30 * np.sin((x + y) / 211.0),
+        ], axis=-1)
+        noise = rng.normal(0, 18, size=base.shape)
+        pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"synthetic_{i}.jpg")
+        Image.fromarray(pixels).save(path, quality=quality)
+        paths.append(path)
+    return paths
+
+
+def legacy_preprocess(image_data):
+    """The original pipeline: full decode, convert, resize, separate float32 copy / 255."""
+    img = Image.open(BytesIO(image_data))
+    img_resized = img.convert('RGB').resize(IMAGE_SIZE)
+    blur_input = np.asarray(img_resized, dtype=np.uint8)
+    model_input = np.asarray(img_resized, dtype=np.float32) / 255.0
+    return blur_input, np.expand_dims(model_input, axis=0)
+
+
+def draft_preprocess(image_data):
+    """The fast pipeline: draft decode into one uint8 buffer, single-pass normalization."""
+    buffer = np.empty((1, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.uint8)
+    decode_to_model_array(image_data, IMAGE_SIZE, out=buffer[0])
+    return buffer, normalize_batch(buffer)
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process. VmHWM is preferred because, unlike
+    ru_maxrss, it is not inherited from the parent across fork/exec.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+
+
+def run_variant(variant, paths, repeats):
+    """Times one variant in the current process and reports its peak RSS."""
+    preprocess = legacy_preprocess if variant == 'legacy' else draft_preprocess
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+
+    timings_ms = []
+    for _ in range(repeats):
+        for image_data in images:
+            start = time.perf_counter()
+            preprocess(image_data)
+            timings_ms.append((time.perf_counter() - start) * 1000.0)
+
+    timings_ms.sort()
+    return {
+        "variant": variant,
+        "images": len(images),
+        "runs": len(timings_ms),
+        "mean_ms": statistics.mean(timings_ms),
+        "p50_ms": timings_ms[len(timings_ms) // 2],
+        "p95_ms": timings_ms[min(len(timings_ms) - 1, int(len(timings_ms) * 0.95))],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark JPEG decode + preprocessing.")
+    parser.add_argument('--images', help="Directory of JPEGs (default: generate synthetic 12 MP photos)")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help="Optional JSON output path")
+    parser.add_argument('--variant', choices=VARIANTS, help=argparse.SUPPRESS)  # child mode
+    parser.add_argument('--paths', nargs='*', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.paths, args.repeats)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            paths = sorted(
+                os.path.join(args.images, name) for name in os.listdir(args.images)
+                if name.lower().endswith(('.jpg', '.jpeg'))
+            )
+        else:
+            paths = make_synthetic_jpegs(tmp)
+
+        results = []
+        for variant in VARIANTS:
+            output = subprocess.check_output([
+                sys.executable, '-m', 'benchmarks.preprocess.bench_decode',
+                '--variant', variant, '--repeats', str(args.repeats), '--paths', *paths
+            ])
+            results.append(json.loads(output))
+
+    for result in results:
+        print(f"{result['variant']:>7}: mean {result['mean_ms']:7.2f} ms  p50 {result['p50_ms']:7.2f} ms  "
+              f"p95 {result['p95_ms']:7.2f} ms  peak RSS {result['peak_rss_mb']:7.1f} MB")
+    speedup = results[0]['mean_ms'] / results[1]['mean_ms'] if results[1]['mean_ms'] else float('inf')
+    print(f"speedup: {speedup:.1f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"image_size": IMAGE_SIZE, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
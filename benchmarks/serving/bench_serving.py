@@ -0,0 +1,329 @@
+"""
+Benchmark: web-worker occupancy while serving a gallery-heavy traffic mix from
+/uploads, before and after immutable caching and proxy offload.
+
+Usage (from the repository root):
+    python -m benchmarks.serving.bench_serving                      # 4 sync workers
+    python -m benchmarks.serving.bench_serving --workers 8 --visitors 80
+
+Variants (each against a fresh server):
+    before   no Cache-Control: browsers revalidate every image they see again
+    cached   Cache-Control immutable + strong ETags: repeat views never reach a worker
+    x-accel  cached + X-Accel-Redirect: workers only emit headers
+
+The server is gunicorn with sync workers (Werkzeug's forking server if gunicorn
+is not installed). Each request is timed inside the worker from the WSGI call
+until the response is closed (i.e. including the transfer), and
+
+    occupancy = sum(busy time) / (workers * wall time)
+
+There is no nginx in front during the x-accel run, so its numbers are the
+worker's share only; the bytes themselves would be sent by nginx.
+
+Traffic: each visitor opens gallery pages (24 thumbnails of 512 px, pages
+chosen with 1/(rank) popularity so the first pages repeat often), opens the
+full-size original of some of the scans it sees, and pauses --think-ms between
+pages, so the offered load is the same for every variant. Every visitor has its
+own browser cache that honours the response headers.
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+VARIANTS = ('before', 'cached', 'x-accel')
+THUMBNAIL_SIZE = 512
+PAGE_SIZE = 24
+
+
+# --- Server side (runs inside the workers) ---
+
+class BusyTimer:
+    """WSGI middleware appending each request's busy seconds to a log file."""
+
+    def __init__(self, app, log_path):
+        self.app = app
+        self.log_path = log_path
+
+    def _record(self, start):
+        line = f"{time.perf_counter() - start:.6f}\n".encode()
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        body = self.app(environ, start_response)
+        close = getattr(body, 'close', None)
+
+        def timed_close():
+            try:
+                if close:
+                    close()
+            finally:
+                self._record(start)
+
+        try:
+            # Keeps file wrappers intact, so the server can still use sendfile()
+            body.close = timed_close
+            return body
+        except AttributeError:
+            return _ClosingBody(body, timed_close)
+
+
+class _ClosingBody:
+    def __init__(self, body, close):
+        self.body = body
+        self.close = close
+
+    def __iter__(self):
+        return iter(self.body)
+
+
+def bench_app():
+    """gunicorn entry point; configured by the BENCH_* environment variables."""
+    os.environ.setdefault('APP_ROLE', 'api')
+    from app import create_app
+    from config import Config
+
+    variant = os.environ['BENCH_VARIANT']
+
+    class BenchConfig(Config):
+        APP_ROLE = 'api'
+        UPLOAD_FOLDER = os.environ['BENCH_UPLOAD_FOLDER']
+        UPLOAD_CACHE_MAX_AGE = 0 if variant == 'before' else Config.UPLOAD_CACHE_MAX_AGE
+        UPLOAD_SENDFILE_MODE = 'x-accel-redirect' if variant == 'x-accel' else 'none'
+        SCAN_ASYNC_WORKERS = 0
+
+    app = create_app(BenchConfig)
+    app.wsgi_app = BusyTimer(app.wsgi_app, os.environ['BENCH_BUSY_LOG'])
+    return app
+
+
+# --- Fixtures ---
+
+def make_store(directory, count, size=(1600, 1200), quality=90):
+    """Writes `count` content-addressed JPEGs with their derivatives; returns their keys."""
+    import numpy as np
+    from PIL import Image
+
+    from backend.services.image_store import blob_key
+    from backend.services.thumbnails import generate_derivatives
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size[1], 0:size[0]]
+    keys = []
+    for i in range(count):
+        base = np.stack([
+            60 + 40 * np.sin(x / 97.0 + i),
+            140 + 60 * np.cos(y / 131.0 + i),
+            50 + 30 * np.sin((x + y) / 211.0),
+        ], axis=-1)
+        pixels = np.clip(base + rng.normal(0, 12, size=base.shape), 0, 255).astype(np.uint8)
+        tmp_path = os.path.join(directory, f"fixture_{i}.jpg")
+        Image.fromarray(pixels).save(tmp_path, quality=quality)
+        with open(tmp_path, 'rb') as f:
+            key = blob_key(hashlib.sha256(f.read()).hexdigest(), 'jpg')
+        path = os.path.join(directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        # Pre-generated, so lazy thumbnail creation does not count as serving time
+        generate_derivatives(path, sizes=(128, THUMBNAIL_SIZE))
+        keys.append(key)
+    return keys
+
+
+def build_sessions(keys, visitors, page_views, original_rate, seed=0):
+    """Per-visitor lists of URL batches (one batch per page view)."""
+    rng = random.Random(seed)
+    pages = [keys[i:i + PAGE_SIZE] for i in range(0, len(keys), PAGE_SIZE)]
+    weights = [1.0 / (rank + 1) for rank in range(len(pages))]
+    sessions = []
+    for _ in range(visitors):
+        views = []
+        for _ in range(page_views):
+            page = rng.choices(pages, weights)[0]
+            urls = [f"/uploads/thumbs/{THUMBNAIL_SIZE}/{key}" for key in page]
+            urls += [f"/uploads/{key}" for key in page if rng.random() < original_rate / PAGE_SIZE]
+            views.append(urls)
+        sessions.append(views)
+    return sessions
+
+
+# --- Client side ---
+
+class Browser:
+    """One visitor: fetches URLs and caches responses the way their headers allow."""
+
+    def __init__(self, port):
+        self.port = port
+        self.cache = {}  # url -> (etag, fresh_until)
+
+    def get(self, url, stats):
+        etag, fresh_until = self.cache.get(url, (None, 0.0))
+        if time.monotonic() < fresh_until:
+            stats['cache_hits'] += 1
+            return
+        headers = {'If-None-Match': etag} if etag else {}
+        start = time.perf_counter()
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            connection.request('GET', url, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        finally:
+            connection.close()
+        stats['latencies_ms'].append((time.perf_counter() - start) * 1000.0)
+        stats['requests'] += 1
+        stats['bytes'] += len(body)
+        stats['status'][response.status] = stats['status'].get(response.status, 0) + 1
+
+        max_age = 0
+        for directive in (response.getheader('Cache-Control') or '').split(','):
+            name, _, value = directive.strip().partition('=')
+            if name == 'max-age' and value.isdigit():
+                max_age = int(value)
+        self.cache[url] = (response.getheader('ETag') or etag, time.monotonic() + max_age)
+
+
+def run_visitor(port, views, think_seconds, lock, totals):
+    browser = Browser(port)
+    stats = {'requests': 0, 'cache_hits': 0, 'bytes': 0, 'status': {}, 'latencies_ms': []}
+    for urls in views:
+        for url in urls:
+            browser.get(url, stats)
+        time.sleep(think_seconds)
+    with lock:
+        for name in ('requests', 'cache_hits', 'bytes'):
+            totals[name] += stats[name]
+        for status, count in stats['status'].items():
+            totals['status'][status] = totals['status'].get(status, 0) + count
+        totals['latencies_ms'].extend(stats['latencies_ms'])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers, env):
+    try:
+        import gunicorn  # noqa: F401
+        command = [
+            sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--worker-class', 'sync',
+            '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+            'benchmarks.serving.bench_serving:bench_app()',
+        ]
+        server = 'gunicorn'
+    except ImportError:
+        command = [sys.executable, '-m', 'benchmarks.serving.bench_serving', '--serve', str(port), '--workers', str(workers)]
+        server = 'werkzeug (gunicorn not installed)'
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process, server
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start within 60 seconds")
+
+
+def run_variant(variant, folder, sessions, workers, concurrency, think_seconds):
+    busy_log = os.path.join(folder, f".busy-{variant}.log")
+    port = free_port()
+    env = dict(os.environ, APP_ROLE='api', BENCH_VARIANT=variant,
+               BENCH_UPLOAD_FOLDER=folder, BENCH_BUSY_LOG=busy_log)
+    process, server = start_server(port, workers, env)
+    totals = {'requests': 0, 'cache_hits': 0, 'bytes': 0, 'status': {}, 'latencies_ms': []}
+    lock = threading.Lock()
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(run_visitor, port, views, think_seconds, lock, totals) for views in sessions]:
+                future.result()
+        wall = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    with open(busy_log) as f:
+        busy = [float(line) for line in f if line.strip()]
+    latencies = sorted(totals['latencies_ms']) or [0.0]
+    return {
+        "variant": variant,
+        "server": server,
+        "workers": workers,
+        "wall_s": wall,
+        "requests": totals['requests'],
+        "browser_cache_hits": totals['cache_hits'],
+        "status": {str(status): count for status, count in sorted(totals['status'].items())},
+        "mb_from_workers": totals['bytes'] / (1024 * 1024),
+        "worker_busy_s": sum(busy),
+        "occupancy": sum(busy) / (workers * wall) if wall else 0.0,
+        "busy_ms_per_page_view": sum(busy) * 1000.0 / sum(len(views) for views in sessions),
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark worker occupancy for image serving.")
+    parser.add_argument('--workers', type=int, default=4, help="Sync worker processes")
+    parser.add_argument('--images', type=int, default=240, help="Synthetic scans in the store")
+    parser.add_argument('--visitors', type=int, default=40)
+    parser.add_argument('--page-views', type=int, default=8, help="Gallery pages per visitor")
+    parser.add_argument('--original-rate', type=float, default=2.0, help="Originals opened per page view")
+    parser.add_argument('--concurrency', type=int, default=16, help="Visitors browsing at once")
+    parser.add_argument('--think-ms', type=float, default=1000.0, help="Pause between a visitor's page views")
+    parser.add_argument('--variants', nargs='*', choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument('--output', help="Optional JSON output path")
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)  # child mode: Werkzeug fallback
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        import logging
+        from werkzeug.serving import run_simple
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        run_simple('127.0.0.1', args.serve, bench_app(), threaded=False, processes=args.workers)
+        return 0
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"Generating {args.images} synthetic scans...")
+        keys = make_store(folder, args.images)
+        sessions = build_sessions(keys, args.visitors, args.page_views, args.original_rate)
+        results = [run_variant(variant, folder, sessions, args.workers, args.concurrency, args.think_ms / 1000.0) for variant in args.variants]
+
+    print(f"server: {results[0]['server']}, {args.workers} workers, "
+          f"{args.visitors} visitors x {args.page_views} gallery pages")
+    for result in results:
+        print(f"{result['variant']:>8}: occupancy {result['occupancy']:6.1%}  busy {result['worker_busy_s']:7.2f} s  "
+              f"({result['busy_ms_per_page_view']:6.1f} ms/page view)  requests {result['requests']:6d}  "
+              f"cache hits {result['browser_cache_hits']:6d}  {result['mb_from_workers']:8.1f} MB  "
+              f"p95 {result['p95_ms']:7.2f} ms  {result['status']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
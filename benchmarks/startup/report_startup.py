@@ -0,0 +1,138 @@
+"""
+Startup-time report: import-time breakdown, create_app() time and RSS for each
+APP_ROLE, so heavy dependencies creeping back into the API-only import path
+are caught.
+
+Usage (from the repository root):
+    python -m benchmarks.startup.report_startup                      # all roles
+    python -m benchmarks.startup.report_startup --roles api --check  # exit 1 on regression
+    python -m benchmarks.startup.report_startup --output startup.json
+
+Each role runs in a fresh interpreter with `python -X importtime`; the model is
+loaded synchronously (MODEL_LOAD_ASYNC=false) so its cost is attributed to the
+role that pays it.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROLES = ('api', 'inference', 'all')
+
+# Modules an API-only worker must never import
+API_FORBIDDEN_MODULES = ('backend.ml_model', 'cv2', 'numpy', 'tensorflow', 'keras', 'onnxruntime')
+
+# Runs inside the child interpreter; prints one JSON line on stdout
+CHILD_SCRIPT = r'''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+
+def rss_mb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+print(json.dumps({
+    "import_app_ms": (imported - start) * 1000.0,
+    "create_app_ms": (created - imported) * 1000.0,
+    "rss_mb": rss_mb('VmRSS'),
+    "peak_rss_mb": rss_mb('VmHWM'),
+    "modules": sorted(sys.modules),
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """
+    Parses `-X importtime` output into {top-level package: ms}, summing each
+    module's self time into its top-level package, so e.g. everything under
+    flask, mysql or numpy is attributed to that package.
+    """
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0.0) + int(self_us) / 1000.0
+    return totals
+
+
+def measure_role(role):
+    env = dict(os.environ, APP_ROLE=role, MODEL_LOAD_ASYNC='false')
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT],
+        env=env, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"APP_ROLE={role} failed to start:\n{process.stderr[-2000:]}")
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    modules = result.pop('modules')
+    breakdown = parse_importtime(process.stderr)
+    result.update({
+        "role": role,
+        "total_import_ms": round(sum(breakdown.values()), 1),
+        "import_breakdown_ms": dict(sorted(
+            ((package, round(ms, 1)) for package, ms in breakdown.items()), key=lambda item: -item[1]
+        )),
+        "heavy_modules_loaded": [
+            name for name in API_FORBIDDEN_MODULES
+            if any(module == name or module.startswith(name + '.') for module in modules)
+        ],
+        "module_count": len(modules),
+    })
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report import time and memory at startup for each APP_ROLE.")
+    parser.add_argument('--roles', default=','.join(ROLES), help="Comma-separated roles to measure")
+    parser.add_argument('--top', type=int, default=10, help="Packages to show in the breakdown")
+    parser.add_argument('--check', action='store_true',
+                        help="Exit 1 if the api role imports the ML stack or exceeds --max-api-import-ms")
+    parser.add_argument('--max-api-import-ms', type=float, help="Import-time budget for the api role")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = [measure_role(role.strip()) for role in args.roles.split(',') if role.strip()]
+
+    for result in results:
+        print(f"APP_ROLE={result['role']}: imports {result['total_import_ms']:.0f} ms, "
+              f"create_app {result['create_app_ms']:.0f} ms, RSS {result['rss_mb']:.0f} MB "
+              f"(peak {result['peak_rss_mb']:.0f} MB), {result['module_count']} modules")
+        for package, ms in list(result['import_breakdown_ms'].items())[:args.top]:
+            print(f"    {package:<28} {ms:8.1f} ms")
+        if result['heavy_modules_loaded']:
+            print(f"    heavy modules: {', '.join(result['heavy_modules_loaded'])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.check:
+        failures = []
+        for result in results:
+            if result['role'] != 'api':
+                continue
+            if result['heavy_modules_loaded']:
+                failures.append(f"api role imports {', '.join(result['heavy_modules_loaded'])}")
+            if args.max_api_import_ms and result['total_import_ms'] > args.max_api_import_ms:
+                failures.append(f"api role import time {result['total_import_ms']:.0f} ms > {args.max_api_import_ms:.0f} ms")
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
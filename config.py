@@ -12,10 +12,26 @@ class Config:
     MYSQL_USER = os.environ.get('MYSQL_USER') or 'root'
     MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD') or 'adarsh'
     MYSQL_DB = os.environ.get('MYSQL_DB') or 'leafguard_db'
+    # Connection pool, per worker process (see backend/services/db_pool.py).
+    # MySQL sees up to workers x (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW) connections.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW') or 5)
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT') or 10)  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)  # reconnect after this many seconds (< wait_timeout)
+    DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', 'true').lower() == 'true'
+    DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE') or 64)  # prepared statements per connection
+    # Rows read per round trip by DatabaseService.iter_query (streamed admin listings)
+    DB_STREAM_CHUNK_SIZE = int(os.environ.get('DB_STREAM_CHUNK_SIZE') or 500)
+    # Versioned schema changes applied on top of database.sql (see backend/services/migrations.py)
+    MIGRATIONS_FOLDER = os.environ.get('MIGRATIONS_FOLDER') or 'migrations'
     
     # --- Machine Learning Configuration ---
     # Path to the model file
-    MODEL_PATH = 'ml_model_files/mango_leaf_classifier_final.h5'
+    MODEL_PATH = os.environ.get('MODEL_PATH') or 'ml_model_files/mango_leaf_classifier_final.h5'
+    # Inference backend: 'keras', 'tflite-fp16', 'tflite-int8' or 'onnx'.
+    # When unset it is inferred from the MODEL_PATH extension. Converted
+    # artifacts are produced by `python -m backend.ml_model.convert_model`.
+    MODEL_BACKEND = os.environ.get('MODEL_BACKEND')
     
     # IMPORTANT: The classes MUST be in the exact order the model was trained on
     # Total classes: 8
@@ -33,10 +49,124 @@ class Config:
     # Model input parameters (adjust based on your model's requirement)
     IMAGE_SIZE = (224, 224)
     COLOR_MODE = 'rgb' # or 'grayscale'
+
+    # Inference mode: 'local' loads the model in every web worker; 'remote'
+    # sends preprocessed tensors to one shared model server process
+    # (`python -m backend.ml_model.model_server`) over a Unix socket.
+    INFERENCE_MODE = os.environ.get('INFERENCE_MODE') or 'local'
+    MODEL_SERVER_SOCKET = os.environ.get('MODEL_SERVER_SOCKET') or '/tmp/leafguard-model.sock'
+    MODEL_SERVER_TIMEOUT = float(os.environ.get('MODEL_SERVER_TIMEOUT') or 30)
+    # Most images the model server accepts in one request (larger requests are refused)
+    MODEL_SERVER_MAX_IMAGES = int(os.environ.get('MODEL_SERVER_MAX_IMAGES') or 64)
+
+    # Inference path: 'fast' calls the traced graph directly, 'legacy' uses model.predict()
+    INFERENCE_PATH = os.environ.get('INFERENCE_PATH') or 'fast'
+    # Two-stage cascade (see backend/ml_model/cascade.py): when a first-stage model is set,
+    # every scan runs through it and only scans whose top-1 confidence is below the
+    # threshold are re-run through the full MODEL_PATH model. Local, INFERENCE_PATH=fast only.
+    CASCADE_STAGE1_MODEL_PATH = os.environ.get('CASCADE_STAGE1_MODEL_PATH')
+    CASCADE_STAGE1_BACKEND = os.environ.get('CASCADE_STAGE1_BACKEND')
+    CASCADE_CONFIDENCE_THRESHOLD = float(os.environ.get('CASCADE_CONFIDENCE_THRESHOLD') or 0.90)
+    # Dummy forward passes run at startup so the first scan skips graph building
+    MODEL_WARMUP_RUNS = int(os.environ.get('MODEL_WARMUP_RUNS') or 3)
+    # Process role: 'all' (default), 'api' (no ML stack loaded, scans answer 503) or
+    # 'inference' (scan API only). Lets lightweight API workers run apart from inference workers.
+    APP_ROLE = os.environ.get('APP_ROLE') or 'all'
+
+    # --- CPU Thread Topology (see backend/ml_model/cpu_tuning.py) ---
+    # Web worker processes sharing this node's CPUs (gunicorn reads the same variable)
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY') or 1)
+    # Explicit per-worker pool sizes; unset = autotuned profile, else CPUs // workers
+    TF_INTRA_OP_THREADS = int(os.environ.get('TF_INTRA_OP_THREADS') or 0) or None
+    TF_INTER_OP_THREADS = int(os.environ.get('TF_INTER_OP_THREADS') or 0) or None
+    CPU_TUNING_PROFILE = os.environ.get('CPU_TUNING_PROFILE') or 'ml_model_files/cpu_profile.json'
+    CPU_TUNING_P95_BUDGET_MS = float(os.environ.get('CPU_TUNING_P95_BUDGET_MS') or 250.0)
+    # Load the model on a background thread so non-scan routes serve immediately (see /readyz)
+    MODEL_LOAD_ASYNC = (os.environ.get('MODEL_LOAD_ASYNC') or 'true').lower() in ('1', 'true', 'yes')
+
+    # --- Prediction Cache Configuration ---
+    # Duplicate uploads (same bytes, same model version) skip inference.
+    PREDICTION_CACHE_ENABLED = os.environ.get('PREDICTION_CACHE_ENABLED', 'true').lower() == 'true'
+    PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE') or 1024)
+    # Also persist entries in the 'prediction_cache' table (shared across workers)
+    PREDICTION_CACHE_PERSISTENT = os.environ.get('PREDICTION_CACHE_PERSISTENT', 'true').lower() == 'true'
+
+    # --- Image Quality Gate ---
+    # Checked on the decoded model-size thumbnail before an upload is saved
+    QUALITY_BLUR_THRESHOLD = float(os.environ.get('QUALITY_BLUR_THRESHOLD') or 100.0) # Laplacian variance
+    QUALITY_MIN_BRIGHTNESS = float(os.environ.get('QUALITY_MIN_BRIGHTNESS') or 40.0) # Mean gray level (0-255)
+    QUALITY_MAX_BRIGHTNESS = float(os.environ.get('QUALITY_MAX_BRIGHTNESS') or 225.0)
+    # Share of green-dominant pixels; 0 = off, as diseased leaves can be mostly brown or black
+    QUALITY_MIN_GREEN_RATIO = float(os.environ.get('QUALITY_MIN_GREEN_RATIO') or 0.0)
+
+    # --- Grad-CAM Heatmaps (rendered on demand, cached next to the upload) ---
+    HEATMAP_ENABLED = (os.environ.get('HEATMAP_ENABLED') or 'true').lower() in ('1', 'true', 'yes')
+    HEATMAP_LAYER = os.environ.get('HEATMAP_LAYER') # None = last convolutional layer
+    HEATMAP_MAX_BATCH_SIZE = int(os.environ.get('HEATMAP_MAX_BATCH_SIZE') or 8)
+    HEATMAP_MAX_WAIT_MS = float(os.environ.get('HEATMAP_MAX_WAIT_MS') or 50)
+    HEATMAP_MAX_SIZE = int(os.environ.get('HEATMAP_MAX_SIZE') or 512) # Longest side of the rendered PNG
+    HEATMAP_ALPHA = float(os.environ.get('HEATMAP_ALPHA') or 0.4)
+
+    # --- Similar Scans (leaf embeddings + nearest-neighbour index) ---
+    # Save the penultimate-layer embedding of every scan (Keras backend, 'fast' path)
+    EMBEDDINGS_ENABLED = (os.environ.get('EMBEDDINGS_ENABLED') or 'true').lower() in ('1', 'true', 'yes')
+    SIMILARITY_INDEX_MODE = os.environ.get('SIMILARITY_INDEX_MODE') or 'flat' # 'flat' (exact) or 'ivfpq'
+    SIMILARITY_IVF_LISTS = int(os.environ.get('SIMILARITY_IVF_LISTS') or 256)
+    SIMILARITY_IVF_PROBES = int(os.environ.get('SIMILARITY_IVF_PROBES') or 16)
+    SIMILARITY_PQ_SUBVECTORS = int(os.environ.get('SIMILARITY_PQ_SUBVECTORS') or 16) # Bytes per scan in ivfpq mode
+    SIMILARITY_TRAIN_SIZE = int(os.environ.get('SIMILARITY_TRAIN_SIZE') or 20000) # Rows before ivfpq training
+    SIMILARITY_REFRESH_SECONDS = float(os.environ.get('SIMILARITY_REFRESH_SECONDS') or 2.0)
+    SIMILARITY_REBUILD_SECONDS = float(os.environ.get('SIMILARITY_REBUILD_SECONDS') or 3600) # Full reload: drops archived, updates reclassified scans
+    SIMILARITY_MAX_K = 50
+
+    # --- Inference Batching Configuration ---
+    # Concurrent scans are grouped into one forward pass of up to
+    # INFERENCE_MAX_BATCH_SIZE images, waiting at most INFERENCE_MAX_WAIT_MS
+    # for the batch to fill. Requests beyond INFERENCE_QUEUE_DEPTH get a 503.
+    INFERENCE_BATCHING_ENABLED = os.environ.get('INFERENCE_BATCHING_ENABLED', 'true').lower() == 'true'
+    INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE') or 16)
+    INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS') or 10)
+    INFERENCE_QUEUE_DEPTH = int(os.environ.get('INFERENCE_QUEUE_DEPTH') or 256)
+    # Threads used to decode the images of a bulk scan in parallel
+    PREPROCESS_WORKERS = int(os.environ.get('PREPROCESS_WORKERS') or 4)
     
     # --- File Upload Configuration ---
     UPLOAD_FOLDER = 'backend/uploads/images'
+    # Uploads stream straight into UPLOAD_FOLDER (see backend/services/upload_ingest.py).
+    # Images over MAX_UPLOAD_BYTES are rejected with 413 while streaming; MAX_CONTENT_LENGTH
+    # caps a whole request (e.g. a batch scan) before its body is read. Uploads are spooled
+    # to disk, not RAM, but the request still has to fit in UPLOAD_FOLDER's temp files.
+    MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES') or 16 * 1024 * 1024)
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 128 * 1024 * 1024)
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+    # Gallery derivatives (see backend/services/thumbnails.py): longest side in px, 'webp' or 'jpeg'
+    THUMBNAIL_SIZES = (128, 512)
+    THUMBNAIL_FORMAT = os.environ.get('THUMBNAIL_FORMAT') or 'webp'
+    THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY') or 80)
+    # Most images one batch archive/restore request (/api/trash/archive, /api/trash/restore) may change
+    TRASH_MAX_BATCH_SIZE = int(os.environ.get('TRASH_MAX_BATCH_SIZE') or 500)
+    # Keyset-paged listings (?limit=&cursor=, next page in X-Next-Cursor): default and largest page
+    PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT') or 50)
+    PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX') or 200)
+    # Serving of /uploads (see backend/services/file_serving.py). Stored names never change
+    # content, so browsers may cache them for UPLOAD_CACHE_MAX_AGE seconds without revalidating.
+    UPLOAD_CACHE_MAX_AGE = int(os.environ.get('UPLOAD_CACHE_MAX_AGE') or 365 * 24 * 3600)
+    # 'none' (Flask streams the file), 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd)
+    UPLOAD_SENDFILE_MODE = os.environ.get('UPLOAD_SENDFILE_MODE') or 'none'
+    # nginx `internal` location that aliases UPLOAD_FOLDER (x-accel-redirect mode)
+    UPLOAD_ACCEL_PREFIX = os.environ.get('UPLOAD_ACCEL_PREFIX') or '/protected-uploads/'
+    # --- Asynchronous Scan Configuration ---
+    # Background threads per web process draining 'pending' scans (0 = only
+    # a standalone `python -m backend.ml_model.scan_worker` process drains them)
+    SCAN_ASYNC_WORKERS = int(os.environ.get('SCAN_ASYNC_WORKERS') or 2)
+    SCAN_ASYNC_BATCH_SIZE = int(os.environ.get('SCAN_ASYNC_BATCH_SIZE') or 8)
+    SCAN_ASYNC_POLL_INTERVAL = float(os.environ.get('SCAN_ASYNC_POLL_INTERVAL') or 1.0)
+    # Claims older than this (seconds) are considered abandoned and retried
+    SCAN_ASYNC_CLAIM_TIMEOUT = int(os.environ.get('SCAN_ASYNC_CLAIM_TIMEOUT') or 300)
+    SCAN_ASYNC_MAX_ATTEMPTS = int(os.environ.get('SCAN_ASYNC_MAX_ATTEMPTS') or 3)
+
+    # Maximum number of photos accepted by /api/scan/batch-analyze
+    BATCH_SCAN_MAX_FILES = int(os.environ.get('BATCH_SCAN_MAX_FILES') or 200)
 
 # Subclass for environment-specific settings (optional)
 class DevelopmentConfig(Config):
@@ -155,4 +155,46 @@ ALTER TABLE images
 ADD COLUMN scan_latitude DECIMAL(10, 8),
 ADD COLUMN scan_longitude DECIMAL(11, 8);
 
---
\ No newline at end of file
+--
+-- Prediction cache (content-hash keyed, invalidated by model_version)
+CREATE TABLE prediction_cache (
+    content_hash CHAR(64) NOT NULL, -- SHA-256 of the uploaded image bytes
+    model_version VARCHAR(64) NOT NULL,
+    predicted_class VARCHAR(50) NOT NULL,
+    confidence_score DOUBLE NOT NULL,
+    raw_output TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_hash, model_version)
+);
+
+-- Asynchronous scan jobs: 'pending' images are claimed and analyzed by background workers.
+-- The images table itself is the durable queue, so pending jobs survive restarts.
+ALTER TABLE images
+MODIFY COLUMN status ENUM('pending', 'analyzed', 'archived', 'failed') DEFAULT 'analyzed',
+ADD COLUMN job_token VARCHAR(36) NULL, -- Worker claim token
+ADD COLUMN job_claimed_at TIMESTAMP NULL,
+ADD COLUMN job_attempts INT NOT NULL DEFAULT 0,
+ADD COLUMN job_error VARCHAR(255) NULL;
+
+-- Leaf embeddings (penultimate-layer features) for the "similar scans" index.
+-- Stored as little-endian float16 bytes; only rows matching the serving model_version are indexed.
+CREATE TABLE image_embeddings (
+    image_id INT PRIMARY KEY,
+    model_version VARCHAR(64) NOT NULL,
+    dim SMALLINT UNSIGNED NOT NULL,
+    vector BLOB NOT NULL, -- dim * 2 bytes
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_embeddings_version_image (model_version, image_id),
+    FOREIGN KEY (image_id) REFERENCES images(image_id) ON DELETE CASCADE
+);
+
+-- Content-addressed upload storage: files live at uploads/ab/cd/<sha256>.<ext> and identical
+-- uploads share one file. content_hash counts references (NULL = legacy flat upload, see
+-- `python -m backend.services.image_store migrate`).
+ALTER TABLE images
+ADD COLUMN content_hash CHAR(64) NULL AFTER file_path,
+ADD INDEX idx_images_content_hash (content_hash),
+ADD INDEX idx_images_file_path (file_path);
+
+-- Further schema changes are versioned migrations in migrations/ (applied on top of this file):
+--   python -m backend.services.migrations up
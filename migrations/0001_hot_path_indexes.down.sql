@@ -0,0 +1,15 @@
+-- Reverts 0001_hot_path_indexes. The composite indexes also serve the foreign
+-- keys on their first column, so each drop adds a plain index for that key
+-- first, in the same statement.
+
+ALTER TABLE archived_images ADD INDEX idx_archived_user (user_id), DROP INDEX idx_archived_user_date;
+
+ALTER TABLE farms ADD INDEX idx_farms_user (user_id), DROP INDEX idx_farms_user_name;
+
+ALTER TABLE predictions DROP INDEX idx_predictions_class;
+
+ALTER TABLE predictions ADD INDEX idx_predictions_image (image_id), DROP INDEX uq_predictions_image;
+
+ALTER TABLE images ADD INDEX idx_images_tree (tree_id), DROP INDEX idx_images_tree_date;
+
+ALTER TABLE images ADD INDEX idx_images_user (user_id), DROP INDEX idx_images_user_status_date;
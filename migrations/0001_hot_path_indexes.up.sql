@@ -0,0 +1,29 @@
+-- Secondary indexes for the columns the gallery, tree history, trash and
+-- statistics queries filter and sort on. One index per statement, so a run
+-- that stops half way can simply be repeated.
+--
+-- InnoDB appends the primary key to every secondary index, so the
+-- (..., upload_date) and (..., archived_at) indexes also give the
+-- (timestamp, id) keyset order of the paged listings.
+
+-- Gallery pages and per-user statistics: WHERE user_id = ? AND status = 'analyzed' ORDER BY upload_date DESC
+ALTER TABLE images ADD INDEX idx_images_user_status_date (user_id, status, upload_date);
+
+-- Tree scan history and health-score time series: WHERE tree_id = ? ORDER BY upload_date
+ALTER TABLE images ADD INDEX idx_images_tree_date (tree_id, upload_date);
+
+-- One prediction per image. Keep the newest prediction of any image that has
+-- several (removed rows are not restored by the down migration).
+DELETE older FROM predictions older
+JOIN predictions newer ON newer.image_id = older.image_id AND newer.prediction_id > older.prediction_id;
+
+ALTER TABLE predictions ADD UNIQUE INDEX uq_predictions_image (image_id);
+
+-- Disease distribution and regional reports group/filter by class
+ALTER TABLE predictions ADD INDEX idx_predictions_class (predicted_class);
+
+-- A user's farms, listed by name
+ALTER TABLE farms ADD INDEX idx_farms_user_name (user_id, farm_name);
+
+-- Trash pages: WHERE user_id = ? ORDER BY archived_at DESC, archive_id DESC
+ALTER TABLE archived_images ADD INDEX idx_archived_user_date (user_id, archived_at);
@@ -0,0 +1,9 @@
+-- Reverts 0002_listing_and_queue_indexes.
+
+ALTER TABLE feedbacks DROP INDEX idx_feedbacks_submitted;
+
+ALTER TABLE users DROP INDEX idx_users_created;
+
+ALTER TABLE images DROP INDEX idx_images_status;
+
+ALTER TABLE images DROP INDEX idx_images_upload_date;
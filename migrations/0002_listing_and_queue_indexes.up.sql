@@ -0,0 +1,15 @@
+-- Indexes for the listings that are not scoped to one user or tree, and for
+-- the scan job queue.
+
+-- Admin scan list pages (ORDER BY upload_date DESC, image_id DESC) and the
+-- outbreak check's recent-scan window (WHERE upload_date >= ?)
+ALTER TABLE images ADD INDEX idx_images_upload_date (upload_date);
+
+-- Scan workers claiming 'pending' images in image_id order
+ALTER TABLE images ADD INDEX idx_images_status (status);
+
+-- Admin user list pages: ORDER BY created_at DESC, user_id DESC
+ALTER TABLE users ADD INDEX idx_users_created (created_at);
+
+-- Admin feedback list pages: ORDER BY submitted_at DESC, feedback_id DESC
+ALTER TABLE feedbacks ADD INDEX idx_feedbacks_submitted (submitted_at);
@@ -0,0 +1,5 @@
+-- Reverts 0003_embedding_write_order.
+
+ALTER TABLE image_embeddings DROP INDEX idx_embeddings_version_updated;
+
+ALTER TABLE image_embeddings DROP COLUMN updated_at;
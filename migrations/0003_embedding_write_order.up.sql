@@ -0,0 +1,9 @@
+-- Write-order watermark for the "similar scans" index. Workers refresh their
+-- in-memory index from the rows written since the last refresh, ordered by
+-- (updated_at, image_id). image_id alone misses embeddings that arrive out of
+-- id order (async jobs, the backfill CLI) and re-saved vectors.
+
+ALTER TABLE image_embeddings ADD COLUMN updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+
+-- Incremental refresh: WHERE model_version = ? AND (updated_at, image_id) > (?, ?) ORDER BY updated_at, image_id
+ALTER TABLE image_embeddings ADD INDEX idx_embeddings_version_updated (model_version, updated_at, image_id);
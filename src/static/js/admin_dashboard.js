@@ -196,11 +196,11 @@ async function loadAdminUsers() {
     usersList.innerHTML = '<li>Loading users...</li>';
     
     try {
-        // GET /api/admin/users
-        const users = await adminApiCall('/api/admin/users', 'GET');
+        // GET /api/admin/users?limit=8 (newest first)
+        const { items: users, nextCursor } = await apiGetPage('/api/admin/users', null, 8);
         
         usersList.innerHTML = '';
-        users.slice(0, 8).forEach(user => { // Show top 8 recent users
+        users.forEach(user => { // Show top 8 recent users
             const listItem = document.createElement('li');
             listItem.style.padding = '8px 0';
             listItem.style.borderBottom = '1px dashed #eee';
@@ -211,8 +211,8 @@ async function loadAdminUsers() {
             usersList.appendChild(listItem);
         });
 
-        if (users.length > 8) {
-             usersList.innerHTML += `<li style="padding: 8px 0;"><a href="/admin/users">View All Users (${users.length})</a></li>`;
+        if (nextCursor) {
+             usersList.innerHTML += `<li style="padding: 8px 0;"><a href="/admin/users">View All Users</a></li>`;
         }
 
     } catch (error) {
@@ -19,26 +19,29 @@ const tableMessage = document.getElementById('tableMessage');
 
 // Helper function to make an admin-required API call (must be defined in api.js)
 const adminApiCall = (endpoint, method = 'GET', body = null) => apiCall(endpoint, method, body, true);
+let feedbackPager = null; // Loads the feedback table page by page (see createPager in api.js)
 
 
 /**
- * Fetches and renders all feedback data.
+ * Fetches and renders the newest feedback; older pages load on scroll / "Load more".
  */
 async function loadFeedbacks() {
     feedbackTableBody.innerHTML = '<tr><td colspan="7">Fetching data...</td></tr>';
     tableMessage.textContent = '';
     
-    try {
-        // GET /api/admin/feedbacks
-        const feedbacks = await adminApiCall('/api/admin/feedbacks', 'GET');
-        
-        if (feedbacks.length === 0) {
-            feedbackTableBody.innerHTML = '<tr><td colspan="7">No feedback submissions found.</td></tr>';
-            return;
-        }
-
-        renderFeedbacks(feedbacks);
+    if (!feedbackPager) {
+        // GET /api/admin/feedbacks?cursor=...
+        feedbackPager = createPager('/api/admin/feedbacks', feedbackTableBody, (feedbacks, isFirstPage) => {
+            if (isFirstPage && feedbacks.length === 0) {
+                feedbackTableBody.innerHTML = '<tr><td colspan="7">No feedback submissions found.</td></tr>';
+                return;
+            }
+            renderFeedbacks(feedbacks, isFirstPage);
+        });
+    }
 
+    try {
+        await feedbackPager.reset();
     } catch (error) {
         console.error("Error loading feedbacks:", error);
         feedbackTableBody.innerHTML = `<tr><td colspan="7" style="color:red;">Failed to load feedback: ${error.message}</td></tr>`;
@@ -46,11 +49,14 @@ async function loadFeedbacks() {
 }
 
 /**
- * Renders the fetched feedback data into the table.
+ * Renders one page of feedback data into the table.
  * @param {Array<Object>} feedbacks - List of feedback objects.
+ * @param {boolean} isFirstPage - Whether to replace the table rows instead of appending.
  */
-function renderFeedbacks(feedbacks) {
-    feedbackTableBody.innerHTML = ''; // Clear loading message
+function renderFeedbacks(feedbacks, isFirstPage = true) {
+    if (isFirstPage) {
+        feedbackTableBody.innerHTML = ''; // Clear loading message
+    }
 
     feedbacks.forEach(feedback => {
         const row = document.createElement('tr');
@@ -75,13 +81,10 @@ function renderFeedbacks(feedbacks) {
                 </select>
             </td>
         `;
+        // Add event listener for status change
+        row.querySelector('.action-select').addEventListener('change', handleStatusUpdate);
         feedbackTableBody.appendChild(row);
     });
-    
-    // Add event listener for status change
-    document.querySelectorAll('.action-select').forEach(select => {
-        select.addEventListener('change', handleStatusUpdate);
-    });
 }
 
 /**
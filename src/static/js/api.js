@@ -21,16 +21,16 @@ window.removeAuthToken = () => {
 };
 
 /**
- * Generic API call function.
+ * Generic API request function.
  * Handles fetching data from the backend, including authorization headers.
  * @param {string} endpoint - The API path (e.g., '/api/user/farm').
  * @param {string} method - HTTP method (GET, POST, PUT, DELETE).
  * @param {object | FormData | null} body - Data to send (JSON object or FormData).
  * @param {boolean} requiresAuth - Whether to include the Authorization header.
- * @returns {Promise<object>} The JSON response data.
+ * @returns {Promise<{data: object, response: Response}>} The JSON response data and the raw response (for headers).
  * @throws {Error} If the API call fails or returns an error.
  */
-async function apiCall(endpoint, method = 'GET', body = null, requiresAuth = true) {
+async function apiRequest(endpoint, method = 'GET', body = null, requiresAuth = true) {
     const url = `${API_BASE_URL}${endpoint}`;
     const headers = {};
     let fetchBody = body;
@@ -73,7 +73,7 @@ async function apiCall(endpoint, method = 'GET', body = null, requiresAuth = tru
         
         // Handle 204 No Content for successful operations with no response body
         if (response.status === 204) {
-            return { message: "Operation successful" };
+            return { data: { message: "Operation successful" }, response };
         }
         
         // Attempt to parse JSON response for other status codes
@@ -89,7 +89,7 @@ async function apiCall(endpoint, method = 'GET', body = null, requiresAuth = tru
                  throw new Error(`API Error: ${response.status} ${response.statusText}. Response body: ${text.substring(0, 100)}`);
              }
              // If OK but no JSON (e.g., 200 with empty body), return default
-             return { message: "Operation successful", raw_response: text };
+             return { data: { message: "Operation successful", raw_response: text }, response };
         }
 
 
@@ -98,7 +98,7 @@ async function apiCall(endpoint, method = 'GET', body = null, requiresAuth = tru
             throw new Error(data.message || `API Error: ${response.status} ${response.statusText}`);
         }
 
-        return data; // Return the parsed JSON data
+        return { data, response }; // Return the parsed JSON data
 
     } catch (error) {
         console.error('API Call Error:', error);
@@ -106,6 +106,100 @@ async function apiCall(endpoint, method = 'GET', body = null, requiresAuth = tru
     }
 }
 
+/**
+ * Generic API call function: like apiRequest, but resolves to the JSON response data only.
+ * @returns {Promise<object>} The JSON response data.
+ */
+async function apiCall(endpoint, method = 'GET', body = null, requiresAuth = true) {
+    const { data } = await apiRequest(endpoint, method, body, requiresAuth);
+    return data;
+}
+
+/**
+ * Fetches one page of a keyset-paged listing (gallery, tree history, trash, admin lists).
+ * @param {string} endpoint - The listing path (may already contain a query string).
+ * @param {string | null} cursor - The cursor of the page to load (null for the first page).
+ * @param {number | null} limit - Page size (server default when null).
+ * @returns {Promise<{items: Array, nextCursor: string | null}>} The page and the cursor of the next one (null on the last page).
+ */
+async function apiGetPage(endpoint, cursor = null, limit = null) {
+    const params = new URLSearchParams();
+    if (limit) params.append('limit', limit);
+    if (cursor) params.append('cursor', cursor);
+    const query = params.toString();
+    const url = query ? `${endpoint}${endpoint.includes('?') ? '&' : '?'}${query}` : endpoint;
+
+    const { data, response } = await apiRequest(url, 'GET');
+    return {
+        items: Array.isArray(data) ? data : [],
+        nextCursor: response.headers.get('X-Next-Cursor')
+    };
+}
+
+/**
+ * Incrementally loads a paged listing: each call of `loadMore()` fetches the next page
+ * and hands it to `onPage(items, isFirstPage)`. A "Load more" button is placed after
+ * `container` (after its table for a table body) while more pages exist, and the next page also loads automatically when
+ * the button scrolls into view.
+ * @param {string} endpoint - The listing path.
+ * @param {HTMLElement} container - The element the pages are rendered into.
+ * @param {function(Array, boolean): void} onPage - Renders one page of items.
+ * @param {number | null} limit - Page size (server default when null).
+ * @returns {{loadMore: function(): Promise<void>, reset: function(): Promise<void>, hasMore: function(): boolean}}
+ */
+function createPager(endpoint, container, onPage, limit = null) {
+    let nextCursor = null;
+    let loading = false;
+    let started = false;
+
+    const button = document.createElement('button');
+    button.type = 'button';
+    button.className = 'btn secondary load-more-btn';
+    button.textContent = 'Load more';
+    button.style.display = 'none';
+    button.style.margin = '15px auto';
+    (container.closest('table') || container).insertAdjacentElement('afterend', button);
+
+    const observer = 'IntersectionObserver' in window
+        ? new IntersectionObserver((entries) => {
+            if (entries.some(entry => entry.isIntersecting)) loadMore();
+        }, { rootMargin: '200px' })
+        : null;
+
+    async function loadMore() {
+        if (loading || (started && !nextCursor)) return;
+        loading = true;
+        button.disabled = true;
+        try {
+            const page = await apiGetPage(endpoint, nextCursor, limit);
+            const isFirstPage = !started;
+            started = true;
+            nextCursor = page.nextCursor;
+            onPage(page.items, isFirstPage);
+        } finally {
+            loading = false;
+            button.disabled = false;
+            button.style.display = nextCursor ? 'block' : 'none';
+            if (observer) {
+                observer.unobserve(button);
+                if (nextCursor) observer.observe(button);
+            }
+        }
+    }
+
+    button.addEventListener('click', loadMore);
+
+    return {
+        loadMore,
+        reset: () => {
+            nextCursor = null;
+            started = false;
+            return loadMore();
+        },
+        hasMore: () => Boolean(nextCursor)
+    };
+}
+
 // --- Specific API Functions ---
 
 // 1. Auth Functions (Public - generally do not require an Authorization header)
@@ -142,7 +236,8 @@ const AuthAPI = {
 // 2. User Data Functions (Requires Auth - these endpoints need an Authorization header)
 const UserAPI = {
     getFarms: () => apiCall('/api/user/farm', 'GET'),
-    getGallery: () => apiCall('/api/scan/gallery', 'GET'), 
+    // Newest scans first; `limit` caps the page (e.g. the dashboard's recent scans)
+    getGallery: (limit = null) => apiGetPage('/api/scan/gallery', null, limit).then(page => page.items), 
     
     // FIX: Updated createFarm signature to include Lat/Lng
     createFarm: (farm_name, location_details, latitude, longitude) => 
@@ -163,7 +258,7 @@ const UserAPI = {
 
     // FIX: Added Geo-Fencing and Statistics APIs
     getTreeDetails: (tree_id) => apiCall(`/api/user/tree/${tree_id}`, 'GET'),
-    getTreeImages: (tree_id) => apiCall(`/api/user/tree/${tree_id}/images`, 'GET'),
+    getTreeImages: (tree_id, cursor = null) => apiGetPage(`/api/user/tree/${tree_id}/images`, cursor),
     getStatistics: (startDate, endDate) => {
         let endpoint = '/api/user/statistics';
         const params = new URLSearchParams();
@@ -185,4 +280,17 @@ const ScanAPI = {
      * @param {FormData} formData - FormData object containing the image file and optional coordinates.
      */
     uploadAndAnalyze: (formData) => apiCall('/api/scan/upload-and-analyze', 'POST', formData, true),
+
+    /**
+     * Uploads many images in one request (field 'images', optional aligned 'tree_ids').
+     * Returns per-file results; blurry or invalid files are reported individually.
+     * @param {FormData} formData - FormData object containing the image files.
+     */
+    batchAnalyze: (formData) => apiCall('/api/scan/batch-analyze', 'POST', formData, true),
+
+    /**
+     * Retrieves the state of an asynchronous scan (queued, processing, failed, analyzed).
+     * @param {number} jobId - The job ID returned by an async upload.
+     */
+    getScanJob: (jobId) => apiCall(`/api/scan/jobs/${jobId}`, 'GET'),
 };
\ No newline at end of file
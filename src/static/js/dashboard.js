@@ -257,7 +257,7 @@ async function loadDashboardData() {
         renderFarms(farms);
 
         // 3. Fetch Recent Scans (Gallery is used as source)
-        const recentScans = await UserAPI.getGallery();
+        const recentScans = await UserAPI.getGallery(5);
         renderRecentScans(recentScans);
 
     } catch (error) {
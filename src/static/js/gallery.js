@@ -6,6 +6,9 @@ const galleryGrid = document.getElementById('galleryGrid');
 const detailModal = document.getElementById('imageDetailModal');
 const closeBtn = document.querySelector('.close-btn');
 const archiveButton = document.getElementById('archiveButton');
+const heatmapButton = document.getElementById('heatmapButton');
+let heatmapObjectUrl = null; // Blob URL of the heatmap currently shown (revoked on close)
+let galleryPager = null; // Loads the gallery page by page (see createPager in api.js)
 
 // Define Trash API Call (using apiCall helper)
 const TrashAPI = {
@@ -30,25 +33,31 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 /**
- * Loads all analyzed images from the API and renders them.
+ * Loads the first page of analyzed images from the API and renders it; later
+ * pages are appended as the user scrolls or clicks "Load more".
  */
 async function loadGalleryImages() {
+    if (!galleryPager) {
+        galleryPager = createPager('/api/gallery/', galleryGrid, renderGallery);
+    }
     try {
-        const images = await apiCall('/api/gallery/', 'GET');
-        renderGallery(images);
+        await galleryPager.reset();
     } catch (error) {
         galleryGrid.innerHTML = `<p style="grid-column: 1 / -1; color:red;">Failed to load gallery data: ${error.message}</p>`;
     }
 }
 
 /**
- * Renders the image array into the gallery grid.
+ * Renders one page of images into the gallery grid.
  * @param {Array<Object>} images - List of image objects with prediction data.
+ * @param {boolean} isFirstPage - Whether to replace the grid content instead of appending.
  */
-function renderGallery(images) {
-    galleryGrid.innerHTML = ''; // Clear loading message
+function renderGallery(images, isFirstPage = true) {
+    if (isFirstPage) {
+        galleryGrid.innerHTML = ''; // Clear loading message
+    }
 
-    if (images.length === 0) {
+    if (isFirstPage && images.length === 0) {
         galleryGrid.innerHTML = '<p style="grid-column: 1 / -1;">No scans found in your gallery.</p>';
         return;
     }
@@ -121,7 +130,9 @@ async function openImageDetail(imageId) {
         
         const rawData = detail.raw_output && typeof detail.raw_output === 'object' ? detail.raw_output : {};
 
+        // Non-numeric entries are metadata (e.g. cascade_stage), not class probabilities
         const sortedRaw = Object.entries(rawData)
+            .filter(([, probability]) => typeof probability === 'number')
             .sort(([, a], [, b]) => b - a);
 
         sortedRaw.forEach(([disease, probability]) => {
@@ -131,6 +142,10 @@ async function openImageDetail(imageId) {
             rawOutputList.appendChild(item);
         });
         
+        // Set up heatmap toggle (rendered on first request, then cached by the server)
+        resetHeatmap();
+        heatmapButton.onclick = () => toggleHeatmap(detail.image_id, detail.file_path);
+
         // Set up archive button event handler
         archiveButton.onclick = null; 
         archiveButton.textContent = 'Move to Trash Bin';
@@ -146,6 +161,72 @@ async function openImageDetail(imageId) {
     }
 }
 
+/**
+ * Fetches the Grad-CAM heatmap PNG for an image. The endpoint needs the
+ * Authorization header, so it is loaded as a blob instead of a plain <img> URL.
+ * Uncached heatmaps are redirected to the scan API, which renders them.
+ * @param {number} imageId - The image to explain.
+ * @returns {Promise<string>} An object URL for the PNG.
+ */
+async function fetchHeatmapUrl(imageId) {
+    const response = await fetch(`${window.location.origin}/api/gallery/${imageId}/heatmap`, {
+        headers: { 'Authorization': `Bearer ${window.getAuthToken()}` }
+    });
+    if (!response.ok) {
+        let message = `Heatmap unavailable (${response.status}).`;
+        try {
+            message = (await response.json()).message || message;
+        } catch (e) { /* non-JSON error body */ }
+        throw new Error(message);
+    }
+    return URL.createObjectURL(await response.blob());
+}
+
+/**
+ * Switches the modal image between the original upload and its disease heatmap.
+ */
+async function toggleHeatmap(imageId, originalUrl) {
+    const modalImage = document.getElementById('modalImage');
+    const caption = document.getElementById('modalImageCaption');
+
+    if (heatmapObjectUrl && modalImage.src === heatmapObjectUrl) {
+        modalImage.src = originalUrl;
+        caption.textContent = 'Original Upload';
+        heatmapButton.textContent = 'Show Disease Heatmap';
+        return;
+    }
+
+    heatmapButton.disabled = true;
+    heatmapButton.textContent = 'Generating heatmap...';
+    try {
+        if (!heatmapObjectUrl) {
+            heatmapObjectUrl = await fetchHeatmapUrl(imageId);
+        }
+        modalImage.src = heatmapObjectUrl;
+        caption.textContent = 'Disease Heatmap (red = regions driving the prediction)';
+        heatmapButton.textContent = 'Show Original';
+    } catch (error) {
+        console.error(`Error loading heatmap for image ${imageId}:`, error);
+        document.getElementById('archiveMessage').textContent = error.message;
+        heatmapButton.textContent = 'Show Disease Heatmap';
+    } finally {
+        heatmapButton.disabled = false;
+    }
+}
+
+/**
+ * Drops the heatmap of the previously opened image.
+ */
+function resetHeatmap() {
+    if (heatmapObjectUrl) {
+        URL.revokeObjectURL(heatmapObjectUrl);
+        heatmapObjectUrl = null;
+    }
+    document.getElementById('modalImageCaption').textContent = 'Original Upload';
+    heatmapButton.textContent = 'Show Disease Heatmap';
+    heatmapButton.disabled = false;
+}
+
 /**
  * Handles moving the current image from the gallery to the trash bin.
  * @param {number} imageId 
@@ -169,7 +250,13 @@ async function handleArchiveImage(imageId) {
         
         setTimeout(() => {
             detailModal.style.display = "none";
-            loadGalleryImages(); 
+            // Drop the card instead of reloading, so pages loaded so far stay in place
+            const card = galleryGrid.querySelector(`.gallery-card[data-image-id="${imageId}"]`);
+            if (card) {
+                card.remove();
+            } else {
+                loadGalleryImages();
+            }
         }, 800);
         
     } catch (error) {
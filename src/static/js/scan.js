@@ -317,6 +317,8 @@ function setupFormSubmission() {
 
         const formData = new FormData();
         formData.append('image', fileToUpload);
+        // Queue the scan and poll for the result instead of holding the request open
+        formData.append('async', 'true');
         
         // FIX: Append real-time GPS data to the form submission
         if (scanLatitudeField.value && scanLongitudeField.value) {
@@ -338,7 +340,12 @@ function setupFormSubmission() {
         displayMessage("Processing image and running ML model...", false);
         
         try {
-            const response = await ScanAPI.uploadAndAnalyze(formData);
+            let response = await ScanAPI.uploadAndAnalyze(formData);
+
+            if (response.job_id && response.status === 'pending') {
+                buttonText.textContent = 'Analyzing... Please wait';
+                response = await waitForScanJob(response.job_id);
+            }
             
             displayMessage("Analysis complete! See results below.", false);
             renderResults(response.result, response.image_id, response.file_path);
@@ -353,6 +360,28 @@ function setupFormSubmission() {
     });
 }
 
+/**
+ * Polls an asynchronous scan job until it is analyzed or has failed.
+ * @param {number} jobId - The job ID returned by the upload.
+ * @returns {Promise<object>} The analyzed job (with result, image_id and file_path).
+ */
+async function waitForScanJob(jobId, intervalMs = 1000, timeoutMs = 120000) {
+    const deadline = Date.now() + timeoutMs;
+
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+        const job = await ScanAPI.getScanJob(jobId);
+
+        if (job.status === 'analyzed') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.message || "Image analysis failed.");
+        }
+    }
+    throw new Error("Analysis is taking longer than expected. Check your gallery shortly.");
+}
+
 /**
  * Populates the results section with the prediction data. (Unchanged)
  */
@@ -402,7 +431,9 @@ function renderResults(result, imageId, filePath) {
     const rawList = document.getElementById('rawOutputList');
     rawList.innerHTML = '';
     
+    // Non-numeric entries are metadata (e.g. cascade_stage), not class probabilities
     const sortedRaw = Object.entries(result.raw_data)
+        .filter(([, probability]) => typeof probability === 'number')
         .sort(([, a], [, b]) => b - a);
 
     sortedRaw.forEach(([disease, probability]) => {
@@ -45,10 +45,11 @@ async function loadTreeDetails(treeId) {
         // 2. Render Tree Metadata
         renderTreeMetadata(treeDetail);
         
-        // 3. Fetch Tree's Scan History 
-        // FIX: Use centralized UserAPI.getTreeImages
-        const scanHistory = await UserAPI.getTreeImages(treeId); 
-        renderScanHistory(scanHistory);
+        // 3. Fetch Tree's Scan History page by page (newest first; more on scroll / "Load more")
+        const historyContainer = document.getElementById('treeScanHistory');
+        const historyPager = createPager(`/api/user/tree/${treeId}/images`, historyContainer,
+            (images, isFirstPage) => renderScanHistory(images, isFirstPage, historyPager.hasMore()));
+        await historyPager.loadMore();
         
     } catch (error) {
         console.error("Error loading tree details:", error);
@@ -86,17 +87,23 @@ function renderTreeMetadata(detail) {
 }
 
 /**
- * Renders the list of scans associated with this tree.
+ * Renders one page of the scans associated with this tree.
  * NOTE: This reuses the rendering logic from gallery.js for consistency.
  * @param {Array<Object>} images 
+ * @param {boolean} isFirstPage - Whether to replace the list instead of appending.
+ * @param {boolean} hasMore - Whether older scans remain to be loaded.
  */
-function renderScanHistory(images) {
+function renderScanHistory(images, isFirstPage = true, hasMore = false) {
     const historyContainer = document.getElementById('treeScanHistory');
-    historyContainer.innerHTML = '';
+    if (isFirstPage) {
+        historyContainer.innerHTML = '';
+    }
 
-    document.getElementById('scanCount').textContent = images.length;
+    // Count of the scans loaded so far ("50+" while older pages remain)
+    const loaded = historyContainer.querySelectorAll('.gallery-card').length + images.length;
+    document.getElementById('scanCount').textContent = hasMore ? `${loaded}+` : loaded;
     
-    if (images.length === 0) {
+    if (isFirstPage && images.length === 0) {
         historyContainer.innerHTML = '<p style="grid-column: 1 / -1;">No scan records found for this tree.</p>';
         return;
     }
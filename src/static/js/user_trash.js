@@ -8,36 +8,42 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 const trashGrid = document.getElementById('trashGrid');
+let trashPager = null; // Loads the trash bin page by page (see createPager in api.js)
 
 // Helper functions for trash API calls (must be defined in api.js)
 const TrashAPI = {
-    getTrash: () => apiCall('/api/trash/', 'GET'),
+    getTrash: (cursor = null) => apiGetPage('/api/trash/', cursor),
     restoreImage: (imageId) => apiCall(`/api/trash/restore/${imageId}`, 'POST'),
     // Note: Permanent delete API route is needed:
     // permanentDelete: (imageId) => apiCall(`/api/trash/delete-permanent/${imageId}`, 'DELETE'),
 };
 
 /**
- * Fetches and renders the list of archived images.
+ * Fetches and renders the first page of archived images; older ones load on scroll / "Load more".
  */
 async function loadTrashContent() {
     trashGrid.innerHTML = '<p style="grid-column: 1 / -1;">Fetching archived data...</p>';
+    if (!trashPager) {
+        trashPager = createPager('/api/trash/', trashGrid, renderTrashGrid);
+    }
     try {
-        const archivedImages = await TrashAPI.getTrash();
-        renderTrashGrid(archivedImages);
+        await trashPager.reset();
     } catch (error) {
         trashGrid.innerHTML = `<p style="grid-column: 1 / -1; color:red;">Failed to load trash content: ${error.message}</p>`;
     }
 }
 
 /**
- * Renders the archived images into the grid.
+ * Renders one page of archived images into the grid.
  * @param {Array<Object>} images - List of archived image objects.
+ * @param {boolean} isFirstPage - Whether to replace the grid content instead of appending.
  */
-function renderTrashGrid(images) {
-    trashGrid.innerHTML = '';
+function renderTrashGrid(images, isFirstPage = true) {
+    if (isFirstPage) {
+        trashGrid.innerHTML = '';
+    }
     
-    if (images.length === 0) {
+    if (isFirstPage && images.length === 0) {
         trashGrid.innerHTML = '<p style="grid-column: 1 / -1;">Your trash bin is empty.</p>';
         return;
     }
@@ -59,12 +65,9 @@ function renderTrashGrid(images) {
             </div>
         `;
         
+        card.querySelector('.restore-btn').addEventListener('click', handleRestore);
         trashGrid.appendChild(card);
     });
-    
-    document.querySelectorAll('.restore-btn').forEach(btn => {
-        btn.addEventListener('click', handleRestore);
-    });
 }
 
 /**
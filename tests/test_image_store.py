@@ -0,0 +1,44 @@
+"""ImageStore deletion must only touch a blob and its own derivatives."""
+import os
+
+from backend.services.image_store import ImageStore, blob_key
+
+CONTENT_HASH = 'ab' * 32
+
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x')
+
+
+def test_delete_keeps_original_with_same_hash_and_other_extension(tmp_path):
+    store = ImageStore(str(tmp_path))
+    png_key, jpg_key = blob_key(CONTENT_HASH, 'png'), blob_key(CONTENT_HASH, 'jpg')
+    stem = os.path.splitext(store.path(png_key))[0]
+    for path in (store.path(png_key), store.path(jpg_key), f"{stem}.128.webp", f"{stem}.heatmap.png"):
+        _touch(path)
+
+    assert sorted(store.derived_paths(png_key)) == sorted([f"{stem}.128.webp", f"{stem}.heatmap.png"])
+
+    # The same bytes uploaded as .jpg are still referenced: only the .png goes
+    store.delete(png_key)
+    assert not os.path.exists(store.path(png_key))
+    assert os.path.exists(store.path(jpg_key))
+    assert os.path.exists(f"{stem}.128.webp") and os.path.exists(f"{stem}.heatmap.png")
+
+    # The last original takes its derivatives with it
+    store.delete(jpg_key)
+    assert os.listdir(os.path.dirname(stem)) == []
+
+
+def test_derived_paths_include_temp_files(tmp_path):
+    store = ImageStore(str(tmp_path))
+    key = blob_key(CONTENT_HASH, 'jpg')
+    path = store.path(key)
+    stem = os.path.splitext(path)[0]
+    temps = [f"{stem}.512.jpg.0123abcd.tmp", f"{stem}.heatmap.png.0123abcd.tmp", f"{path}.0123abcd.tmp"]
+    for p in [path] + temps:
+        _touch(p)
+
+    assert sorted(store.derived_paths(key)) == sorted(temps)
@@ -0,0 +1,26 @@
+"""The quality gate must not reject diseased leaves for lacking green."""
+import numpy as np
+import pytest
+
+from backend.ml_model.quality_gate import QualityGate
+
+
+def _leaf(color, size=224, seed=0):
+    """A textured (sharp) thumbnail of one dominant color."""
+    noise = np.random.default_rng(seed).integers(-40, 40, (size, size, 1))
+    return np.clip(np.array(color) + noise, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('color', [(120, 80, 40), (70, 60, 55)], ids=['brown', 'black'])
+def test_default_gate_accepts_leaf_without_green(color):
+    pixels = _leaf(color)
+    gate = QualityGate.from_config({})
+
+    metrics = gate.check(pixels)
+    assert metrics["green_ratio"] < 0.10
+
+
+def test_green_ratio_check_still_applies_when_configured():
+    gate = QualityGate.from_config({'QUALITY_MIN_GREEN_RATIO': 0.10})
+    with pytest.raises(ValueError, match="No leaf detected"):
+        gate.check(_leaf((120, 80, 40)))
@@ -0,0 +1,67 @@
+"""
+Query plan regression tests: EXPLAIN every hot ImageModel/StatisticsModel query
+(backend.services.migrations.hot_queries) against a MySQL database and fail
+unless each one reads its tables through the index it was written for.
+
+Needs a scratch database loaded from database.sql; the test applies any pending
+migrations to it. Skipped unless MYSQL_TEST_DB names that database (host and
+credentials come from MYSQL_HOST / MYSQL_USER / MYSQL_PASSWORD as usual):
+
+    MYSQL_TEST_DB=leafguard_test python -m pytest tests/test_query_plans.py
+"""
+import os
+
+import pytest
+
+from backend.services.migrations import hot_queries, plan_problems
+
+TEST_DB = os.environ.get('MYSQL_TEST_DB')
+
+needs_mysql = pytest.mark.skipif(not TEST_DB, reason="MYSQL_TEST_DB is not set")
+HOT_QUERIES = hot_queries(user_id=1, tree_id=1)
+
+
+@pytest.fixture(scope='module')
+def conn():
+    from app import create_app
+    from config import Config
+    from backend.services.database_service import DatabaseService
+    from backend.services.migrations import MigrationRunner
+
+    class TestConfig(Config):
+        APP_ROLE = 'api'  # No model needed
+        DEBUG = True  # Raise instead of returning None when MySQL is unreachable
+        MYSQL_DB = TEST_DB
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        connection = DatabaseService.get_db_connection()
+        MigrationRunner(connection, app.config['MIGRATIONS_FOLDER']).up()
+        yield connection
+
+
+@needs_mysql
+@pytest.mark.parametrize('label, expected_keys, call', HOT_QUERIES, ids=[label for label, _, _ in HOT_QUERIES])
+def test_hot_query_uses_expected_index(conn, label, expected_keys, call):
+    from backend.models.image_model import ImageModel
+    from backend.models.statistics_model import StatisticsModel
+    from backend.services.migrations import ExplainingDatabase
+
+    image_model, statistics_model = ImageModel(), StatisticsModel()
+    recorder = ExplainingDatabase(image_model.db, conn)
+    image_model.db = statistics_model.db = statistics_model.farm_model.db = recorder
+    call(image_model, statistics_model)
+
+    assert recorder.plans, f"{label} ran no query"
+    problems = [problem for _, plan in recorder.plans for problem in plan_problems(plan, expected_keys)]
+    assert not problems, f"{label}: {problems}"
+
+
+def test_plan_problems_flags_scans_and_wrong_keys():
+    expected = {'i': 'idx_images_user_status_date', 'p': 'uq_predictions_image'}
+    plan = [
+        {'table': 'i', 'type': 'index', 'possible_keys': 'PRIMARY', 'key': 'PRIMARY'},
+        {'table': 'p', 'type': 'ref', 'possible_keys': 'idx_predictions_class', 'key': 'idx_predictions_class'},
+        {'table': 't', 'type': 'eq_ref', 'possible_keys': 'PRIMARY', 'key': 'PRIMARY'},
+    ]
+    assert [table for table, _ in plan_problems(plan, expected)] == ['i', 'p']